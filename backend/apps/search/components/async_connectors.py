@@ -0,0 +1,202 @@
+from typing import Dict, List, Tuple, Union
+
+import grpc
+from elasticsearch import AsyncElasticsearch
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .db_connector import DBIndex
+from .encoder_pb2 import RerankDocumentsRequest, TopKDocumentsRequest
+from .encoder_pb2_grpc import EncoderStub
+from .es_connector import ESIndex
+from .ranker import Reranker
+
+
+class AsyncDBIndex(DBIndex):
+    """Asynchronous counterpart of `DBIndex` over a pool of aiomysql connections.
+
+    Must be created inside the event loop that uses it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        pwd: str,
+        db_name: str,
+        db_sent_table: str,
+        db_doc_table: str = None,
+        pool_size: int = 50,
+        max_overflow: int = 10,
+    ) -> None:
+        self._config = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "name": db_name,
+        }
+        self.engine = create_async_engine(
+            f"mysql+aiomysql://{user}:{pwd}@"
+            f"{host}:{port}/{db_name}",
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+        )
+        self.db_sent_table = db_sent_table
+        self.db_doc_table = db_doc_table
+
+    async def _fetch_all(self, query: str) -> List[Tuple]:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(query))
+            return result.fetchall()
+
+    # Step 11, 12
+    async def retrieve_sentences(self, list_ids: List[int]) -> Dict[int, str]:
+        """Asynchronous `DBIndex.retrieve_sentences`."""
+        if not list_ids:
+            return {}
+
+        docs = await self._fetch_all(
+            f"select id, sentence from {self.db_sent_table} "
+            f"where id in ({','.join([str(id_) for id_ in list_ids])})"
+        )
+        return {entry[0]: entry[1] for entry in docs}  # 0->id; 1->sentence
+
+    async def retrieve_sentences_info(
+        self,
+        list_ids: List[int],
+    ) -> Dict[int, Tuple[int, str]]:
+        """Asynchronous `DBIndex.retrieve_sentences_info`."""
+        if not list_ids:
+            return {}
+
+        docs = await self._fetch_all(
+            f"select id, doc_id, sentence from {self.db_sent_table} "
+            f"where id in ({','.join([str(id_) for id_ in list_ids])})"
+        )
+        # 0->id; 1->doc_id; 2->sentence
+        return {entry[0]: (entry[1], entry[2]) for entry in docs}
+
+    # Step 4, 5
+    async def get_sentences_ids(self, doc_ids: List[int]) -> List[int]:
+        """Asynchronous `DBIndex.get_sentences_ids`."""
+        query_result = await self._fetch_all(
+            f"select id from {self.db_sent_table} "
+            f"where doc_id in ({','.join([str(id_) for id_ in doc_ids])})"
+        )
+        return [elem[0] for elem in query_result]
+
+    async def close(self) -> None:
+        await self.engine.dispose()
+
+
+class AsyncESIndex(ESIndex):
+    """Asynchronous counterpart of `ESIndex` over a pooled aiohttp session.
+
+    Must be created inside the event loop that uses it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        index: str,
+        list_fields: List[str],
+        K: int = 100,
+        query: Dict[str, Union[str, bool]] = None,
+        maxsize: int = 50,
+    ) -> None:
+        self._config = {
+            "host": host,
+            "port": port,
+            "index": index,
+        }
+        self.conn = AsyncElasticsearch(
+            [
+                {
+                    "host": self._config["host"],
+                    "port": self._config["port"],
+                }
+            ],
+            maxsize=maxsize,
+        )
+        self._list_fields = list_fields
+        self.K = K
+        self.set_query(query)
+
+    # Step 2, 3
+    async def retrieve_documents(
+        self,
+        query: str,
+        K: int = None,
+    ) -> Dict[str, Union[int, float, List[Dict]]]:
+        """Asynchronous `ESIndex.retrieve_documents`."""
+        response = await self.conn.search(
+            index=self._config["index"],
+            body=self.build_search_body(query),
+            size=K or self.K,
+            request_timeout=200,
+            **self.build_search_params(),
+        )
+        return self.parse_search_response(response)
+
+    async def get_documents(self, doc_ids: List[int]) -> List[Dict[str, str]]:
+        """Asynchronous `ESIndex.get_documents`."""
+        if not doc_ids:
+            return []
+
+        response = await self.conn.mget(
+            index=self._config["index"],
+            body={"ids": [str(doc_id) for doc_id in doc_ids]},
+            request_timeout=200,
+            **self.build_mget_params(),
+        )
+        return self.parse_mget_response(response)
+
+    async def close(self) -> None:
+        await self.conn.close()
+
+
+class AsyncReranker(Reranker):
+    """Asynchronous counterpart of `Reranker` over a `grpc.aio` channel.
+
+    Must be created inside the event loop that uses it.
+    """
+
+    def get_encoder_connection(self, host: str, port: int):
+        """Establish asynchronous connection to the gRPC server."""
+        self.channel = grpc.aio.insecure_channel(f"{host}:{port}")
+        return EncoderStub(self.channel)
+
+    # Step 6, 7, 8, 9, 10
+    async def rerank(
+        self,
+        list_sent_ids: List[int],
+        query: str,
+    ) -> List[Dict[str, Union[int, float]]]:
+        """Asynchronous `Reranker.rerank`."""
+        response = await self.conn.RetrieveRerankDocuments(
+            RerankDocumentsRequest(
+                ids=list_sent_ids,
+                query=query,
+                k=self.L,
+            ),
+        )
+        return self.parse_matches(response)
+
+    async def find_top_k(
+        self,
+        query: str,
+        k: int,
+    ) -> List[Dict[str, Union[int, float]]]:
+        """Asynchronous `Reranker.find_top_k`."""
+        response = await self.conn.FindTopKDocuments(
+            TopKDocumentsRequest(
+                query=query,
+                k=k,
+            ),
+        )
+        return self.parse_matches(response)
+
+    async def close(self) -> None:
+        await self.channel.close()
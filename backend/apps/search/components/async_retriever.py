@@ -0,0 +1,359 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple, Union
+
+from .async_connectors import AsyncDBIndex, AsyncESIndex, AsyncReranker
+from .cache import MISSING
+from .metrics import StageTimer
+from .retriever import Retriever
+
+
+class AsyncRetriever:
+    """Asynchronous counterpart of `Retriever` for the ASGI entry point.
+
+    It wraps the given `Retriever`, sharing its models, in-memory indexes,
+    stage cache and the steps of the pipeline that do no I/O, talks to
+    ElasticSearch, MySQL and the Encoder through pooled asynchronous
+    clients, and overlaps the I/O that does not depend on each other. The
+    models run in the default thread pool so that the event loop keeps
+    serving other requests meanwhile.
+    """
+
+    def __init__(
+        self,
+        retriever: Retriever,
+        db_setting: Dict[str, Union[str, int]],
+        es_setting: Dict[str, Union[str, int]],
+        reranker_setting: Dict[str, int],
+        prefetch_sentences: bool = True,
+    ) -> None:
+        self.retriever = retriever
+        self.prefetch_sentences = prefetch_sentences
+
+        # Clients are bound to an event loop, hence created on first use
+        self._settings = {
+            "db_setting": db_setting,
+            "es_setting": es_setting,
+            "reranker_setting": reranker_setting,
+        }
+        self._loop = None
+        self.db_conn = None
+        self.es_conn = None
+        self.reranker_conn = None
+
+    def connect(self) -> None:
+        """Create the pooled clients for the running event loop, once per loop."""
+        loop = asyncio.get_event_loop()
+        if loop is self._loop:
+            return
+        self.db_conn = AsyncDBIndex(**self._settings["db_setting"])
+        self.es_conn = AsyncESIndex(**self._settings["es_setting"])
+        self.reranker_conn = AsyncReranker(**self._settings["reranker_setting"])
+        self._loop = loop
+
+    async def close(self) -> None:
+        """Release the pooled connections."""
+        if self._loop is None:
+            return
+        await asyncio.gather(
+            self.db_conn.close(),
+            self.es_conn.close(),
+            self.reranker_conn.close(),
+        )
+        self._loop = None
+
+    # Step 2, 3
+    async def search_full_text(self, query: str) -> Dict[str, Union[int, float, List]]:
+        """Asynchronous `Retriever.search_full_text`."""
+        if self.retriever.mode == "dense":
+            return {"count": 0, "max_score": None, "min_score": None, "docs": []}
+        return await self.es_conn.retrieve_documents(query)     # 0-index
+
+    async def search_dense(self, query: str) -> List[Dict[str, Union[int, float]]]:
+        """Asynchronous `Retriever.search_dense`."""
+        if self.retriever.mode not in ("dense", "hybrid"):
+            return []
+        return await self.reranker_conn.find_top_k(
+            query, self.retriever.dense_k)     # 0-index
+
+    # Step 4, 5
+    async def get_candidate_sentences(
+        self,
+        docs: Dict[str, Union[int, float, List]],
+    ) -> List[int]:
+        """Asynchronous `Retriever.get_candidate_sentences`."""
+        list_sent_ids, lookup_doc_ids = self.retriever.plan_candidate_sentences(docs)
+        if lookup_doc_ids:
+            list_sent_ids += [
+                (_id-1) for _id in await self.db_conn.get_sentences_ids(lookup_doc_ids)
+            ]   # 0-index
+        return list_sent_ids
+
+    # Step 6, 7, 8, 9, 10
+    async def rank_sentences(
+        self,
+        query: str,
+        list_sent_ids: List[int],
+        dense_sentences: List[Dict[str, Union[int, float]]],
+    ) -> List[Dict[str, Union[int, float]]]:
+        """Asynchronous `Retriever.rank_sentences`."""
+        if self.retriever.mode == "dense":
+            return self.retriever.select_dense(dense_sentences)  # 0-index
+
+        list_sent_ids = list_sent_ids + [sent["id"] for sent in dense_sentences]
+        return await self.reranker_conn.rerank(list_sent_ids, query)  # 0-index
+
+    # Step 11, 12
+    async def fetch_sentences(
+        self,
+        ranked_sentence_ids: List[int],
+    ) -> Tuple[Dict[int, str], Dict[int, int]]:
+        """Asynchronous `Retriever.fetch_sentences`."""
+        if self.retriever.doc_map is not None:
+            if self.retriever.sentence_store is not None:
+                sentences = self.retriever.sentence_store.retrieve_sentences(
+                    ranked_sentence_ids)    # 1-index
+            else:
+                sentences = await self.db_conn.retrieve_sentences(
+                    ranked_sentence_ids)    # 1-index
+            return await self._complete_sentences(ranked_sentence_ids, sentences)
+
+        return self.retriever.split_sentences_info(
+            await self.db_conn.retrieve_sentences_info(ranked_sentence_ids))  # 1-index
+
+    async def _complete_sentences(
+        self,
+        ranked_sentence_ids: List[int],
+        sentences: Dict[int, str],
+    ) -> Tuple[Dict[int, str], Dict[int, int]]:
+        """Look up documents of the sentences in memory, fetching sentences
+        of documents added since the store and the map were built from
+        the database."""
+        sent_doc_ids = self.retriever.map_sentences_to_docs(list(sentences.keys()))
+        unmapped_ids = self.retriever.get_unmapped_sentences(
+            ranked_sentence_ids, sentences, sent_doc_ids)
+        if not unmapped_ids:
+            return sentences, sent_doc_ids
+        return self.retriever.merge_sentences_info(
+            sentences,
+            sent_doc_ids,
+            await self.db_conn.retrieve_sentences_info(unmapped_ids),
+        )
+
+    async def fetch_missing_documents(
+        self,
+        docs: Dict[str, Union[int, float, List]],
+        sent_doc_ids: Dict[int, int],
+    ) -> List[Dict[str, Union[str, float]]]:
+        """Asynchronous `Retriever.fetch_missing_documents`."""
+        missing_docs = await self.es_conn.get_documents(
+            self.retriever.get_missing_doc_ids(docs, sent_doc_ids))
+        for doc in missing_docs:
+            doc["score"] = 0.0
+        return missing_docs
+
+    async def _memoize(
+        self,
+        stage: str,
+        key: Hashable,
+        compute: Callable[..., Awaitable],
+        *args,
+    ) -> Any:
+        """Asynchronous `Retriever._memoize`."""
+        value = self.retriever.cache_get(stage, key)
+        if value is MISSING:
+            value = await compute(*args)
+            self.retriever.cache_set(stage, key, value)
+        return value
+
+    @staticmethod
+    async def _timed(timer: StageTimer, stage: str, awaitable: Awaitable):
+        """Await as the given stage, so that concurrent stages are timed
+        separately."""
+        with timer.span(stage):
+            return await awaitable
+
+    async def _retrieve(
+        self,
+        query: str,
+        timer: StageTimer = None,
+        sent_scores: Dict[int, float] = None,
+    ) -> Tuple[Dict[str, Union[Dict, List]], Dict[int, int]]:
+        """Asynchronous `Retriever._retrieve`."""
+        retriever = self.retriever
+        if retriever.mode not in ("es", "dense", "hybrid"):
+            raise ValueError("Inappropriate value for mode.")
+        self.connect()
+        if timer is None:
+            timer = StageTimer()
+
+        keys = retriever.get_stage_keys(query)
+
+        # Step 2, 3 along with full-corpus semantic search
+        docs, dense_sentences = await asyncio.gather(
+            self._timed(timer, "es_search", self._memoize(
+                "full_text", keys["full_text"], self.search_full_text, query)),
+            self._timed(timer, "dense_search", self._memoize(
+                "dense", keys["dense"], self.search_dense, query)),
+        )
+
+        # Step 4, 5
+        with timer.span("sentence_ids"):
+            list_sent_ids = await self._memoize(
+                "candidates",
+                retriever.get_candidates_key(docs),
+                self.get_candidate_sentences,
+                docs,
+            )   # 0-index
+
+        rerank_key = retriever.get_rerank_key(query, list_sent_ids, dense_sentences)
+        ranked_sentences = retriever.cache_get("rerank", rerank_key)
+
+        # Prefetch text of every candidate while re-ranking is in progress,
+        # since the sentence-document map already answers the rest
+        prefetch = None
+        if (
+            ranked_sentences is MISSING and
+            self.prefetch_sentences and
+            retriever.doc_map is not None and
+            retriever.sentence_store is None
+        ):
+            candidate_ids = set(list_sent_ids)
+            candidate_ids.update(sent["id"] for sent in dense_sentences)
+            prefetch = asyncio.ensure_future(self.db_conn.retrieve_sentences(
+                [id_+1 for id_ in candidate_ids]))  # 1-index
+
+        # Step 6, 7, 8, 9, 10
+        with timer.span("rerank"):
+            if ranked_sentences is MISSING:
+                try:
+                    ranked_sentences = await self.rank_sentences(
+                        query, list_sent_ids, dense_sentences)  # 0-index
+                except Exception:
+                    if prefetch is not None:
+                        prefetch.cancel()
+                    raise
+                retriever.cache_set("rerank", rerank_key, ranked_sentences)
+        ranked_sentence_ids, ranked_scores = retriever.read_ranking(
+            ranked_sentences, sent_scores)  # 1-index, 0-index
+
+        # Step 11, 12
+        with timer.span("sentence_fetch"):
+            cached = retriever.cache_get("sentences", tuple(ranked_sentence_ids))
+            if cached is not MISSING:
+                if prefetch is not None:
+                    prefetch.cancel()
+                sentences, sent_doc_ids = cached
+            elif prefetch is not None:
+                prefetched = await prefetch
+                sentences = {
+                    id_: prefetched[id_]
+                    for id_ in sorted(ranked_sentence_ids)
+                    if id_ in prefetched
+                }   # 1-index
+                sentences, sent_doc_ids = await self._complete_sentences(
+                    ranked_sentence_ids, sentences)
+            else:
+                sentences, sent_doc_ids = await self.fetch_sentences(
+                    ranked_sentence_ids)   # 1-index
+            if cached is MISSING:
+                retriever.cache_set(
+                    "sentences",
+                    tuple(ranked_sentence_ids),
+                    (sentences, sent_doc_ids),
+                )
+
+        with timer.span("doc_join"):
+            missing_docs = await self.fetch_missing_documents(docs, sent_doc_ids)
+            reranked_docs = retriever.join_documents(
+                docs["docs"] + missing_docs, sentences, sent_doc_ids, ranked_scores)
+
+        return retriever.make_results(docs, reranked_docs, sentences), sent_doc_ids
+
+    async def retrieve(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Dict[str, Union[Dict, List]]:
+        """Asynchronous `Retriever.retrieve`."""
+        timer = StageTimer(timings)
+        with timer.span("total"):
+            results, _ = await self._retrieve(query, timer)
+        return results
+
+    async def retrieve_answer(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Dict:
+        """Asynchronous `Retriever.retrieve_answer`."""
+        timer = StageTimer(timings)
+        with timer.span("total"):
+            retrieval_result, sent_doc_ids = await self._retrieve(query, timer)
+            sentences = retrieval_result["re-ranking"]["sentences"]
+
+            # Step 13, 14, 15, 16
+            with timer.span("reader"):
+                result = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    self.retriever.reader_conn.get_answer,
+                    sentences,
+                    query,
+                )   # 1-index
+
+            return self.retriever.join_answer(
+                query, result, retrieval_result, sent_doc_ids)
+
+    async def retrieve_inference(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Dict:
+        """Asynchronous `Retriever.retrieve_inference`."""
+        timer = StageTimer(timings)
+        with timer.span("total"):
+            sent_scores = {}
+            retrieval_result, sent_doc_ids = await self._retrieve(
+                query, timer, sent_scores)
+            sentences = retrieval_result["re-ranking"]["sentences"]
+
+            with timer.span("inferrer"):
+                infer_result = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    self.retriever.inferrer_conn.get_inference,
+                    sentences,
+                    query,
+                    sent_scores,
+                )
+
+            return self.retriever.join_contexts(
+                infer_result, retrieval_result, sent_doc_ids)
+
+    def __str__(self) -> str:
+        return """
+            Retriever: {!s}
+            MySQL: {!s}
+            ElasticSearch: {!s}
+            Reranker: {!s}
+            Prefetch sentences: {}
+        """.format(
+            self.retriever,
+            self.db_conn,
+            self.es_conn,
+            self.reranker_conn,
+            self.prefetch_sentences,
+        )
+
+    def __repr__(self) -> str:
+        return """
+            Retriever: {!r}
+            MySQL: {!r}
+            ElasticSearch: {!r}
+            Reranker: {!r}
+            Prefetch sentences: {}
+        """.format(
+            self.retriever,
+            self.db_conn,
+            self.es_conn,
+            self.reranker_conn,
+            self.prefetch_sentences,
+        )
@@ -0,0 +1,440 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Union
+
+import numpy as np
+
+from .metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = "response_cache_lookups_total"
+LOOKUPS_HELP = "Lookups of the response cache by endpoint and result (hit tier or miss)."
+EVICTIONS = "response_cache_evictions_total"
+EVICTIONS_HELP = "Entries evicted from the in-process response cache, expired ones included."
+STAGE_LOOKUPS = "retriever_stage_cache_lookups_total"
+STAGE_LOOKUPS_HELP = "Lookups of the Retriever's stage cache by stage and result."
+STAGE_EVICTIONS = "retriever_stage_cache_evictions_total"
+STAGE_EVICTIONS_HELP = "Entries evicted from the Retriever's stage cache, expired ones included."
+
+# Returned by `StageCache.get` on a miss, since None may well be a cached value
+MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """Unify unicode form and whitespace, keeping the case since
+    the embedding model is cased."""
+    return unicodedata.normalize("NFC", " ".join(query.split()))
+
+
+def read_corpus_version(path: str) -> str:
+    """Return the corpus version kept in the file, "0" if there is none."""
+    try:
+        with open(path) as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_corpus_version(path: str) -> str:
+    """Write a new corpus version into the file, so that cached responses
+    of every process become stale.
+
+        Returns:
+            str: the new version
+    """
+    version = str(time.time_ns())
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Readers never see a partially written file
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    logger.info(f"Corpus version is now {version}")
+    return version
+
+
+class CorpusVersion:
+    """Corpus version kept in a file, re-read only when the file changed."""
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self._version = "0"
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self) -> str:
+        if self.path is None:
+            return self._version
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                self._version = read_corpus_version(self.path)
+                self._mtime = mtime
+            return self._version
+
+
+class LRUCache:
+    """Thread-safe LRU dictionary of bytes, bounded by number of entries
+    and total bytes, with an optional TTL (seconds)."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl: float = None,
+        evictions: Counter = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()     # key -> (expiry time, value)
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self._evictions = evictions
+
+    def _evict(self, key: Hashable) -> None:
+        """Drop an entry, the lock being held."""
+        _, value = self._entries.pop(key)
+        self._n_bytes -= len(value)
+        self.evictions += 1
+        if self._evictions is not None:
+            self._evictions.inc()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expiry, value = entry
+            if expiry is not None and expiry <= time.monotonic():
+                # Expired
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: bytes) -> None:
+        if self.max_entries <= 0 or len(value) > self.max_bytes:
+            return
+        expiry = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._n_bytes -= len(previous[1])
+            self._entries[key] = (expiry, value)
+            self._n_bytes += len(value)
+            while (
+                len(self._entries) > self.max_entries or
+                self._n_bytes > self.max_bytes
+            ):
+                self._evict(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+
+    @property
+    def n_bytes(self) -> int:
+        return self._n_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        return "max_entries={}; max_bytes={}; ttl={}".format(
+            self.max_entries,
+            self.max_bytes,
+            self.ttl,
+        )
+
+    def __repr__(self) -> str:
+        return "{}(max_entries={},max_bytes={},ttl={})".format(
+            self.__class__.__name__,
+            self.max_entries,
+            self.max_bytes,
+            self.ttl,
+        )
+
+
+class ResponseCache:
+    """Two-tier cache of serialized responses of the search endpoints,
+    keyed on the endpoint, the normalized query and the corpus version.
+
+    The first tier is an LRU dictionary of this process, bounded by number of
+    entries and bytes, with a TTL. The optional second tier is a Django
+    cache (an alias of `CACHES`) shared by the worker processes; its hits are
+    copied into the first tier.
+
+    Changing the corpus bumps the version kept in `version_file` (see
+    `bump_corpus_version`), which every process notices at its next lookup:
+    entries of older versions are no longer reachable and age out.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 2**20,
+        ttl: float = 300.0,
+        shared_alias: str = None,
+        version_file: str = None,
+    ) -> None:
+        self._config = {
+            "shared_alias": shared_alias,
+            "version_file": version_file,
+        }
+        self.local = LRUCache(
+            max_entries,
+            max_bytes,
+            ttl,
+            evictions=REGISTRY.counter(EVICTIONS, help=EVICTIONS_HELP),
+        )
+        self._lock = threading.Lock()
+
+        self.shared = None
+        if shared_alias:
+            from django.core.cache import caches
+            self.shared = caches[shared_alias]
+
+        self._version = CorpusVersion(version_file)
+
+        self.lookups = {"hit_local": 0, "hit_shared": 0, "miss": 0}
+
+    @property
+    def max_entries(self) -> int:
+        return self.local.max_entries
+
+    @property
+    def max_bytes(self) -> int:
+        return self.local.max_bytes
+
+    @property
+    def ttl(self) -> float:
+        return self.local.ttl
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return normalize_query(query)
+
+    @property
+    def version(self) -> str:
+        """Current corpus version, re-read only when its file changed."""
+        return self._version.get()
+
+    def make_key(self, endpoint: str, query: str, variant: str = "") -> str:
+        """Key of the response to the query, `variant` telling apart
+        different renderings of it (e.g., projections)."""
+        text = self.normalize_query(query)
+        if variant:
+            text += "\0" + variant
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return f"response:{endpoint}:{self.version}:{digest}"
+
+    def _record(self, key: str, result: str) -> None:
+        with self._lock:
+            self.lookups[result] += 1
+        endpoint = key.split(":", 2)[1]
+        REGISTRY.counter(
+            LOOKUPS,
+            labels={"endpoint": endpoint, "result": result},
+            help=LOOKUPS_HELP,
+        ).inc()
+
+    def get_local(self, key: str) -> Optional[bytes]:
+        """Look the key up in the first tier only."""
+        body = self.local.get(key)
+        if body is not None:
+            self._record(key, "hit_local")
+        elif self.shared is None:
+            self._record(key, "miss")
+        return body
+
+    def get_shared(self, key: str) -> Optional[bytes]:
+        """Look the key up in the second tier, after a miss in the first."""
+        body = self.shared.get(key)
+        if body is not None:
+            self._record(key, "hit_shared")
+            self.set_local(key, body)
+        else:
+            self._record(key, "miss")
+        return body
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Look the key up in both tiers."""
+        body = self.get_local(key)
+        if body is None and self.shared is not None:
+            body = self.get_shared(key)
+        return body
+
+    def set_local(self, key: str, body: bytes) -> None:
+        self.local.set(key, body)
+
+    def set(self, key: str, body: bytes) -> None:
+        """Store a response in both tiers."""
+        self.set_local(key, body)
+        if self.shared is not None:
+            self.shared.set(key, body, timeout=self.ttl)
+
+    def clear(self) -> None:
+        """Drop the entries of this process' tier."""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return the cache's counters of this process."""
+        with self._lock:
+            lookups = dict(self.lookups)
+        total = sum(lookups.values())
+        hits = lookups["hit_local"] + lookups["hit_shared"]
+        return {
+            "entries": len(self.local),
+            "bytes": self.local.n_bytes,
+            **lookups,
+            "evictions": self.local.evictions,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+    def __str__(self) -> str:
+        return "max_entries={}; max_bytes={}; ttl={}; shared_alias={!r}".format(
+            self.max_entries,
+            self.max_bytes,
+            self.ttl,
+            self._config["shared_alias"],
+        )
+
+    def __repr__(self) -> str:
+        return "{}(max_entries={},max_bytes={},ttl={},shared_alias={!r},version_file={!r})".format(
+            self.__class__.__name__,
+            self.max_entries,
+            self.max_bytes,
+            self.ttl,
+            self._config["shared_alias"],
+            self._config["version_file"],
+        )
+
+
+class StageCache:
+    """Per-process cache of the intermediate outputs of the Retriever's
+    stages, so that queries sharing a prefix of the pipeline (same query,
+    same candidates) skip its costly parts.
+
+    Every stage has its own LRU dictionary with its own number of entries,
+    byte budget and TTL, set in `stages`:
+        {
+            <stage>: {"max_entries": <int>, "max_bytes": <int>, "ttl": <float>},
+            ...
+        }
+    Stages left out are not cached. Values are pickled, which sizes them
+    and hands every caller its own copy to mutate. Keys are prefixed with
+    the corpus version, as in `ResponseCache`.
+    """
+
+    def __init__(
+        self,
+        stages: Dict[str, Dict[str, Union[int, float]]],
+        version_file: str = None,
+    ) -> None:
+        self._config = {
+            "version_file": version_file,
+        }
+        self.stages = {
+            stage: LRUCache(
+                setting.get("max_entries", 1024),
+                setting.get("max_bytes", 16 * 2**20),
+                setting.get("ttl"),
+                evictions=REGISTRY.counter(
+                    STAGE_EVICTIONS,
+                    labels={"stage": stage},
+                    help=STAGE_EVICTIONS_HELP,
+                ),
+            )
+            for stage, setting in stages.items()
+        }
+        self._version = CorpusVersion(version_file)
+        self._lock = threading.Lock()
+        self.lookups = {stage: {"hit": 0, "miss": 0} for stage in self.stages}
+
+    @staticmethod
+    def digest(ids: Sequence[int]) -> str:
+        """Short key for a long list of ids."""
+        return hashlib.sha1(np.asarray(ids, dtype=np.int64).tobytes()).hexdigest()
+
+    def _record(self, stage: str, result: str) -> None:
+        with self._lock:
+            self.lookups[stage][result] += 1
+        REGISTRY.counter(
+            STAGE_LOOKUPS,
+            labels={"stage": stage, "result": result},
+            help=STAGE_LOOKUPS_HELP,
+        ).inc()
+
+    def get(self, stage: str, key: Hashable) -> Any:
+        """Return the cached output of the stage for the key,
+        `MISSING` if there is none."""
+        cache = self.stages.get(stage)
+        if cache is None:
+            return MISSING
+        value = cache.get((self._version.get(), key))
+        if value is None:
+            self._record(stage, "miss")
+            return MISSING
+        self._record(stage, "hit")
+        return pickle.loads(value)
+
+    def set(self, stage: str, key: Hashable, value: Any) -> None:
+        cache = self.stages.get(stage)
+        if cache is not None:
+            cache.set(
+                (self._version.get(), key),
+                pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+
+    def clear(self) -> None:
+        for cache in self.stages.values():
+            cache.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        """Return the counters of every stage."""
+        with self._lock:
+            lookups = {stage: dict(counts) for stage, counts in self.lookups.items()}
+        stats = {}
+        for stage, cache in self.stages.items():
+            total = lookups[stage]["hit"] + lookups[stage]["miss"]
+            stats[stage] = {
+                "entries": len(cache),
+                "bytes": cache.n_bytes,
+                **lookups[stage],
+                "evictions": cache.evictions,
+                "hit_rate": lookups[stage]["hit"] / total if total else 0.0,
+            }
+        return stats
+
+    def __str__(self) -> str:
+        return "; ".join(
+            "{}=({})".format(stage, cache) for stage, cache in self.stages.items())
+
+    def __repr__(self) -> str:
+        return "{}(stages={!r},version_file={!r})".format(
+            self.__class__.__name__,
+            {
+                stage: {
+                    "max_entries": cache.max_entries,
+                    "max_bytes": cache.max_bytes,
+                    "ttl": cache.ttl,
+                }
+                for stage, cache in self.stages.items()
+            },
+            self._config["version_file"],
+        )
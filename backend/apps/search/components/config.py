@@ -1,17 +1,80 @@
+from pathlib import Path
+
 # Parameters
 K = 100
 L = 10
+# First stage of retrieval:
+# - "es": full-text search of K documents, then re-rank their sentences
+# - "dense": ANN search of L sentences over the whole corpus
+# - "hybrid": re-rank sentences of K documents together with DENSE_K ANN results
+RETRIEVER_MODE = "es"
+DENSE_K = 100
 
 # Question Answering module
 # https://huggingface.co/ancs21/xlm-roberta-large-vi-qa
 READER_MODEL = "ancs21/xlm-roberta-large-vi-qa"
 # READER_MODEL = "ahotrod/albert_xxlargev1_squad2_512"
 DEVICE = -1   # int for GPU, -1 for CPU
+# - "concat": answer from all sentences joined into one paragraph
+# - "window": the same paragraph split into overlapping token windows,
+#   all of them in one forward pass, best span over the windows
+# - "ensemble": answer from each sentence alone, best of the answers
 READER_MODE = "concat"
+READER_BATCH_SIZE = 8   # number of question-context pairs (windows in "window" mode) per forward pass
+READER_MAX_SEQ_LEN = 384    # tokens per window, question included
+READER_DOC_STRIDE = 128     # tokens shared by consecutive windows
+READER_MAX_ANSWER_LEN = 15  # tokens
+# Inference backend of the Reader:
+# - "pt": PyTorch, fp32
+# - "pt-int8": PyTorch with Linear layers dynamically quantized to int8 (CPU only)
+# - "onnx": ONNX Runtime with graph optimizations, needs `optimum[onnxruntime]`
+# Check the accuracy of a backend with `python -m benchmarks.parity` first
+READER_RUNTIME = {
+    "backend": "pt",
+    "num_threads": None,    # None for the default
+    "onnx_dir": None,   # where the ONNX export is kept, None to export at every start
+}
 
 # Inference task model
 INFERRER_MODEL = "symanto/xlm-roberta-base-snli-mnli-anli-xnli"     # Checked
 # INFERRER_MODEL = "ynie/albert-xxlarge-v2-snli_mnli_fever_anli_R1_R2_R3-nli"   # Checked
+INFERRER_MODE = "batch"     # "batch" or "single"
+INFERRER_BATCH_SIZE = 16    # number of (claim, evidence) pairs per forward pass
+# Inference backend of the Inferrer, as of the Reader
+INFERRER_RUNTIME = {
+    "backend": "pt",
+    "num_threads": None,
+    "onnx_dir": None,
+}
+# Cascade: a cheap filter scores every evidence first, and only those scoring
+# at least `threshold` (0 to 1) go through INFERRER_MODEL, the others are neutral
+# - "semantic": re-ranking score relative to the best one of the request
+# - "lexical": share of the claim's words found in the evidence
+# - "model": probability of not being neutral by the smaller NLI model `model`,
+#   whose labels are named like INFERRER_MODEL's (entailment/neutral/contradiction)
+INFERRER_CASCADE = {
+    "enabled": False,
+    "filter": "semantic",
+    "threshold": 0.5,
+    "model": None,      # e.g. a distilled NLI model, for the "model" filter
+    "runtime": None,    # runtime of `model`, as INFERRER_RUNTIME
+}
+
+# Dynamic batching of model calls among concurrent requests
+READER_SCHEDULER = {
+    "enabled": True,
+    "max_batch_size": 16,   # question-context pairs
+    "max_wait_ms": 5,
+}
+INFERRER_SCHEDULER = {
+    "enabled": True,
+    "max_batch_size": 64,   # (claim, evidence) pairs
+    "max_wait_ms": 5,
+}
+
+# Requests with this header (any value) get the duration of each stage
+# in the "timings" field of the response, in seconds
+DEBUG_TIMINGS_HEADER = "X-Debug-Timings"
 
 # Database
 DB_CONFIG = {
@@ -27,6 +90,16 @@ DB_NAME = "mlqa_test"
 DB_SENT_TABLE = f"{DB_NAME}_sent_articles"
 DB_ARTICLE_TABLE = f"{DB_NAME}_articles"
 
+# Exported dataset resources
+DATA_DIR = Path(__file__).resolve().parents[4] / "dataset" / "MLQA" / "Test"
+DOC_MAP_FILE = DATA_DIR / "doc_range_map.json"
+DOC_MAP_SOURCE = "json"     # "json", "db" or None to query the database per request
+# Memory-mapped sentences' text, built by `python -m apps.search.components.sentence_store`
+# None to fetch sentences from the database; requires DOC_MAP_SOURCE
+SENTENCE_STORE_DIR = None   # e.g. str(DATA_DIR / "sentence_store")
+# Bumped whenever the corpus changes, to invalidate cached responses
+CORPUS_VERSION_FILE = DATA_DIR / "corpus_version"
+
 # ElasticSearch
 ES_CONFIG = {
     "host": "localhost",
@@ -37,6 +110,17 @@ ES_FIELDS = [
     # "title",
     "content",
 ]
+# Full-text search requests: `match` (`multi_match` over several fields)
+# takes the query as plain text, `query_string` escapes and parses it.
+# Only ES_FIELDS of the sources are returned, total hits are not counted
+# and the response is filtered down to what is parsed.
+ES_QUERY = {
+    "mode": "match",
+    "operator": "or",
+    "source_filter": True,
+    "track_total_hits": False,
+    "filter_path": True,
+}
 
 # Configuration parameters
 DB_SETTING = {
@@ -46,18 +130,26 @@ DB_SETTING = {
     "pwd": DB_CONFIG.get("password"),
     "db_name": DB_CONFIG.get("database"),
     "db_sent_table": DB_SENT_TABLE,
+    "db_doc_table": DB_ARTICLE_TABLE,
 }
 
 ES_SETTING = {
     **ES_CONFIG,
     "K": K,
     "list_fields": ES_FIELDS,
+    "query": ES_QUERY,
 }
 
 READER_SETTING = {
     "model": READER_MODEL,
     "device": DEVICE,
     "mode": READER_MODE,
+    "batch_size": READER_BATCH_SIZE,
+    "max_seq_len": READER_MAX_SEQ_LEN,
+    "doc_stride": READER_DOC_STRIDE,
+    "max_answer_len": READER_MAX_ANSWER_LEN,
+    "scheduler": READER_SCHEDULER,
+    "runtime": READER_RUNTIME,
 }
 
 RERANKER_SETTING = {
@@ -69,6 +161,37 @@ RERANKER_SETTING = {
 INFERRER_SETTING = {
     "model": INFERRER_MODEL,
     "device": DEVICE,
+    "mode": INFERRER_MODE,
+    "batch_size": INFERRER_BATCH_SIZE,
+    "scheduler": INFERRER_SCHEDULER,
+    "runtime": INFERRER_RUNTIME,
+    "cascade": INFERRER_CASCADE,
+}
+
+DOC_MAP_SETTING = {
+    "source": DOC_MAP_SOURCE,
+    "path": str(DOC_MAP_FILE),
+}
+
+SENTENCE_STORE_SETTING = {
+    "path": SENTENCE_STORE_DIR,
+}
+
+# Intermediate outputs of the Retriever, cached in the process per stage:
+# ES and dense search per normalized query, candidate sentences per ES
+# documents, re-ranking per query and candidates, sentences' text per
+# re-ranked sentences. Outputs depending on the corpus only live longer.
+# Entries of an older corpus version are no longer reachable.
+RETRIEVER_STAGE_CACHE = {
+    "enabled": True,
+    "version_file": str(CORPUS_VERSION_FILE),
+    "stages": {
+        "full_text": {"max_entries": 4096, "max_bytes": 32 * 2**20, "ttl": 600},
+        "dense": {"max_entries": 4096, "max_bytes": 8 * 2**20, "ttl": 600},
+        "candidates": {"max_entries": 4096, "max_bytes": 16 * 2**20, "ttl": 3600},
+        "rerank": {"max_entries": 4096, "max_bytes": 16 * 2**20, "ttl": 600},
+        "sentences": {"max_entries": 4096, "max_bytes": 64 * 2**20, "ttl": 3600},
+    },
 }
 
 RETRIEVER_SETTING = {
@@ -77,4 +200,39 @@ RETRIEVER_SETTING = {
     "reranker_setting": RERANKER_SETTING,
     "reader_setting": READER_SETTING,
     "inferrer_setting": INFERRER_SETTING,
+    "doc_map_setting": DOC_MAP_SETTING,
+    "sentence_store_setting": SENTENCE_STORE_SETTING,
+    "stage_cache_setting": RETRIEVER_STAGE_CACHE,
+    "mode": RETRIEVER_MODE,
+    "dense_k": DENSE_K,
+}
+
+# Asynchronous retriever served from `backend/asgi.py`,
+# sharing models and in-memory indexes with the synchronous one
+ASYNC_RETRIEVER_SETTING = {
+    "db_setting": {**DB_SETTING, "pool_size": 50, "max_overflow": 10},
+    "es_setting": {**ES_SETTING, "maxsize": 50},
+    "reranker_setting": RERANKER_SETTING,
+    "prefetch_sentences": True,     # fetch candidates' text while re-ranking
+}
+
+# Responses of the search endpoints, cached per endpoint, normalized query
+# and corpus version, in the process and optionally in a Django cache
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_SETTING = {
+    "max_entries": 1024,
+    "max_bytes": 64 * 2**20,
+    "ttl": 300,     # seconds, None to keep entries until evicted
+    "shared_alias": "responses",    # alias in CACHES of settings.py, None for the process only
+    "version_file": str(CORPUS_VERSION_FILE),
+}
+
+# Incremental add/delete of documents, by `python manage.py sync_document`
+INDEXER_SETTING = {
+    "db_setting": DB_SETTING,
+    "es_setting": ES_SETTING,
+    "reranker_setting": RERANKER_SETTING,
+    "version_file": str(CORPUS_VERSION_FILE),
+    "max_retries": 10,      # while another sync is in progress
+    "retry_wait": 1.0,      # seconds
 }
@@ -1,6 +1,6 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 
@@ -15,6 +15,7 @@ class DBIndex:
         pwd: str,
         db_name: str,
         db_sent_table: str,
+        db_doc_table: str = None,
     ) -> None:
         self._config = {
             "host": host,
@@ -32,6 +33,7 @@ class DBIndex:
         # self.conn = scoped_session(sessionmaker(bind=self.engine))
         self.Session = sessionmaker(bind=self.engine)
         self.db_sent_table = db_sent_table
+        self.db_doc_table = db_doc_table
 
     # Step 11, 12
     def retrieve_sentences(self, list_ids: List[int]) -> Dict[int, str]:
@@ -61,6 +63,37 @@ class DBIndex:
         result = {entry[0]: entry[1] for entry in docs}  # 0->id; 1->sentence
         return result
 
+    def retrieve_sentences_info(
+        self,
+        list_ids: List[int],
+    ) -> Dict[int, Tuple[int, str]]:
+        """Return the sentences along with their documents' IDs in one query.
+
+            Args:
+                list_ids (List[int]): list of sentences' index
+
+            Returns:
+                dict: mappings between sentence's index number and a tuple of
+                its document's index number and sentence's value
+                    Format:
+                    {
+                        <int>: (<int>, <str>),
+                        ...
+                    }
+        """
+        if not list_ids:
+            return {}
+
+        with self.Session() as session:
+            docs = session.execute(
+                f"select id, doc_id, sentence from {self.db_sent_table} "
+                f"where id in ({','.join([str(id_) for id_ in list_ids])})"
+            )
+
+        # 0->id; 1->doc_id; 2->sentence
+        result = {entry[0]: (entry[1], entry[2]) for entry in docs}
+        return result
+
     def get_doc_id(self, sent_id: int) -> int:
         """Return ID of relevant document based on given sentence's ID.
 
@@ -112,6 +145,92 @@ class DBIndex:
 
         return sentences_ids
 
+    def get_doc_ranges(self) -> List[Tuple[int, int, int]]:
+        """Return the range of sentences' IDs of every document in one scan.
+
+            Returns:
+                list: tuples (doc_id, start, end) of each document, 1-index
+        """
+        with self.Session() as session:
+            query_result = session.execute(
+                f"select doc_id, min(id), max(id) from {self.db_sent_table} "
+                f"group by doc_id"
+            ).fetchall()
+
+        return [(entry[0], entry[1], entry[2]) for entry in query_result]
+
+    def iter_sentences(self) -> Iterator[Tuple[int, str]]:
+        """Stream (id, sentence) of the whole sentence table ordered by ID,
+        without loading it into memory at once."""
+        with self.Session() as session:
+            rows = session.execute(
+                f"select id, sentence from {self.db_sent_table} order by id",
+                execution_options={"stream_results": True},
+            )
+            for entry in rows:
+                yield entry[0], entry[1]
+
+    def insert_document(
+        self,
+        title: str,
+        content: str,
+        sentences: List[str],
+    ) -> Tuple[int, List[int]]:
+        """Insert a new document along with its sentences in one transaction.
+
+            Args:
+                title (str): document's title
+                content (str): document's content
+                sentences (List[str]): sentences of the content, in order
+
+            Returns:
+                int: index of the new document (1-index)
+                list: index of its sentences, in order (1-index)
+        """
+        with self.Session() as session, session.begin():
+            doc_id = session.execute(
+                text(
+                    f"insert into {self.db_doc_table} (title, content) "
+                    f"values (:title, :content)"
+                ),
+                {"title": title, "content": content},
+            ).lastrowid
+            if sentences:
+                session.execute(
+                    text(
+                        f"insert into {self.db_sent_table} (sentence, doc_id) "
+                        f"values (:sentence, :doc_id)"
+                    ),
+                    [{"sentence": sent, "doc_id": doc_id} for sent in sentences],
+                )
+            sentences_ids = [
+                elem[0] for elem in session.execute(
+                    text(
+                        f"select id from {self.db_sent_table} "
+                        f"where doc_id = :doc_id order by id"
+                    ),
+                    {"doc_id": doc_id},
+                )
+            ]
+
+        return doc_id, sentences_ids
+
+    def delete_document(self, doc_id: int) -> None:
+        """Delete a document along with its sentences.
+
+            Args:
+                doc_id (int): document's index (1-index)
+        """
+        with self.Session() as session, session.begin():
+            session.execute(
+                text(f"delete from {self.db_sent_table} where doc_id = :doc_id"),
+                {"doc_id": doc_id},
+            )
+            session.execute(
+                text(f"delete from {self.db_doc_table} where id = :doc_id"),
+                {"doc_id": doc_id},
+            )
+
     def __str__(self) -> str:
         return "mysql+pymysql://{}:<>@{}:{}/{}".format(
             self._config["user"],
@@ -121,11 +240,12 @@ class DBIndex:
         )
 
     def __repr__(self) -> str:
-        return "{}(host={!r},port={},user={!r},pwd=<>,db_name={!r},db_sent_table={!r})".format(
+        return "{}(host={!r},port={},user={!r},pwd=<>,db_name={!r},db_sent_table={!r},db_doc_table={!r})".format(
             self.__class__.__name__,
             self._config["host"],
             self._config["port"],
             self._config["user"],
             self._config["name"],
             self.db_sent_table,
+            self.db_doc_table,
         )
@@ -0,0 +1,129 @@
+import json
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+
+class DocRangeIndex:
+    """In-process mapping between documents and their sentences.
+
+    Sentences of a document occupy a contiguous range of IDs, so the whole
+    relation fits in two arrays indexed by document's ID. Both document's
+    and sentence's IDs are 0-index here, as in `doc_range_map.json`,
+    ElasticSearch and FAISS.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray) -> None:
+        # Index of the first/last sentence for each document (-1 if missing)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+
+        # Existing documents ordered by their first sentence,
+        # used for binary search from sentence to document
+        existing = np.flatnonzero(self.starts >= 0)
+        self._order = existing[np.argsort(self.starts[existing], kind="stable")]
+        self._sorted_starts = self.starts[self._order]
+
+    @classmethod
+    def from_ranges(
+        cls,
+        ranges: Iterable[Tuple[int, int, int]],
+    ) -> "DocRangeIndex":
+        """Build the index from (doc_id, start, end) tuples, all 0-index."""
+        ranges = list(ranges)
+        size = max((doc_id for doc_id, _, _ in ranges), default=-1) + 1
+        starts = np.full(size, -1, dtype=np.int64)
+        ends = np.full(size, -2, dtype=np.int64)
+        for doc_id, start, end in ranges:
+            starts[doc_id] = start
+            ends[doc_id] = end
+        return cls(starts, ends)
+
+    @classmethod
+    def from_json(cls, path: str) -> "DocRangeIndex":
+        """Load the index from an exported `doc_range_map.json`.
+
+            Args:
+                path (str): path to the file
+                    Format:
+                    {
+                        "<doc_id>": {"start": <int>, "end": <int>},
+                        ...
+                    }
+        """
+        with open(path) as f:
+            doc_range_map = json.load(f)
+        return cls.from_ranges(
+            (int(doc_id), rng["start"], rng["end"])
+            for doc_id, rng in doc_range_map.items()
+        )
+
+    @classmethod
+    def from_db(cls, db_conn) -> "DocRangeIndex":
+        """Build the index from a single scan over the sentence table.
+
+            Args:
+                db_conn (DBIndex): connection to the database (1-index)
+        """
+        return cls.from_ranges(
+            (doc_id-1, start-1, end-1)
+            for doc_id, start, end in db_conn.get_doc_ranges()
+        )
+
+    def get_doc_ids(self, sent_ids: Iterable[int]) -> np.ndarray:
+        """Return IDs of documents containing the given sentences.
+
+            Args:
+                sent_ids (Iterable[int]): list of sentences' index
+
+            Returns:
+                np.ndarray: documents' index, -1 for unknown sentences
+        """
+        sent_ids = np.asarray(list(sent_ids), dtype=np.int64)
+        if not len(self._order):
+            return np.full(len(sent_ids), -1, dtype=np.int64)
+
+        pos = np.searchsorted(self._sorted_starts, sent_ids, side="right") - 1
+        doc_ids = self._order[np.clip(pos, 0, None)]
+        found = (pos >= 0) & (sent_ids <= self.ends[doc_ids])
+        return np.where(found, doc_ids, -1)
+
+    def get_doc_id(self, sent_id: int) -> int:
+        """Return ID of the document containing the given sentence."""
+        return int(self.get_doc_ids([sent_id])[0])
+
+    def has_document(self, doc_id: int) -> bool:
+        """Check whether the document is in the index."""
+        return 0 <= doc_id < len(self.starts) and self.starts[doc_id] >= 0
+
+    def get_sentence_range(self, doc_id: int) -> Tuple[int, int]:
+        """Return index of the first and last sentence of the document."""
+        return int(self.starts[doc_id]), int(self.ends[doc_id])
+
+    def get_sentences_ids(self, doc_ids: Iterable[int]) -> List[int]:
+        """Return IDs of all sentences of the given documents.
+
+            Args:
+                doc_ids (Iterable[int]): list of documents' index
+
+            Returns:
+                list: sentences' index, grouped by document in the given order
+        """
+        sentences_ids = []
+        for doc_id in doc_ids:
+            if self.has_document(doc_id):
+                sentences_ids.extend(
+                    range(self.starts[doc_id], self.ends[doc_id]+1))
+        return sentences_ids
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __str__(self) -> str:
+        return "documents={}".format(len(self))
+
+    def __repr__(self) -> str:
+        return "{}(documents={})".format(
+            self.__class__.__name__,
+            len(self),
+        )
@@ -24,6 +24,11 @@ class EncoderStub(object):
                 request_serializer=encoder__pb2.RerankDocumentsRequest.SerializeToString,
                 response_deserializer=encoder__pb2.SearchResponse.FromString,
                 )
+        self.BatchRetrieveRerankDocuments = channel.unary_unary(
+                '/Encoder/BatchRetrieveRerankDocuments',
+                request_serializer=encoder__pb2.BatchRerankDocumentsRequest.SerializeToString,
+                response_deserializer=encoder__pb2.BatchSearchResponse.FromString,
+                )
         self.Sync = channel.unary_unary(
                 '/Encoder/Sync',
                 request_serializer=encoder__pb2.SyncRequest.SerializeToString,
@@ -46,6 +51,12 @@ class EncoderServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchRetrieveRerankDocuments(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Sync(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -65,6 +76,11 @@ def add_EncoderServicer_to_server(servicer, server):
                     request_deserializer=encoder__pb2.RerankDocumentsRequest.FromString,
                     response_serializer=encoder__pb2.SearchResponse.SerializeToString,
             ),
+            'BatchRetrieveRerankDocuments': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchRetrieveRerankDocuments,
+                    request_deserializer=encoder__pb2.BatchRerankDocumentsRequest.FromString,
+                    response_serializer=encoder__pb2.BatchSearchResponse.SerializeToString,
+            ),
             'Sync': grpc.unary_unary_rpc_method_handler(
                     servicer.Sync,
                     request_deserializer=encoder__pb2.SyncRequest.FromString,
@@ -114,6 +130,23 @@ class Encoder(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def BatchRetrieveRerankDocuments(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Encoder/BatchRetrieveRerankDocuments',
+            encoder__pb2.BatchRerankDocumentsRequest.SerializeToString,
+            encoder__pb2.BatchSearchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def Sync(request,
             target,
@@ -1,11 +1,19 @@
 from typing import Dict, List, Union
 
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, NotFoundError
 
 
 class ESIndex:
     """Control over ElasticSearch index to conduct specific tasks."""
 
+    # Full-text query:
+    # - "query_string": the user's query escaped, then parsed by ElasticSearch
+    # - "match": `match` (`multi_match` over several fields), analyzed as plain
+    # text, hence no escaping
+    QUERY_MODES = ("query_string", "match")
+    # Only the hits' ID, score and source are parsed
+    SEARCH_FILTER_PATH = "hits.hits._id,hits.hits._score,hits.hits._source"
+
     # ElasticSearch reserved characters
     ESCAPE_RULES = {
         '+': r'\+',
@@ -38,6 +46,7 @@ class ESIndex:
         index: str,
         list_fields: List[str],
         K: int = 100,
+        query: Dict[str, Union[str, bool]] = None,
     ) -> None:
         self._config = {
             "host": host,
@@ -54,6 +63,32 @@ class ESIndex:
         )
         self._list_fields = list_fields
         self.K = K
+        self.set_query(query)
+
+    def set_query(self, query: Dict[str, Union[str, bool]] = None) -> None:
+        """Set up how search requests are built.
+
+            Args:
+                query (Dict[str, Union[str, bool]]): settings of the requests
+                    Format:
+                    {
+                        "mode": <str>,                // one of `QUERY_MODES`
+                        "operator": <str>,            // "or" or "and" between terms
+                        "source_filter": <bool>,      // only `list_fields` of the sources
+                        "track_total_hits": <bool>,   // count every matching document
+                        "filter_path": <bool>,        // only what is parsed of the response
+                    }
+        """
+        query = query or {}
+        self.query = {
+            "mode": query.get("mode", "query_string"),
+            "operator": query.get("operator", "or"),
+            "source_filter": query.get("source_filter", False),
+            "track_total_hits": query.get("track_total_hits", True),
+            "filter_path": query.get("filter_path", False),
+        }
+        if self.query["mode"] not in self.QUERY_MODES:
+            raise ValueError("Inappropriate value for query mode.")
 
     def escapedSeq(self, term: str) -> str:
         """ Yield the next string based on the
@@ -110,11 +145,14 @@ class ESIndex:
                 list: original list of dictionaries with normalized scores
         """
         list_scrs = list(map(lambda doc: doc.get("score"), list_docs))
+        if not list_scrs:
+            return list_docs
         max_scr = max(list_scrs)
         min_scr = min(list_scrs)
         denominator = max_scr - min_scr
         for idx, scr in enumerate(list_scrs):
-            normalized = (scr - min_scr) / denominator
+            # All documents are equally relevant if the scores are the same
+            normalized = (scr - min_scr) / denominator if denominator else 1.0
             list_docs[idx]["score"] = normalized
         return list_docs
 
@@ -135,11 +173,13 @@ class ESIndex:
     def retrieve_documents(
         self,
         query: str,
+        K: int = None,
     ) -> List[Dict[str, Union[str, float, Dict[str, Union[float, str, int]]]]]:
         """Return relevant documents from text-based method.
 
             Args:
             - query: user's query
+            - K: number of documents, `self.K` if not given
             - list_fields: retrieve entries based on matching the given fields 
 
             Returns:
@@ -159,36 +199,99 @@ class ESIndex:
                     ]
                 }
         """
-        # Preprocess input data
-        query = self.preprocess(query)
+        response = self.conn.search(
+            index=self._config["index"],
+            body=self.build_search_body(query),
+            size=K or self.K,
+            request_timeout=200,
+            **self.build_search_params(),
+        )
+
+        return self.parse_search_response(response)
 
-        # Searching
-        response = self.conn.search(index=self._config["index"], body={
-            "query": {
-                "query_string": {
+    def build_query(self, query: str) -> Dict:
+        """Return the full-text query for the given user's query."""
+        if self.query["mode"] == "match":
+            if len(self._list_fields) == 1:
+                return {
+                    "match": {
+                        self._list_fields[0]: {
+                            "query": query,
+                            "operator": self.query["operator"],
+                        }
+                    }
+                }
+            return {
+                "multi_match": {
                     "query": query,
                     "fields": self._list_fields,
-                    "default_operator": "OR",
+                    "operator": self.query["operator"],
                 }
             }
-        }, size=self.K, request_timeout=200)
 
+        # Preprocess input data
+        query = self.preprocess(query)
+
+        return {
+            "query_string": {
+                "query": query,
+                "fields": self._list_fields,
+                "default_operator": self.query["operator"].upper(),
+            }
+        }
+
+    def get_source_includes(self) -> List[str]:
+        """Fields of the source to return, either at the top level
+        or under `doc` (see `parse_source`)."""
+        return [
+            name
+            for field in self._list_fields
+            for name in (field, f"doc.{field}")
+        ]
+
+    def build_search_body(self, query: str) -> Dict:
+        """Return body of the search request for the given user's query."""
+        body = {"query": self.build_query(query)}
+        if self.query["source_filter"]:
+            body["_source"] = {"includes": self.get_source_includes()}
+        if not self.query["track_total_hits"]:
+            body["track_total_hits"] = False
+        return body
+
+    def build_search_params(self) -> Dict[str, str]:
+        """Return query parameters of the search request."""
+        if self.query["filter_path"]:
+            return {"filter_path": self.SEARCH_FILTER_PATH}
+        return {}
+
+    def parse_source(self, hit: Dict) -> Dict[str, str]:
+        """Return the given fields of a hit's source."""
+        doc = {}
+        for field in self._list_fields:
+            try:
+                doc[field] = hit["_source"]["doc"][field]
+            except KeyError:
+                doc[field] = hit["_source"][field]
+        return doc
+
+    def parse_search_response(
+        self,
+        response: Dict,
+    ) -> Dict[str, Union[int, float, List[Dict]]]:
+        """Convert a search response into the format of `retrieve_documents`."""
         matched_doc = []
-        for hit in response["hits"]["hits"]:
+        # Without any hit, a filtered response has no `hits` at all
+        for hit in response.get("hits", {}).get("hits", []):
             doc = {
                 "id": hit["_id"],
                 "score": hit["_score"],
+                **self.parse_source(hit),
             }
-            for field in self._list_fields:
-                try:
-                    doc[field] = hit["_source"]["doc"][field]
-                except KeyError:
-                    doc[field] = hit["_source"][field]
             matched_doc.append(doc)
 
         # Assume retrieved documents from ElasticSearch are in descending by score
-        max_score = matched_doc[0]["score"]
-        min_score = matched_doc[-1]["score"]
+        max_score = matched_doc[0]["score"] if matched_doc else None
+        min_score = matched_doc[-1]["score"] if matched_doc else None
         count = len(matched_doc)
 
         # Apply normalization to scores
@@ -203,6 +306,87 @@ class ESIndex:
 
         return result
 
+    def get_documents(
+        self,
+        doc_ids: List[int],
+    ) -> List[Dict[str, str]]:
+        """Return documents by their IDs, e.g., found by semantic search only.
+
+            Args:
+                doc_ids (List[int]): list of documents' index (0-index)
+
+            Returns:
+                list: found documents, with the given fields
+                    Format:
+                    [
+                        {
+                            "id": <str>,
+                            (list of given fields, mapping "<field>": "<dtype">)
+                        },
+                        ...
+                    ]
+        """
+        if not doc_ids:
+            return []
+
+        response = self.conn.mget(
+            index=self._config["index"],
+            body={"ids": [str(doc_id) for doc_id in doc_ids]},
+            request_timeout=200,
+            **self.build_mget_params(),
+        )
+
+        return self.parse_mget_response(response)
+
+    def build_mget_params(self) -> Dict[str, List[str]]:
+        """Return query parameters of the multi-get request."""
+        if self.query["source_filter"]:
+            return {"_source_includes": self.get_source_includes()}
+        return {}
+
+    def parse_mget_response(self, response: Dict) -> List[Dict[str, str]]:
+        """Convert a multi-get response into the format of `get_documents`."""
+        return [
+            {
+                "id": hit["_id"],
+                **self.parse_source(hit),
+            }
+            for hit in response["docs"]
+            if hit.get("found")
+        ]
+
+    def index_document(self, doc_id: int, doc: Dict[str, str]) -> None:
+        """Add or replace a document, searchable once the call returns.
+
+            Args:
+                doc_id (int): document's index (0-index)
+                doc (Dict[str, str]): document's fields, e.g., title and content
+        """
+        self.conn.index(
+            index=self._config["index"],
+            id=doc_id,
+            body=doc,
+            refresh="wait_for",
+            request_timeout=200,
+        )
+
+    def delete_document(self, doc_id: int) -> None:
+        """Delete a document if it exists, no longer searchable once
+        the call returns.
+
+            Args:
+                doc_id (int): document's index (0-index)
+        """
+        try:
+            self.conn.delete(
+                index=self._config["index"],
+                id=doc_id,
+                refresh="wait_for",
+                request_timeout=200,
+            )
+        except NotFoundError:
+            pass
+
     def __str__(self) -> str:
         return "{}:{}/{}".format(
             self._config["host"],
@@ -211,11 +395,12 @@ class ESIndex:
         )
 
     def __repr__(self) -> str:
-        return "{}(host={!r},port={},index={!r},list_fields={!r},K={})".format(
+        return "{}(host={!r},port={},index={!r},list_fields={!r},K={},query={!r})".format(
             self.__class__.__name__,
             self._config["host"],
             self._config["port"],
             self._config["index"],
             self._list_fields,
             self.K,
+            self.query,
         )
@@ -0,0 +1,158 @@
+import logging
+import time
+from typing import Dict, List, Union
+
+from .cache import bump_corpus_version
+from .db_connector import DBIndex
+from .encoder_pb2 import SyncResponse
+from .es_connector import ESIndex
+from .ranker import Reranker
+
+logger = logging.getLogger(__name__)
+
+
+class Indexer:
+    """Add or delete documents in every index at once: ElasticSearch,
+    the sentence table and the Encoder's sentence index.
+
+    A document becomes searchable by full-text search only after its
+    sentences are in the other indexes, and stops being searchable before
+    they are removed, so that the Retriever never meets half of a document.
+    Retriever processes started before the change find new documents through
+    the database, since they are not in their in-memory doc map. Every change
+    bumps the corpus version, so that cached responses are not served anymore.
+    """
+
+    def __init__(
+        self,
+        db_setting: Dict[str, Union[str, int]],
+        es_setting: Dict[str, Union[str, int]],
+        reranker_setting: Dict[str, int],
+        max_retries: int = 10,
+        retry_wait: float = 1.0,
+        version_file: str = None,
+    ) -> None:
+        self.db_conn = DBIndex(**db_setting)
+        self.es_conn = ESIndex(**es_setting)
+        self.reranker_conn = Reranker(**reranker_setting)
+        self.max_retries = max_retries
+        self.retry_wait = retry_wait
+        self.version_file = version_file
+
+    @staticmethod
+    def split_sentences(content: str) -> List[str]:
+        """Split content into sentences, as the dataset was preprocessed."""
+        from underthesea import sent_tokenize
+        return sent_tokenize(content)
+
+    def sync(self, **kwargs) -> None:
+        """Sync the Encoder's index, waiting for other syncs to finish."""
+        for _ in range(self.max_retries + 1):
+            error = self.reranker_conn.sync(**kwargs)
+            if error == SyncResponse.Error.NO_ERROR:
+                return
+            elif error != SyncResponse.Error.ANOTHER_SYNC_IN_PROGRESS:
+                break
+            time.sleep(self.retry_wait)
+        raise RuntimeError(
+            f"Encoder failed to sync: {SyncResponse.Error.Name(error)}")
+
+    def bump_version(self) -> None:
+        """Invalidate the cached responses of every process."""
+        if self.version_file:
+            bump_corpus_version(self.version_file)
+
+    def reload_index(self) -> None:
+        """Reload the Encoder's index from disk after a full rebuild."""
+        self.sync()
+        self.bump_version()
+
+    def add_document(
+        self,
+        title: str,
+        content: str,
+        sentences: List[str] = None,
+    ) -> int:
+        """Add a new document to every index.
+
+            Args:
+                title (str): document's title
+                content (str): document's content
+                sentences (List[str]): sentences of the content, split by
+                `split_sentences` if not given
+
+            Returns:
+                int: index of the new document (0-index)
+        """
+        if sentences is None:
+            sentences = self.split_sentences(content)
+
+        doc_id, sent_ids = self.db_conn.insert_document(
+            title, content, sentences)  # 1-index
+        try:
+            self.sync(
+                doc_id=doc_id-1,
+                sent_ids=[id_-1 for id_ in sent_ids],   # 0-index
+                sentences=sentences,
+            )
+            try:
+                # Convert the IDs from 1-index back to 0-index to work with ES
+                self.es_conn.index_document(
+                    doc_id-1,
+                    {
+                        "title": title,
+                        "content": content,
+                    },
+                )
+            except Exception:
+                # Take the sentences out of the Encoder's index again
+                self.sync(
+                    doc_id=doc_id-1,
+                    sent_ids=[id_-1 for id_ in sent_ids],   # 0-index
+                    delete=True,
+                )
+                raise
+        except Exception:
+            self.db_conn.delete_document(doc_id)
+            raise
+        finally:
+            # The indexes changed, if only until rolled back
+            self.bump_version()
+        logger.info(f"Added document #{doc_id-1} of {len(sent_ids)} sentences")
+        return doc_id-1
+
+    def delete_document(self, doc_id: int) -> None:
+        """Delete a document from every index.
+
+            Args:
+                doc_id (int): document's index (0-index)
+        """
+        sent_ids = self.db_conn.get_sentences_ids([doc_id+1])     # 1-index
+
+        try:
+            self.es_conn.delete_document(doc_id)
+            self.sync(
+                doc_id=doc_id,
+                sent_ids=[id_-1 for id_ in sent_ids],   # 0-index
+                delete=True,
+            )
+            self.db_conn.delete_document(doc_id+1)
+        finally:
+            # Even partly deleted, the document is gone from some indexes
+            self.bump_version()
+        logger.info(f"Deleted document #{doc_id} of {len(sent_ids)} sentences")
+
+    def __str__(self) -> str:
+        return "DB: {}; ES: {}; Encoder: {}".format(
+            self.db_conn,
+            self.es_conn,
+            self.reranker_conn,
+        )
+
+    def __repr__(self) -> str:
+        return "{}(db_conn={!r},es_conn={!r},reranker_conn={!r})".format(
+            self.__class__.__name__,
+            self.db_conn,
+            self.es_conn,
+            self.reranker_conn,
+        )
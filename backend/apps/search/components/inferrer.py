@@ -1,6 +1,15 @@
-from typing import Dict, List, Union
+import re
+from typing import Dict, Iterator, List, Tuple, Union
 
-from transformers import pipeline
+import numpy as np
+import torch
+
+from .metrics import REGISTRY
+from .runtime import build_pipeline
+from .scheduler import BatchScheduler
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+SKIPPED_RATIO_BUCKETS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
 
 
 class Inferrer:
@@ -23,19 +32,27 @@ class Inferrer:
         self,
         model: str,
         device: int,
+        mode: str = "batch",
+        batch_size: int = 16,
+        scheduler: Dict[str, Union[bool, int, float]] = None,
+        runtime: Dict[str, Union[str, int]] = None,
+        cascade: Dict[str, Union[bool, str, float, Dict]] = None,
     ) -> None:
         self._config = {
             "model": model,
             "device": device,
+            "backend": (runtime or {}).get("backend", "pt"),
         }
-        self.inferrer = pipeline(
+        self.mode = mode
+        self.batch_size = batch_size
+        self.inferrer = build_pipeline(
             "text-classification",
             model=model,
-            tokenizer=model,
             device=device,
             framework="pt",
             return_all_scores=True,
             function_to_apply="softmax",
+            **(runtime or {}),
         )
         # self.inferrer = pipeline(
         #     "zero-shot-classification",
@@ -45,14 +62,243 @@ class Inferrer:
         #     framework="pt",
         #     candidate_labels=["entailment", "neutral", "contradiction"],
         # )
+        # Share forward passes among concurrent requests if enabled
+        self.scheduler = None
+        if scheduler and scheduler.get("enabled"):
+            self.scheduler = BatchScheduler(
+                self.classify_pairs,
+                name="inferrer",
+                max_batch_size=scheduler.get("max_batch_size", 64),
+                max_wait_ms=scheduler.get("max_wait_ms", 5.0),
+            )
+        # Filter out evidences cheaply before the model if enabled
+        self.cascade = None
+        self.filter_pipeline = None
+        if cascade and cascade.get("enabled"):
+            self.cascade = {
+                "filter": cascade.get("filter", "semantic"),
+                "threshold": cascade.get("threshold", 0.5),
+            }
+            if self.cascade["filter"] not in ("semantic", "lexical", "model"):
+                raise ValueError("Inappropriate value for cascade filter.")
+            if self.cascade["filter"] == "model":
+                self.filter_pipeline = build_pipeline(
+                    "text-classification",
+                    model=cascade["model"],
+                    device=device,
+                    framework="pt",
+                    **(cascade.get("runtime") or {}),
+                )
+            self.skipped_hist = REGISTRY.histogram(
+                "inferrer_cascade_skipped_ratio",
+                SKIPPED_RATIO_BUCKETS,
+                help="Share of evidences per request labelled neutral by the cascade filter.",
+            )
+
+    def classify_pairs(
+        self,
+        pairs: List[Tuple[str, str]],
+    ) -> List[Tuple[str, float]]:
+        """Classify (claim, evidence) pairs according to NLI task.
+
+        In `batch` mode, the pairs are tokenized as proper sentence pairs and
+        fed to the model in micro-batches of `batch_size`, each one padded to
+        its longest member only. Pairs are grouped by length beforehand so
+        that padding stays small. In `single` mode, every pair goes through
+        the pipeline on its own.
+
+        Args:
+            pairs (List[Tuple[str, str]]): list of (claim, evidence) pairs
+
+        Returns:
+            list: (label, score) of the most probable class for each pair,
+            in the same order as the given pairs. Labels follow the model's
+            naming, e.g., `entailment`, `neutral`, `contradiction`.
+        """
+        if self.mode.lower() == "single":
+            predictions = []
+            for claim, evidence in pairs:
+                output: List[List[Dict]] = self.inferrer(
+                    " ".join((claim, evidence)))
+                max_label: Dict = max(output[0], key=lambda elem: elem["score"])
+                predictions.append((max_label["label"], max_label["score"]))
+            return predictions
+
+        elif self.mode.lower() != "batch":
+            raise ValueError("Inappropriate value for mode.")
+
+        id2label = self.inferrer.model.config.id2label
+        probs = self.predict_probabilities(self.inferrer, pairs)
+        return [
+            (id2label[int(label_id)], float(row[label_id]))
+            for row, label_id in zip(probs, probs.argmax(axis=-1))
+        ]
+
+    def predict_probabilities(
+        self,
+        nlp,
+        pairs: List[Tuple[str, str]],
+    ) -> np.ndarray:
+        """Probabilities of every class for (claim, evidence) pairs, computed
+        in micro-batches of `batch_size` pairs of similar length.
+
+        Args:
+            nlp (Pipeline): text-classification pipeline of an NLI model
+            pairs (List[Tuple[str, str]]): list of (claim, evidence) pairs
+
+        Returns:
+            np.ndarray: one row of probabilities per pair, in the same order
+            as the given pairs and in the order of the model's `id2label`
+        """
+        tokenizer = nlp.tokenizer
+        model = nlp.model
+
+        # Group pairs of similar length to reduce padding within a batch
+        order = sorted(
+            range(len(pairs)),
+            key=lambda idx: len(pairs[idx][0]) + len(pairs[idx][1]),
+        )
+        probs = np.zeros((len(pairs), model.config.num_labels), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            inputs = tokenizer(
+                [pairs[idx][0] for idx in batch_ids],
+                [pairs[idx][1] for idx in batch_ids],
+                padding=True,
+                truncation=True,
+                return_tensors="pt",
+            ).to(model.device)
+            with torch.no_grad():
+                logits = model(**inputs).logits
+            probs[batch_ids] = logits.softmax(dim=-1).cpu().numpy()
+
+        return probs
+
+    @staticmethod
+    def lexical_overlap(query: str, evidence: str) -> float:
+        """Share of the words of the query found in the evidence."""
+        query_words = set(TOKEN_PATTERN.findall(query.lower()))
+        if not query_words:
+            return 0.0
+        evidence_words = set(TOKEN_PATTERN.findall(evidence.lower()))
+        return len(query_words & evidence_words) / len(query_words)
+
+    def filter_scores(
+        self,
+        sentences: Dict[int, str],
+        query: str,
+        scores: Dict[int, float] = None,
+    ) -> Dict[int, float]:
+        """Score every evidence with the cascade's cheap filter, the higher
+        the more likely it supports or refutes the query.
+
+        Args:
+            sentences (Dict[int, str]): retrieved sentences
+            query (str): user's query
+            scores (Dict[int, float]): semantic scores of the sentences,
+            used by the `semantic` filter
+
+        Returns:
+            Dict[int, float]: score of each sentence, between 0 and 1
+        """
+        method = self.cascade["filter"]
+        if method == "semantic":
+            # Every evidence passes without semantic scores
+            if not scores:
+                return {sent_id: 1.0 for sent_id in sentences}
+            # Relative to the best one, since the Encoder normalizes them
+            best = max((scores.get(sent_id, 0.0) for sent_id in sentences), default=0.0)
+            return {
+                sent_id: scores.get(sent_id, 0.0) / best if best > 0 else 1.0
+                for sent_id in sentences
+            }
+        elif method == "lexical":
+            return {
+                sent_id: self.lexical_overlap(query, evidence)
+                for sent_id, evidence in sentences.items()
+            }
+
+        # Probability of not being neutral according to the small model
+        label2id = {
+            label.lower(): idx
+            for idx, label in self.filter_pipeline.model.config.id2label.items()
+        }
+        probs = self.predict_probabilities(
+            self.filter_pipeline,
+            [(query, evidence) for evidence in sentences.values()],
+        )
+        return {
+            sent_id: 1.0 - float(row[label2id[self.DEFAULT_LB_NEUTRAL]])
+            for sent_id, row in zip(sentences.keys(), probs)
+        }
+
+    def new_insight(self, total: int) -> Dict[str, int]:
+        return {
+            "total": total,
+            self.LB_POSITIVE: 0,
+            self.LB_NEGATIVE: 0,
+            self.LB_NEUTRAL: 0,
+        }
+
+    def split_candidates(
+        self,
+        sentences: Dict[int, str],
+        query: str,
+        scores: Dict[int, float] = None,
+    ) -> Tuple[Dict[int, str], Dict[int, Tuple[str, float]]]:
+        """Split evidences into the ones to go through the model and the
+        ones labelled neutral by the cascade, along with their prediction."""
+        if self.cascade is None:
+            return sentences, {}
+
+        filter_scores = self.filter_scores(sentences, query, scores)
+        candidates, skipped = {}, {}
+        for sent_id, evidence in sentences.items():
+            if filter_scores[sent_id] >= self.cascade["threshold"]:
+                candidates[sent_id] = evidence
+            else:
+                skipped[sent_id] = (
+                    self.DEFAULT_LB_NEUTRAL,
+                    1.0 - filter_scores[sent_id],
+                )
+        if sentences:
+            self.skipped_hist.observe(len(skipped) / len(sentences))
+        return candidates, skipped
+
+    def predict(self, pairs: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
+        """Classify the pairs, through the scheduler if enabled."""
+        if not pairs:
+            return []
+        elif self.scheduler is not None:
+            return self.scheduler.submit(pairs)
+        return self.classify_pairs(pairs)
+
+    def make_result(
+        self,
+        sent_id: int,
+        evidence: str,
+        prediction: Tuple[str, float],
+    ) -> Dict[str, Union[int, float, str]]:
+        label, prob = prediction
+        return {
+            "sent_id": sent_id,
+            "evidence": evidence,
+            "label": self.LABEL[label.lower()],
+            "inference_score": prob,
+        }
 
     def get_inference(
         self,
         sentences: Dict[int, str],
         query: str,
+        scores: Dict[int, float] = None,
     ) -> Dict[str, Dict[str, Union[int, float, str]]]:
         """Get inference result between the given query and the retrieved results.
 
+        With the cascade enabled, evidences scoring below its threshold are
+        labelled neutral without going through the model. Their score is
+        then one minus the filter's score.
+
         Args:
             sentences (Dict[int, str]): list of retrieved sentences.
             {
@@ -60,6 +306,8 @@ class Inferrer:
                 ...
             }
             query (str): user's query
+            scores (Dict[int, float]): semantic scores of the sentences,
+            for the `semantic` filter of the cascade
 
         Returns:
             Dict: inference (confidence) scores with three criteria
@@ -72,6 +320,7 @@ class Inferrer:
                         "entailment": <int>,
                         "neutral": <int>,
                         "contradiction": <int>,
+                        "skipped": <int>,   // labelled neutral by the cascade, if enabled
                     },
                     "data": [
                         {
@@ -86,41 +335,89 @@ class Inferrer:
         results = {
             "claim": query,
             "data": [],
-            "insight": {
-                "total": len(sentences),
-                self.LB_POSITIVE: 0,
-                self.LB_NEGATIVE: 0,
-                self.LB_NEUTRAL: 0,
-            }
+            "insight": self.new_insight(len(sentences)),
         }
-        for sent_id, evidence in sentences.items():
-            output: List[List[Dict]] = self.inferrer(
-                " ".join((query, evidence)))
-            max_label: Dict = max(output[0], key=lambda elem: elem["score"])
 
-            prob = max_label["score"]
-            label = self.LABEL[max_label["label"].lower()]
-            results["data"].append(
-                {
-                    "sent_id": sent_id,
-                    "evidence": evidence,
-                    "label": label,
-                    "inference_score": prob,
-                },
-            )
-            results["insight"][label] += 1
+        candidates, skipped = self.split_candidates(sentences, query, scores)
+        if self.cascade is not None:
+            results["insight"]["skipped"] = len(skipped)
+
+        predictions = self.predict(
+            [(query, evidence) for evidence in candidates.values()])
+        predictions = {**skipped, **dict(zip(candidates.keys(), predictions))}
+
+        for sent_id, evidence in sentences.items():
+            result = self.make_result(sent_id, evidence, predictions[sent_id])
+            results["data"].append(result)
+            results["insight"][result["label"]] += 1
 
         return results
 
+    def iter_inference(
+        self,
+        sentences: Dict[int, str],
+        query: str,
+        scores: Dict[int, float] = None,
+        insight: Dict[str, int] = None,
+    ) -> Iterator[List[Dict[str, Union[int, float, str]]]]:
+        """Yield the `data` of `get_inference` as soon as each part is
+        labelled: the evidences skipped by the cascade first, then every
+        `batch_size` evidences in the order of the given sentences.
+
+        Args:
+            sentences (Dict[int, str]): list of retrieved sentences
+            query (str): user's query
+            scores (Dict[int, float]): semantic scores of the sentences,
+            for the `semantic` filter of the cascade
+            insight (Dict[str, int]): filled with the `insight` of
+            `get_inference` as the evidences are labelled, if given
+
+        Yields:
+            list: results of the evidences labelled in the same step
+        """
+        if insight is None:
+            insight = {}
+        insight.update(self.new_insight(len(sentences)))
+
+        candidates, skipped = self.split_candidates(sentences, query, scores)
+        if self.cascade is not None:
+            insight["skipped"] = len(skipped)
+
+        def count(results):
+            for result in results:
+                insight[result["label"]] += 1
+            return results
+
+        if skipped:
+            yield count([
+                self.make_result(sent_id, sentences[sent_id], prediction)
+                for sent_id, prediction in skipped.items()
+            ])
+
+        candidates = list(candidates.items())
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            predictions = self.predict([(query, evidence) for _, evidence in batch])
+            yield count([
+                self.make_result(sent_id, evidence, prediction)
+                for (sent_id, evidence), prediction in zip(batch, predictions)
+            ])
+
     def __str__(self) -> str:
-        return "model={!r}; device={}".format(
+        return "model={!r}; device={}; backend={!r}; mode={!r}; batch_size={}".format(
             self._config["model"],
             self._config["device"],
+            self._config["backend"],
+            self.mode,
+            self.batch_size,
         )
 
     def __repr__(self) -> str:
-        return "{}(model={!r},device={})".format(
+        return "{}(model={!r},device={},backend={!r},mode={!r},batch_size={})".format(
             self.__class__.__name__,
             self._config["model"],
             self._config["device"],
+            self._config["backend"],
+            self.mode,
+            self.batch_size,
         )
@@ -0,0 +1,282 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+# Seconds, from a dictionary lookup to a transformer forward pass on CPU
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram over fixed bucket boundaries."""
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        buckets: Sequence[float],
+        labels: Dict[str, str] = None,
+        help: str = "",
+    ) -> None:
+        self.name = name
+        self.labels = dict(labels or {})
+        self.help = help
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)    # last one is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Union[int, float, List]]:
+        """Return a consistent copy of the histogram.
+
+            Returns:
+                dict: cumulative count of observations per upper bound
+                    Format:
+                    {
+                        "count": <int>,
+                        "sum": <float>,
+                        "buckets": [
+                            (<float>, <int>),   // (upper bound, cumulative count)
+                            ...
+                            ("+Inf", <int>),
+                        ]
+                    }
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+
+        buckets = []
+        cumulative = 0
+        for bound, cnt in zip(self.buckets + ["+Inf"], counts):
+            cumulative += cnt
+            buckets.append((bound, cumulative))
+
+        return {
+            "count": count,
+            "sum": total,
+            "buckets": buckets,
+        }
+
+    def render_prometheus(self) -> List[str]:
+        """Return the sample lines of the histogram in Prometheus text format."""
+        snapshot = self.snapshot()
+        labels = "".join(
+            f'{key}="{escape_label(value)}",' for key, value in self.labels.items())
+        lines = [
+            "{}_bucket{{{}le=\"{}\"}} {}".format(
+                self.name,
+                labels,
+                bound if bound == "+Inf" else repr(float(bound)),
+                cumulative,
+            )
+            for bound, cumulative in snapshot["buckets"]
+        ]
+        suffix = "{{{}}}".format(labels.rstrip(",")) if labels else ""
+        lines.append(f"{self.name}_sum{suffix} {snapshot['sum']!r}")
+        lines.append(f"{self.name}_count{suffix} {snapshot['count']}")
+        return lines
+
+    def __str__(self) -> str:
+        snapshot = self.snapshot()
+        return "{}{}: count={}; sum={:.6f}; buckets={}".format(
+            self.name,
+            self.labels or "",
+            snapshot["count"],
+            snapshot["sum"],
+            snapshot["buckets"],
+        )
+
+    def __repr__(self) -> str:
+        return "{}(name={!r},buckets={!r},labels={!r})".format(
+            self.__class__.__name__,
+            self.name,
+            self.buckets,
+            self.labels,
+        )
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter."""
+
+    TYPE = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        labels: Dict[str, str] = None,
+        help: str = "",
+    ) -> None:
+        self.name = name
+        self.labels = dict(labels or {})
+        self.help = help
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> Union[int, float]:
+        with self._lock:
+            return self._value
+
+    def render_prometheus(self) -> List[str]:
+        """Return the sample line of the counter in Prometheus text format."""
+        labels = ",".join(
+            f'{key}="{escape_label(value)}"' for key, value in self.labels.items())
+        suffix = "{{{}}}".format(labels) if labels else ""
+        return [f"{self.name}{suffix} {self.value}"]
+
+    def __str__(self) -> str:
+        return "{}{}: {}".format(self.name, self.labels or "", self.value)
+
+    def __repr__(self) -> str:
+        return "{}(name={!r},labels={!r})".format(
+            self.__class__.__name__,
+            self.name,
+            self.labels,
+        )
+
+
+def escape_label(value: str) -> str:
+    """Escape a label value for Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """Process-wide collection of histograms and counters,
+    rendered for Prometheus."""
+
+    def __init__(self) -> None:
+        self._metrics = {}   # (name, labels) -> Histogram or Counter
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, labels: Dict[str, str], create):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = create()
+                self._metrics[key] = metric
+            return metric
+
+    def histogram(
+        self,
+        name: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        labels: Dict[str, str] = None,
+        help: str = "",
+    ) -> Histogram:
+        """Return the histogram of the given name and labels,
+        creating it on first use."""
+        return self._get_or_create(
+            name, labels, lambda: Histogram(name, buckets, labels, help))
+
+    def counter(
+        self,
+        name: str,
+        labels: Dict[str, str] = None,
+        help: str = "",
+    ) -> Counter:
+        """Return the counter of the given name and labels,
+        creating it on first use."""
+        return self._get_or_create(
+            name, labels, lambda: Counter(name, labels, help))
+
+    def render_prometheus(self) -> str:
+        """Return every metric in Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.items(), key=lambda item: item[0])
+
+        lines = []
+        last_name = None
+        for (name, _), metric in metrics:
+            if name != last_name:
+                if metric.help:
+                    lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.TYPE}")
+                last_name = name
+            lines.extend(metric.render_prometheus())
+        return "\n".join(lines) + "\n"
+
+    def __len__(self) -> int:
+        return len(self._metrics)
+
+    def __str__(self) -> str:
+        return "metrics={}".format(len(self))
+
+    def __repr__(self) -> str:
+        return "{}(metrics={})".format(
+            self.__class__.__name__,
+            len(self),
+        )
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = "retriever_stage_duration_seconds"
+STAGE_DURATION_HELP = "Duration of each stage of the Retriever's pipeline."
+
+
+class StageTimer:
+    """Time the stages of one request into the process-wide histograms,
+    keeping the request's own timings (seconds) as well.
+
+    Not shared among requests: create one per request.
+    """
+
+    def __init__(
+        self,
+        timings: Dict[str, float] = None,
+        registry: MetricsRegistry = REGISTRY,
+    ) -> None:
+        self.timings = timings if timings is not None else {}
+        self.registry = registry
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the duration of a stage, added up if it runs many times."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        self.registry.histogram(
+            STAGE_DURATION,
+            labels={"stage": stage},
+            help=STAGE_DURATION_HELP,
+        ).observe(seconds)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block as the given stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def items(self) -> List[Tuple[str, float]]:
+        return list(self.timings.items())
+
+    def __str__(self) -> str:
+        return "; ".join(
+            "{}={:.6f}".format(stage, seconds) for stage, seconds in self.items())
+
+    def __repr__(self) -> str:
+        return "{}(timings={!r})".format(
+            self.__class__.__name__,
+            self.timings,
+        )
@@ -2,7 +2,13 @@ from typing import Dict, List, Union
 
 import grpc
 
-from .encoder_pb2 import RerankDocumentsRequest
+from .encoder_pb2 import (
+    BatchRerankDocumentsRequest,
+    RerankDocumentsRequest,
+    SearchResponse,
+    SyncRequest,
+    TopKDocumentsRequest,
+)
 from .encoder_pb2_grpc import EncoderStub
 
 
@@ -59,7 +65,14 @@ class Reranker:
 
         # Return list of sentences' id and their distance (cosine score)
         # compared with the given question query
-        relevant_sentences = [
+        return self.parse_matches(response)
+
+    def parse_matches(
+        self,
+        response: SearchResponse,
+    ) -> List[Dict[str, Union[int, float]]]:
+        """Convert matches of a search response into list of dictionaries."""
+        return [
             {
                 "id": match.id,
                 "distance": match.distance,
@@ -67,7 +80,92 @@ class Reranker:
             for match in response.matches
         ]
 
-        return relevant_sentences
+    def find_top_k(
+        self,
+        query: str,
+        k: int,
+    ) -> List[Dict[str, Union[int, float]]]:
+        """Return top k relevant sentences over the whole corpus by ANN search.
+
+            Args:
+                query (str): user's query
+                k (int): number of sentences to retrieve
+
+            Returns:
+                list: ids and distances (scores) of the sentences, in the same
+                format as `rerank`
+        """
+        response = self.conn.FindTopKDocuments(
+            TopKDocumentsRequest(
+                query=query,
+                k=k,
+            ),
+        )
+
+        return self.parse_matches(response)
+
+    def rerank_many(
+        self,
+        list_sent_ids: List[List[int]],
+        queries: List[str],
+        ks: List[int] = None,
+    ) -> List[List[Dict[str, Union[int, float]]]]:
+        """Re-rank candidate sentences for many queries in a single call.
+
+            Args:
+                list_sent_ids (List[List[int]]): candidate sentences' ids of each query
+                queries (List[str]): users' queries
+                ks (List[int]): number of sentences to keep for each query,
+                L for all of them by default
+
+            Returns:
+                list: for each query, ids and distances (scores) of its ranked
+                sentences, in the same format as `rerank`
+        """
+        if ks is None:
+            ks = [self.L] * len(queries)
+
+        response = self.conn.BatchRetrieveRerankDocuments(
+            BatchRerankDocumentsRequest(
+                requests=[
+                    RerankDocumentsRequest(ids=sent_ids, query=query, k=k)
+                    for sent_ids, query, k in zip(list_sent_ids, queries, ks)
+                ],
+            ),
+        )
+
+        return [self.parse_matches(res) for res in response.responses]
+
+    def sync(
+        self,
+        doc_id: int = None,
+        sent_ids: List[int] = None,
+        sentences: List[str] = None,
+        delete: bool = False,
+    ) -> int:
+        """Apply changes of a document to the sentence index, or reload
+        the whole index if no document is given.
+
+            Args:
+                doc_id (int): document's index (0-index)
+                sent_ids (List[int]): index of the document's sentences (0-index)
+                sentences (List[str]): text of the sentences, when adding them
+                delete (bool): delete the sentences instead of adding them
+
+            Returns:
+                int: `SyncResponse.Error` value, `NO_ERROR` on success
+        """
+        if doc_id is None:
+            request = SyncRequest(all=True)
+        else:
+            request = SyncRequest(
+                documentId=doc_id,
+                delete=delete,
+                sentenceIds=sent_ids or [],
+                sentences=sentences or [],
+            )
+        response = self.conn.Sync(request)
+        return response.error
 
     def __str__(self) -> str:
         return "{!r}:{}".format(
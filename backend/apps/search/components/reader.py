@@ -1,6 +1,11 @@
-from typing import Dict, List, Union
+from bisect import bisect_right
+from typing import Dict, List, Tuple, Union
 
-from transformers import pipeline
+import numpy as np
+import torch
+
+from .runtime import build_pipeline
+from .scheduler import BatchScheduler
 
 
 class Reader:
@@ -11,18 +16,227 @@ class Reader:
         model: str,
         device: int,
         mode: str = "concat",
+        batch_size: int = 8,
+        scheduler: Dict[str, Union[bool, int, float]] = None,
+        runtime: Dict[str, Union[str, int]] = None,
+        max_seq_len: int = 384,
+        doc_stride: int = 128,
+        max_answer_len: int = 15,
     ) -> None:
         self._config = {
             "model": model,
             "device": device,
+            "backend": (runtime or {}).get("backend", "pt"),
         }
         self.mode = mode
-        self.qa_pipeline = pipeline(
+        self.batch_size = batch_size
+        # Tokens per window, tokens shared by consecutive windows
+        # and tokens per answer, for both `concat` and `window` modes
+        self.max_seq_len = max_seq_len
+        self.doc_stride = doc_stride
+        self.max_answer_len = max_answer_len
+        self.qa_pipeline = build_pipeline(
             "question-answering",
             model=model,
-            tokenizer=model,
             device=device,
+            **(runtime or {}),
+        )
+        # Share forward passes among concurrent requests if enabled
+        self.scheduler = None
+        if scheduler and scheduler.get("enabled"):
+            self.scheduler = BatchScheduler(
+                self.answer_windows if mode.lower() == "window" else self.answer_batch,
+                name="reader",
+                max_batch_size=scheduler.get("max_batch_size", 32),
+                max_wait_ms=scheduler.get("max_wait_ms", 5.0),
+            )
+
+    def answer_batch(
+        self,
+        qa_inputs: List[Dict[str, str]],
+    ) -> List[Dict[str, Union[int, float, str]]]:
+        """Run the QA pipeline over a list of question-context pairs at once.
+
+            Args:
+                qa_inputs (List[Dict[str, str]]): list of inputs
+                    Format:
+                    [
+                        {
+                            "question": <str>,
+                            "context": <str>
+                        },
+                        ...
+                    ]
+
+            Returns:
+                list: best answer for each input, in the same order
+        """
+        outputs = self.qa_pipeline(
+            qa_inputs,
+            batch_size=self.batch_size,
+            max_seq_len=self.max_seq_len,
+            doc_stride=self.doc_stride,
+            max_answer_len=self.max_answer_len,
         )
+        # The pipeline unwraps single-element inputs
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        return outputs
+
+    def answer_windows(
+        self,
+        qa_inputs: List[Dict[str, str]],
+    ) -> List[Dict[str, Union[int, float, str]]]:
+        """Answer question-context pairs over overlapping token windows.
+
+        Each context is split into windows of `max_seq_len` tokens
+        (question included), consecutive ones sharing `doc_stride` tokens.
+        The windows of every pair go through the model together, in
+        batches of `batch_size` windows, and the best span over all windows
+        of a pair is its answer.
+
+            Args:
+                qa_inputs (List[Dict[str, str]]): list of inputs, in the
+                same format as of `answer_batch`
+
+            Returns:
+                list: best answer for each input, in the same order and
+                format as of `answer_batch`
+        """
+        if not qa_inputs:
+            return []
+
+        tokenizer = self.qa_pipeline.tokenizer
+        model = self.qa_pipeline.model
+        encodings = tokenizer(
+            [qa["question"] for qa in qa_inputs],
+            [qa["context"] for qa in qa_inputs],
+            truncation="only_second",
+            max_length=self.max_seq_len,
+            stride=self.doc_stride,
+            padding=True,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True,
+            return_tensors="pt",
+        )
+        offsets = encodings.pop("offset_mapping").tolist()
+        window_inputs = encodings.pop("overflow_to_sample_mapping").tolist()
+
+        start_logits, end_logits = [], []
+        for start in range(0, len(window_inputs), self.batch_size):
+            batch = {
+                key: value[start:start + self.batch_size].to(model.device)
+                for key, value in encodings.items()
+            }
+            with torch.no_grad():
+                outputs = model(**batch)
+            start_logits.append(outputs.start_logits.cpu().numpy())
+            end_logits.append(outputs.end_logits.cpu().numpy())
+        start_logits = np.concatenate(start_logits)
+        end_logits = np.concatenate(end_logits)
+
+        is_cls = (encodings["input_ids"] == tokenizer.cls_token_id).numpy()
+        answers = [None] * len(qa_inputs)
+        for window, input_idx in enumerate(window_inputs):
+            # Only tokens of the context can be part of the answer
+            is_context = np.array([
+                seq_id == 1 for seq_id in encodings.sequence_ids(window)])
+            if not is_context.any():
+                continue
+            score, token_start, token_end = self._best_span(
+                start_logits[window], end_logits[window], is_context, is_cls[window])
+            if answers[input_idx] is None or score > answers[input_idx]["score"]:
+                context = qa_inputs[input_idx]["context"]
+                char_start, char_end = self._span_to_chars(
+                    encodings, window, offsets[window], token_start, token_end)
+                answers[input_idx] = {
+                    "score": score,
+                    "start": char_start,
+                    "end": char_end,
+                    "answer": context[char_start:char_end],
+                }
+
+        return [
+            answer or {"score": 0.0, "start": 0, "end": 0, "answer": ""}
+            for answer in answers
+        ]
+
+    def _best_span(
+        self,
+        start_logits: np.ndarray,
+        end_logits: np.ndarray,
+        is_context: np.ndarray,
+        is_cls: np.ndarray,
+    ) -> Tuple[float, int, int]:
+        """Find the most probable span of a window, as the pipeline does:
+        start and end probabilities over the context and CLS tokens,
+        multiplied, for context spans of at most `max_answer_len` tokens.
+
+            Returns:
+                tuple: probability, start and end token of the span
+        """
+        def softmax(logits):
+            logits = np.where(is_context | is_cls, logits, -10000.0)
+            exp = np.exp(logits - logits.max())
+            return np.where(is_context, exp / exp.sum(), 0.0)
+
+        scores = np.outer(softmax(start_logits), softmax(end_logits))
+        # End after start, within `max_answer_len` tokens
+        scores = np.tril(np.triu(scores), self.max_answer_len - 1)
+        token_start, token_end = np.unravel_index(scores.argmax(), scores.shape)
+        return float(scores[token_start, token_end]), int(token_start), int(token_end)
+
+    @staticmethod
+    def _span_to_chars(
+        encodings,
+        window: int,
+        offsets: List[Tuple[int, int]],
+        token_start: int,
+        token_end: int,
+    ) -> Tuple[int, int]:
+        """Convert a span of tokens into characters of the context,
+        widened to whole words as the pipeline does."""
+        try:
+            start_word = encodings.token_to_word(window, token_start)
+            end_word = encodings.token_to_word(window, token_end)
+            return (
+                encodings.word_to_chars(window, start_word, sequence_index=1)[0],
+                encodings.word_to_chars(window, end_word, sequence_index=1)[1],
+            )
+        except Exception:
+            return offsets[token_start][0], offsets[token_end][1]
+
+    def _answer(
+        self,
+        qa_inputs: List[Dict[str, str]],
+    ) -> List[Dict[str, Union[int, float, str]]]:
+        """Answer the inputs either directly or through the scheduler."""
+        if self.scheduler is not None:
+            return self.scheduler.submit(qa_inputs)
+        if self.mode.lower() == "window":
+            return self.answer_windows(qa_inputs)
+        return self.answer_batch(qa_inputs)
+
+    @staticmethod
+    def find_sentence(
+        sent_starts: List[int],
+        sent_ids: List[int],
+        position: int,
+    ) -> int:
+        """Get the id of the sentence covering a character position
+        of the concatenated paragraph, by binary search.
+
+            Args:
+                sent_starts (List[int]): start position of each sentence
+                in the paragraph, in ascending order
+                sent_ids (List[int]): sentences' id, in the same order
+                position (int): character position in the paragraph
+
+            Returns:
+                int: sentence's id
+        """
+        idx = max(bisect_right(sent_starts, position) - 1, 0)
+        return sent_ids[idx]
 
     # Step 13, 14, 15, 16
     def get_answer(
@@ -39,7 +253,8 @@ class Reader:
                     ...
                 }
                 query (str): user's query
-                mode (str): using `concatenation` or `answers ensemble` method  
+                mode (str): using `concatenation`, `sliding window`
+                or `answers ensemble` method
 
             Returns:
                 dict: combinations of extracted answer and relevant information
@@ -56,43 +271,33 @@ class Reader:
         qa_result = None
         answer_sent_id = None
 
-        if self.mode.lower() == "concat":
-            # A mapping between start position of sentence and sentence's id
-            sent_start_map = []     # list of tuple
+        if self.mode.lower() in ("concat", "window"):
+            # Start position of each sentence and sentence's id, built once
+            # for the binary search of `find_sentence`
+            sent_starts, sent_ids = [], []
             full_paragraph = ""
             for sent_id, sent in sentences.items():
-                sent_start_map.append((len(full_paragraph), sent_id))
+                sent_starts.append(len(full_paragraph))
+                sent_ids.append(sent_id)
                 full_paragraph += sent + " "
 
             qa_input = {
                 "question": query,
                 "context": full_paragraph,
             }
-            qa_result = self.qa_pipeline(qa_input)
-            
-            # Get sentence's id by start index of answer in the full paragraph,
-            # by brute forcing, assuming that the index ids are in ascending order
-            answer_start_id = qa_result.get("start")
-            answer_sent_id = []  # in case there're more than one answers
-            prev_start_idx, prev_sent_id = sent_start_map[0]
-            for i in range(1, len(sent_start_map)):
-                start_idx, sent_id = sent_start_map[i]
-                # Get index for the first match in full text
-                if (
-                    answer_start_id >= prev_start_idx and
-                    answer_start_id <= start_idx
-                ):
-                    break
-                prev_start_idx = start_idx
-                prev_sent_id = sent_id
-
-            answer_sent_id.append(prev_sent_id)
+            qa_result = self._answer([qa_input])[0]
+
+            # Get sentence's id by start index of answer in the full paragraph
+            answer_sent_id = [
+                self.find_sentence(sent_starts, sent_ids, qa_result.get("start")),
+            ]  # in case there're more than one answers
 
         elif self.mode.lower() == "ensemble":
-            answers = {
-                sent_id: self.qa_pipeline(dict(question=query, context=sent))
-                for sent_id, sent in sentences.items()
-            }
+            outputs = self._answer([
+                dict(question=query, context=sent)
+                for sent in sentences.values()
+            ])
+            answers = dict(zip(sentences.keys(), outputs))
             # Get answer and corresponding sentence's index with maximum score
             answer_sent_id, qa_result = max(
                 answers.items(),
@@ -111,16 +316,22 @@ class Reader:
         }
 
     def __str__(self) -> str:
-        return "model={!r}; device={}; mode={!r}".format(
+        return "model={!r}; device={}; backend={!r}; mode={!r}; max_seq_len={}; doc_stride={}".format(
             self._config["model"],
             self._config["device"],
+            self._config["backend"],
             self.mode,
+            self.max_seq_len,
+            self.doc_stride,
         )
 
     def __repr__(self) -> str:
-        return "{}(model={!r},device={},mode={!r})".format(
+        return "{}(model={!r},device={},backend={!r},mode={!r},max_seq_len={},doc_stride={})".format(
             self.__class__.__name__,
             self._config["model"],
             self._config["device"],
+            self._config["backend"],
             self.mode,
+            self.max_seq_len,
+            self.doc_stride,
         )
@@ -1,10 +1,16 @@
-from typing import Dict, List, Union
+import math
+import time
+from typing import Any, Callable, Dict, Generator, Hashable, Iterator, List, Tuple, Union
 
+from .cache import MISSING, StageCache, normalize_query
 from .db_connector import DBIndex
+from .doc_map import DocRangeIndex
 from .es_connector import ESIndex
 from .reader import Reader
 from .ranker import Reranker
 from .inferrer import Inferrer
+from .metrics import StageTimer
+from .sentence_store import SentenceStore
 
 class Retriever:
     """Get API connecting multiple backend components to accomplish
@@ -17,12 +23,137 @@ class Retriever:
         reranker_setting: Dict[str, int],
         reader_setting: Dict[str, Union[str, int]],
         inferrer_setting: Dict[str, Union[str, int]],
+        doc_map_setting: Dict[str, str] = None,
+        sentence_store_setting: Dict[str, str] = None,
+        stage_cache_setting: Dict = None,
+        mode: str = "es",
+        dense_k: int = 100,
     ) -> None:
+        self.mode = mode
+        self.dense_k = dense_k
         self.db_conn = DBIndex(**db_setting)
         self.es_conn = ESIndex(**es_setting)
         self.reader_conn = Reader(**reader_setting)
         self.reranker_conn = Reranker(**reranker_setting)
         self.inferrer_conn = Inferrer(**inferrer_setting)
+        self.doc_map = self.load_doc_map(doc_map_setting)
+
+        # Read sentences' text from the memory-mapped store if provided
+        self.sentence_store = None
+        if sentence_store_setting and sentence_store_setting.get("path"):
+            self.check_sentence_store(self.doc_map)
+            self.sentence_store = SentenceStore(sentence_store_setting["path"])
+
+        # Reuse outputs of the stages among queries sharing them
+        self.stage_cache = None
+        if stage_cache_setting and stage_cache_setting.get("enabled", True):
+            self.stage_cache = StageCache(
+                stage_cache_setting.get("stages", {}),
+                stage_cache_setting.get("version_file"),
+            )
+
+    @classmethod
+    def from_components(
+        cls,
+        db_conn: DBIndex,
+        es_conn: ESIndex,
+        reranker_conn: Reranker,
+        reader_conn: Reader,
+        inferrer_conn: Inferrer,
+        doc_map: DocRangeIndex = None,
+        sentence_store: SentenceStore = None,
+        stage_cache: StageCache = None,
+        mode: str = "es",
+        dense_k: int = 100,
+    ) -> "Retriever":
+        """Assemble a retriever from already created components,
+        e.g., local stand-ins of the remote services."""
+        if sentence_store is not None:
+            cls.check_sentence_store(doc_map)
+        retriever = cls.__new__(cls)
+        retriever.mode = mode
+        retriever.dense_k = dense_k
+        retriever.db_conn = db_conn
+        retriever.es_conn = es_conn
+        retriever.reader_conn = reader_conn
+        retriever.reranker_conn = reranker_conn
+        retriever.inferrer_conn = inferrer_conn
+        retriever.doc_map = doc_map
+        retriever.sentence_store = sentence_store
+        retriever.stage_cache = stage_cache
+        return retriever
+
+    @staticmethod
+    def check_sentence_store(doc_map: DocRangeIndex) -> None:
+        """The sentence store holds text only, documents of the sentences
+        come from the doc map, hence no store without a map."""
+        if doc_map is None:
+            raise ValueError("Sentence store requires a doc map, set its source.")
+
+    def load_doc_map(
+        self,
+        doc_map_setting: Dict[str, str] = None,
+    ) -> DocRangeIndex:
+        """Load the static sentence-document mapping into memory.
+
+            Args:
+                doc_map_setting (Dict[str, str]): where to load the mapping from,
+                either the exported `doc_range_map.json` or the database
+
+            Returns:
+                DocRangeIndex: the mapping, or None to query the database instead
+        """
+        source = (doc_map_setting or {}).get("source")
+        if not source:
+            return None
+        elif source == "json":
+            return DocRangeIndex.from_json(doc_map_setting["path"])
+        elif source == "db":
+            return DocRangeIndex.from_db(self.db_conn)
+        else:
+            raise ValueError("Inappropriate value for doc map source.")
+
+    def cache_get(self, stage: str, key: Hashable) -> Any:
+        """Return the cached output of the stage, `MISSING` if there is none."""
+        if self.stage_cache is None:
+            return MISSING
+        return self.stage_cache.get(stage, key)
+
+    def cache_set(self, stage: str, key: Hashable, value: Any) -> None:
+        if self.stage_cache is not None:
+            self.stage_cache.set(stage, key, value)
+
+    def _memoize(self, stage: str, key: Hashable, compute: Callable, *args) -> Any:
+        """Return the cached output of the stage, computing and caching
+        it with `compute(*args)` on a miss."""
+        value = self.cache_get(stage, key)
+        if value is MISSING:
+            value = compute(*args)
+            self.cache_set(stage, key, value)
+        return value
+
+    def get_stage_keys(self, query: str) -> Dict[str, Hashable]:
+        """Keys of the stages depending on the query only."""
+        key = normalize_query(query)
+        return {"full_text": (self.mode, key), "dense": (self.mode, self.dense_k, key)}
+
+    def get_candidates_key(self, docs: Dict[str, Union[int, float, List]]) -> Hashable:
+        """Key of the candidate sentences, on the documents of full-text search."""
+        return tuple(int(doc["id"]) for doc in docs["docs"])
+
+    def get_rerank_key(
+        self,
+        query: str,
+        list_sent_ids: List[int],
+        dense_sentences: List[Dict[str, Union[int, float]]],
+    ) -> Hashable:
+        """Key of the re-ranking, on the query and both sets of candidates."""
+        return (
+            self.mode,
+            normalize_query(query),
+            StageCache.digest(list_sent_ids),
+            StageCache.digest([sent["id"] for sent in dense_sentences]),
+        )
 
     def get_document_by_id(
         self,
@@ -44,50 +175,249 @@ class Retriever:
 
         return None
 
-    def retrieve(self, query: str) -> Dict[str, Union[Dict, List]]:
-        """Conduct retrieval-rerank based on the given query 
+    # Step 2, 3
+    def search_full_text(self, query: str) -> Dict[str, Union[int, float, List]]:
+        """Return relevant documents from text-based method, or none of them
+        in `dense` mode."""
+        if self.mode == "dense":
+            return {"count": 0, "max_score": None, "min_score": None, "docs": []}
+        return self.es_conn.retrieve_documents(query)   # 0-index
+
+    def search_dense(self, query: str) -> List[Dict[str, Union[int, float]]]:
+        """Return relevant sentences from full-corpus semantic search
+        in `dense` and `hybrid` modes."""
+        if self.mode not in ("dense", "hybrid"):
+            return []
+        return self.reranker_conn.find_top_k(query, self.dense_k)   # 0-index
+
+    # Step 4, 5
+    def get_candidate_sentences(
+        self,
+        docs: Dict[str, Union[int, float, List]],
+    ) -> List[int]:
+        """Return IDs of all sentences of the given documents (0-index)."""
+        list_sent_ids, lookup_doc_ids = self.plan_candidate_sentences(docs)
+        if lookup_doc_ids:
+            list_sent_ids += [
+                # Convert the IDs from 1-index back to 0-index to work with faiss index
+                (_id-1) for _id in self.db_conn.get_sentences_ids(lookup_doc_ids)
+            ]   # 0-index
+        return list_sent_ids
+
+    def plan_candidate_sentences(
+        self,
+        docs: Dict[str, Union[int, float, List]],
+    ) -> Tuple[List[int], List[int]]:
+        """Split the lookup of the given documents' sentences between the
+        in-memory map and the database.
 
-        Args:
-            query (str): user query
+            Args:
+                docs (Dict[str, Union[int, float, List]]): result of full-text search
 
-        Returns:
-            Dict[str, Union[Dict, List]]: results of both full-text search
-            and after re-ranking.
-                Format:
-                {
-                    "full-text": list of documents with relevant information,
-                    "re-rank": list of ranked sentences by semantic search method,   
-                }
+            Returns:
+                List[int]: IDs of the sentences known to the map (0-index)
+                List[int]: IDs of the documents to look up in the database (1-index)
         """
-        # Step 2, 3
-        docs = self.es_conn.retrieve_documents(query)   # 0-index
-
         # Get list of relevant documents' IDs
-        # Convert IDs from 0-index to 1-index to query database
-        doc_ids = list(map(lambda entry: int(entry.get("id"))+1, docs["docs"])) # 1-index
+        doc_ids = [int(entry.get("id")) for entry in docs["docs"]]  # 0-index
+        if self.doc_map is None:
+            # Convert IDs from 0-index to 1-index to query database
+            return [], [doc_id+1 for doc_id in doc_ids]    # 1-index
 
-        # Step 4, 5
-        list_sent_ids = self.db_conn.get_sentences_ids(doc_ids)     # 1-index
-        # Convert the IDs from 1-index back to 0-index to work with faiss index
-        list_sent_ids = [(_id-1) for _id in list_sent_ids]  # 0-index
+        mapped_ids, unmapped_ids = self.split_mapped_documents(doc_ids)
+        list_sent_ids = self.doc_map.get_sentences_ids(mapped_ids)     # 0-index
+        return list_sent_ids, [doc_id+1 for doc_id in unmapped_ids]    # 0-index, 1-index
 
-        # Step 6, 7, 8, 9, 10
-        ranked_sentences = self.reranker_conn.rerank(list_sent_ids, query)  # 0-index
-        # Extract IDs from ranked sentences
-        ranked_sentence_ids = [sent["id"] for sent in ranked_sentences]     # 0-index
+    # Step 6, 7, 8, 9, 10
+    def rank_sentences(
+        self,
+        query: str,
+        list_sent_ids: List[int],
+        dense_sentences: List[Dict[str, Union[int, float]]],
+    ) -> List[Dict[str, Union[int, float]]]:
+        """Return L most relevant sentences among the candidates (0-index)."""
+        if self.mode == "dense":
+            # Sentences are already ranked by semantic search
+            return self.select_dense(dense_sentences)  # 0-index
+
+        # Re-rank candidates from both full-text and semantic search
+        list_sent_ids = list_sent_ids + [sent["id"] for sent in dense_sentences]
+        return self.reranker_conn.rerank(list_sent_ids, query)  # 0-index
+
+    def select_dense(
+        self,
+        dense_sentences: List[Dict[str, Union[int, float]]],
+    ) -> List[Dict[str, Union[int, float]]]:
+        """Keep the L best sentences of semantic search, their scores
+        normalized (L2) among them as the Encoder does after re-ranking,
+        rather than among all `dense_k` of them."""
+        top = dense_sentences[:self.reranker_conn.L]
+        norm = math.sqrt(sum(sent["distance"] ** 2 for sent in top))
+        if not norm:
+            return top
+        return [
+            {"id": sent["id"], "distance": sent["distance"] / norm}
+            for sent in top
+        ]
+
+    def split_mapped_documents(
+        self,
+        doc_ids: List[int],
+    ) -> Tuple[List[int], List[int]]:
+        """Split documents (0-index) into those of the in-memory map and
+        those added after it was loaded."""
+        mapped_ids, unmapped_ids = [], []
+        for doc_id in doc_ids:
+            if self.doc_map.has_document(doc_id):
+                mapped_ids.append(doc_id)
+            else:
+                unmapped_ids.append(doc_id)
+        return mapped_ids, unmapped_ids
+
+    def map_sentences_to_docs(self, sent_ids: List[int]) -> Dict[int, int]:
+        """Look up documents of sentences in memory (both 1-index),
+        leaving out the ones unknown to the map."""
+        return {
+            sent_id: doc_id+1
+            for sent_id, doc_id in zip(
+                sent_ids,
+                self.doc_map.get_doc_ids([sent_id-1 for sent_id in sent_ids]).tolist(),
+            )
+            if doc_id >= 0
+        }   # 1-index
+
+    def get_unmapped_sentences(
+        self,
+        sent_ids: List[int],
+        sentences: Dict[int, str],
+        sent_doc_ids: Dict[int, int],
+    ) -> List[int]:
+        """Return sentences (1-index) missing from the sentence store or
+        the in-memory map, i.e., added after they were built."""
+        return [
+            sent_id for sent_id in sent_ids
+            if sent_id not in sentences or sent_id not in sent_doc_ids
+        ]
+
+    def merge_sentences_info(
+        self,
+        sentences: Dict[int, str],
+        sent_doc_ids: Dict[int, int],
+        sentences_info: Dict[int, Tuple[int, str]],
+    ) -> Tuple[Dict[int, str], Dict[int, int]]:
+        """Complete sentences and their documents with the ones fetched
+        from the database, ordered by index like the database does."""
+        for sent_id, (doc_id, sentence) in sentences_info.items():
+            sentences[sent_id] = sentence
+            sent_doc_ids[sent_id] = doc_id
+        # Leave out sentences deleted in the meantime
+        sentences = {
+            sent_id: sentences[sent_id]
+            for sent_id in sorted(sentences)
+            if sent_id in sent_doc_ids
+        }
+        return sentences, sent_doc_ids
+
+    # Step 11, 12
+    def fetch_sentences(
+        self,
+        ranked_sentence_ids: List[int],
+    ) -> Tuple[Dict[int, str], Dict[int, int]]:
+        """Return sentences' text and their documents' IDs (all 1-index)."""
+        if self.doc_map is not None:
+            if self.sentence_store is not None:
+                sentences = self.sentence_store.retrieve_sentences(
+                    ranked_sentence_ids)    # 1-index
+            else:
+                sentences = self.db_conn.retrieve_sentences(
+                    ranked_sentence_ids)    # 1-index
+            sent_doc_ids = self.map_sentences_to_docs(list(sentences.keys()))
+
+            # Sentences of documents added since the store and the map were built
+            unmapped_ids = self.get_unmapped_sentences(
+                ranked_sentence_ids, sentences, sent_doc_ids)
+            if unmapped_ids:
+                return self.merge_sentences_info(
+                    sentences,
+                    sent_doc_ids,
+                    self.db_conn.retrieve_sentences_info(unmapped_ids),
+                )
+            return sentences, sent_doc_ids
+
+        # Fetch sentences along with their documents' IDs in a single query
+        return self.split_sentences_info(
+            self.db_conn.retrieve_sentences_info(ranked_sentence_ids))  # 1-index
+
+    def split_sentences_info(
+        self,
+        sentences_info: Dict[int, Tuple[int, str]],
+    ) -> Tuple[Dict[int, str], Dict[int, int]]:
+        """Split sentences fetched along with their documents' IDs into
+        sentences' text and their documents' IDs (all 1-index)."""
+        sentences = {
+            sent_id: sentence
+            for sent_id, (_, sentence) in sentences_info.items()
+        }
+        sent_doc_ids = {
+            sent_id: doc_id
+            for sent_id, (doc_id, _) in sentences_info.items()
+        }   # 1-index
+        return sentences, sent_doc_ids
+
+    def get_missing_doc_ids(
+        self,
+        docs: Dict[str, Union[int, float, List]],
+        sent_doc_ids: Dict[int, int],
+    ) -> List[int]:
+        """Return IDs of documents of the re-ranked sentences which
+        full-text search did not return (0-index)."""
+        missing_doc_ids = set(
+            doc_id-1 for doc_id in sent_doc_ids.values()
+        ) - set(int(doc["id"]) for doc in docs["docs"])     # 0-index
+        return sorted(missing_doc_ids)
+
+    def fetch_missing_documents(
+        self,
+        docs: Dict[str, Union[int, float, List]],
+        sent_doc_ids: Dict[int, int],
+    ) -> List[Dict[str, Union[str, float]]]:
+        """Fetch documents found by semantic search only, without text score."""
+        missing_docs = self.es_conn.get_documents(
+            self.get_missing_doc_ids(docs, sent_doc_ids))
+        for doc in missing_docs:
+            doc["score"] = 0.0
+        return missing_docs
+
+    def read_ranking(
+        self,
+        ranked_sentences: List[Dict[str, Union[int, float]]],
+        sent_scores: Dict[int, float] = None,
+    ) -> Tuple[List[int], Dict[int, float]]:
+        """Return IDs of the ranked sentences (1-index) and their semantic
+        scores (0-index), filling `sent_scores` (1-index) if given."""
         ranked_scores = {sent["id"]: sent["distance"] for sent in ranked_sentences}
+        if sent_scores is not None:
+            sent_scores.update(
+                {id_+1: score for id_, score in ranked_scores.items()})   # 1-index
 
         # Convert the IDs from 0-index back to 1-index to work with the database
-        ranked_sentence_ids = [(id_+1) for id_ in ranked_sentence_ids]  # 1-index
-
-        # Step 11, 12
-        sentences = self.db_conn.retrieve_sentences(ranked_sentence_ids)    # 1-index
+        ranked_sentence_ids = [(sent["id"]+1) for sent in ranked_sentences]    # 1-index
+        return ranked_sentence_ids, ranked_scores
 
+    def join_documents(
+        self,
+        candidate_docs: List[Dict[str, Union[str, float]]],
+        sentences: Dict[int, str],
+        sent_doc_ids: Dict[int, int],
+        ranked_scores: Dict[int, float],
+    ) -> List[Dict[str, Union[str, float]]]:
+        """Return documents of the re-ranked sentences with both scores,
+        without duplicates and in the order of the sentences."""
         counting_arr = []
         # Get corresponding documents selected from re-ranking stage
         reranked_docs = []
         for sent_id in sentences.keys():
-            doc_id = self.db_conn.get_doc_id(sent_id=sent_id)
+            doc_id = sent_doc_ids[sent_id]
             # Avoid duplicate in 
             if doc_id in counting_arr:
                 continue
@@ -95,7 +425,7 @@ class Retriever:
 
             # Convert the IDs from 1-index back to 0-index to work with ES results
             doc = self.get_document_by_id(
-                docs=docs["docs"],  # 0-index
+                docs=candidate_docs,  # 0-index
                 doc_id=doc_id-1,    # 0-index
             )
 
@@ -107,35 +437,158 @@ class Retriever:
             doc["semantic_score"] = ranked_scores[sent_id-1]    # 1-index -> 0-index
             reranked_docs.append(doc)
 
-        results = {
+        return reranked_docs
+
+    def _iter_retrieve(
+        self,
+        query: str,
+        timer: StageTimer = None,
+        sent_scores: Dict[int, float] = None,
+    ) -> Generator[Tuple[str, Dict], None, Tuple[Dict, Dict[int, int]]]:
+        """Conduct retrieval-rerank as `_retrieve` does, yielding the results
+        of full-text search (event `full-text`) and of re-ranking (event
+        `re-ranking`) as soon as they are available."""
+        if self.mode not in ("es", "dense", "hybrid"):
+            raise ValueError("Inappropriate value for mode.")
+
+        if timer is None:
+            timer = StageTimer()
+
+        keys = self.get_stage_keys(query)
+
+        # Step 2, 3
+        with timer.span("es_search"):
+            docs = self._memoize(
+                "full_text", keys["full_text"], self.search_full_text, query)   # 0-index
+        yield "full-text", docs
+
+        # Full-corpus semantic search, independent of full-text search
+        with timer.span("dense_search"):
+            dense_sentences = self._memoize(
+                "dense", keys["dense"], self.search_dense, query)    # 0-index
+
+        # Step 4, 5
+        with timer.span("sentence_ids"):
+            list_sent_ids = self._memoize(
+                "candidates",
+                self.get_candidates_key(docs),
+                self.get_candidate_sentences,
+                docs,
+            )   # 0-index
+
+        # Step 6, 7, 8, 9, 10
+        with timer.span("rerank"):
+            ranked_sentences = self._memoize(
+                "rerank",
+                self.get_rerank_key(query, list_sent_ids, dense_sentences),
+                self.rank_sentences,
+                query,
+                list_sent_ids,
+                dense_sentences,
+            )   # 0-index
+        ranked_sentence_ids, ranked_scores = self.read_ranking(
+            ranked_sentences, sent_scores)  # 1-index, 0-index
+
+        # Step 11, 12
+        with timer.span("sentence_fetch"):
+            sentences, sent_doc_ids = self._memoize(
+                "sentences",
+                tuple(ranked_sentence_ids),
+                self.fetch_sentences,
+                ranked_sentence_ids,
+            )   # 1-index
+
+        with timer.span("doc_join"):
+            missing_docs = self.fetch_missing_documents(docs, sent_doc_ids)
+            reranked_docs = self.join_documents(
+                docs["docs"] + missing_docs, sentences, sent_doc_ids, ranked_scores)
+
+        results = self.make_results(docs, reranked_docs, sentences)
+        yield "re-ranking", results["re-ranking"]
+        return results, sent_doc_ids
+
+    def make_results(
+        self,
+        docs: Dict[str, Union[int, float, List]],
+        reranked_docs: List[Dict[str, Union[str, float]]],
+        sentences: Dict[int, str],
+    ) -> Dict[str, Union[Dict, List]]:
+        """Put results of full-text search and of re-ranking together."""
+        return {
             "full-text": docs,
             "re-ranking": {
                 "documents": reranked_docs,
                 "sentences": sentences,
             },
         }
-        return results
 
-    def retrieve_answer(self, query: str) -> Dict:
-        """Retrieve and extract answer from indexes for the given question query
+    def _retrieve(
+        self,
+        query: str,
+        timer: StageTimer = None,
+        sent_scores: Dict[int, float] = None,
+    ) -> Tuple[Dict[str, Union[Dict, List]], Dict[int, int]]:
+        """Conduct retrieval-rerank and keep track of the re-ranked sentences'
+        documents, so that callers need no further lookup.
 
         Args:
-            query (str): user's query
+            query (str): user query
+            timer (StageTimer): records the duration of each stage
+            sent_scores (Dict[int, float]): filled with the semantic score
+            of each re-ranked sentence (1-index), if given
 
         Returns:
-            Dict: combination of extracted answer and relevant data
+            Dict[str, Union[Dict, List]]: results of both full-text search
+            and after re-ranking.
                 Format:
                 {
-                    "query": <str>,
-                    "answer": <str>
+                    "full-text": list of documents with relevant information,
+                    "re-rank": list of ranked sentences by semantic search method,   
                 }
+            Dict[int, int]: mappings between re-ranked sentences' index
+            and their documents' index (both 1-index)
         """
-        # Step 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12
-        retrieval_result = self.retrieve(query)
-        sentences = retrieval_result["re-ranking"]["sentences"]
+        steps = self._iter_retrieve(query, timer, sent_scores)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def retrieve(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Dict[str, Union[Dict, List]]:
+        """Conduct retrieval-rerank based on the given query 
 
-        # Step 13, 14, 15, 16
-        result = self.reader_conn.get_answer(sentences, query)  # 1-index
+        Args:
+            query (str): user query
+            timings (Dict[str, float]): filled with the duration of each
+            stage in seconds, if given
+
+        Returns:
+            Dict[str, Union[Dict, List]]: results of both full-text search
+            and after re-ranking.
+                Format:
+                {
+                    "full-text": list of documents with relevant information,
+                    "re-rank": list of ranked sentences by semantic search method,   
+                }
+        """
+        timer = StageTimer(timings)
+        with timer.span("total"):
+            results, _ = self._retrieve(query, timer)
+        return results
+
+    def join_answer(
+        self,
+        query: str,
+        result: Dict[str, Union[List[int], int, float, str]],
+        retrieval_result: Dict[str, Union[Dict, List]],
+        sent_doc_ids: Dict[int, int],
+    ) -> Dict:
+        """Combine the Reader's answer with the document containing it."""
         answer = result.get("answer")
         answer_score = result.get("score")
         # Retrieve corresponding document
@@ -144,7 +597,7 @@ class Retriever:
         # Retrieve the associated document (additional feature)
         # sent_id which is received from the database is already 1-index,
         # hence we don't need to increment it to solve index mismatching
-        doc_id = self.db_conn.get_doc_id(sent_id)   # 1-index
+        doc_id = sent_doc_ids[sent_id]   # 1-index
 
         # Convert the IDs from 1-index back to 0-index to work with ES results
         selected_document = self.get_document_by_id(
@@ -159,12 +612,70 @@ class Retriever:
             "document": {**selected_document},
         }
 
-    def retrieve_inference(self, query: str) -> Dict:
+    def join_contexts(
+        self,
+        infer_result: Dict,
+        retrieval_result: Dict[str, Union[Dict, List]],
+        sent_doc_ids: Dict[int, int],
+    ) -> Dict:
+        """Attach the document containing each evidence to the Inferrer's result."""
+        docs = retrieval_result["re-ranking"]["documents"]
+        for res in infer_result["data"]:
+            doc_id = sent_doc_ids[res["sent_id"]]    # 1-index
+            # Convert the IDs from 1-index back to 0-index to work with ES results
+            doc = self.get_document_by_id(
+                docs=docs,  # 0-index
+                doc_id=doc_id-1,    # 0-index
+            )
+
+            res["context"] = doc 
+
+        return infer_result
+
+    def retrieve_answer(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Dict:
+        """Retrieve and extract answer from indexes for the given question query
+
+        Args:
+            query (str): user's query
+            timings (Dict[str, float]): filled with the duration of each
+            stage in seconds, if given
+
+        Returns:
+            Dict: combination of extracted answer and relevant data
+                Format:
+                {
+                    "query": <str>,
+                    "answer": <str>
+                }
+        """
+        timer = StageTimer(timings)
+        with timer.span("total"):
+            # Step 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12
+            retrieval_result, sent_doc_ids = self._retrieve(query, timer)
+            sentences = retrieval_result["re-ranking"]["sentences"]
+
+            # Step 13, 14, 15, 16
+            with timer.span("reader"):
+                result = self.reader_conn.get_answer(sentences, query)  # 1-index
+
+            return self.join_answer(query, result, retrieval_result, sent_doc_ids)
+
+    def retrieve_inference(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Dict:
         """Retrieve inference for the given query (premise) based on hypothesis
         of the data the system has.
 
         Args:
             query (str): user query (premise)
+            timings (Dict[str, float]): filled with the duration of each
+            stage in seconds, if given
 
         Returns:
             Dict: list of retrieved data with inference result. The format is
@@ -188,27 +699,127 @@ class Retriever:
                     ]
                 }
         """
-        retrieval_result = self.retrieve(query)
-        docs = retrieval_result["full-text"]
+        timer = StageTimer(timings)
+        with timer.span("total"):
+            sent_scores = {}
+            retrieval_result, sent_doc_ids = self._retrieve(query, timer, sent_scores)
+            sentences = retrieval_result["re-ranking"]["sentences"]
+
+            with timer.span("inferrer"):
+                infer_result = self.inferrer_conn.get_inference(
+                    query=query,    
+                    sentences=sentences,
+                    scores=sent_scores,
+                )
+
+            return self.join_contexts(infer_result, retrieval_result, sent_doc_ids)
+
+    def stream_answer(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Yield the steps of `retrieve_answer` as (event, data) as soon as
+        each one is done.
+
+        Args:
+            query (str): user's query
+            timings (Dict[str, float]): filled with the duration of each
+            stage in seconds, if given
+
+        Yields:
+            tuple: in this order
+                ("full-text", <documents of full-text search>)
+                ("re-ranking", {"documents": <list>, "sentences": <dict>})
+                ("answer", <result of `retrieve_answer`>)
+        """
+        timer = StageTimer(timings)
+        yield from self._time_steps(self._iter_answer(query, timer), timer)
+
+    def _iter_answer(
+        self,
+        query: str,
+        timer: StageTimer,
+    ) -> Iterator[Tuple[str, Dict]]:
+        # Step 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12
+        retrieval_result, sent_doc_ids = yield from self._iter_retrieve(
+            query, timer)
         sentences = retrieval_result["re-ranking"]["sentences"]
-      
-        infer_result = self.inferrer_conn.get_inference(
-            query=query,    
-            sentences=sentences,
-        )
 
-        for res in infer_result["data"]:
-            doc_id = self.db_conn.get_doc_id(res["sent_id"])    # 1-index
-            # Convert the IDs from 1-index back to 0-index to work with ES results
-            doc = self.get_document_by_id(
-                docs=docs["docs"],  # 0-index
-                doc_id=doc_id-1,    # 0-index
-            )
+        # Step 13, 14, 15, 16
+        with timer.span("reader"):
+            result = self.reader_conn.get_answer(sentences, query)  # 1-index
 
-            res["context"] = doc 
+        yield "answer", self.join_answer(
+            query, result, retrieval_result, sent_doc_ids)
 
-        return infer_result
+    def stream_inference(
+        self,
+        query: str,
+        timings: Dict[str, float] = None,
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Yield the steps of `retrieve_inference` as (event, data) as soon
+        as each one is done, the evidences batch by batch.
+
+        Args:
+            query (str): user query (premise)
+            timings (Dict[str, float]): filled with the duration of each
+            stage in seconds, if given
+
+        Yields:
+            tuple: in this order
+                ("full-text", <documents of full-text search>)
+                ("re-ranking", {"documents": <list>, "sentences": <dict>})
+                ("evidence", <items of `data` of `retrieve_inference`>)  // once per batch
+                ("insight", {"claim": <str>, "insight": <dict>})
+        """
+        timer = StageTimer(timings)
+        yield from self._time_steps(self._iter_inference(query, timer), timer)
+
+    def _iter_inference(
+        self,
+        query: str,
+        timer: StageTimer,
+    ) -> Iterator[Tuple[str, Dict]]:
+        sent_scores = {}
+        retrieval_result, sent_doc_ids = yield from self._iter_retrieve(
+            query, timer, sent_scores)
+        sentences = retrieval_result["re-ranking"]["sentences"]
 
+        insight = {}
+        batches = self.inferrer_conn.iter_inference(
+            sentences, query, sent_scores, insight)
+        while True:
+            # Time the Inferrer only, not the sending of each batch
+            with timer.span("inferrer"):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            yield "evidence", self.join_contexts(
+                {"data": batch}, retrieval_result, sent_doc_ids)["data"]
+
+        yield "insight", {"claim": query, "insight": insight}
+
+    @staticmethod
+    def _time_steps(
+        steps: Iterator[Tuple[str, Dict]],
+        timer: StageTimer,
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Yield the events of `steps`, timing the work between them as the
+        `total` stage, without the time the consumer spends on each event."""
+        seconds = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    event = next(steps)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - started
+                yield event
+        finally:
+            timer.observe("total", seconds)
 
     def __str__(self) -> str:
         return """
@@ -217,12 +828,18 @@ class Retriever:
             Reranker: {!s}
             Reader: {!s}
             Inferrer: {!s}
+            Doc map: {!s}
+            Sentence store: {!s}
+            Stage cache: {!s}
         """.format(
             self.db_conn,
             self.es_conn,
             self.reranker_conn,
             self.reader_conn,
             self.inferrer_conn,
+            self.doc_map,
+            self.sentence_store,
+            self.stage_cache,
         )
 
     def __repr__(self) -> str:
@@ -232,10 +849,16 @@ class Retriever:
             Reranker: {!r}
             Reader: {!r}
             Inferrer: {!r}
+            Doc map: {!r}
+            Sentence store: {!r}
+            Stage cache: {!r}
         """.format(
             self.db_conn,
             self.es_conn,
             self.reranker_conn,
             self.reader_conn,
             self.inferrer_conn,
+            self.doc_map,
+            self.sentence_store,
+            self.stage_cache,
         )
@@ -0,0 +1,130 @@
+import inspect
+import logging
+import os
+
+import torch
+from transformers import AutoTokenizer, pipeline
+
+logger = logging.getLogger(__name__)
+
+# - "pt": PyTorch, fp32
+# - "pt-int8": PyTorch with Linear layers dynamically quantized to int8 (CPU)
+# - "onnx": ONNX Runtime session with every graph optimization enabled
+BACKENDS = ("pt", "pt-int8", "onnx")
+
+ORT_MODEL_CLASSES = {
+    "question-answering": "ORTModelForQuestionAnswering",
+    "text-classification": "ORTModelForSequenceClassification",
+}
+
+
+def load_ort_model(
+    task: str,
+    model: str,
+    device: int,
+    num_threads: int = None,
+    onnx_dir: str = None,
+):
+    """Load the model into an ONNX Runtime session, exporting it from
+    the PyTorch checkpoint unless `onnx_dir` already holds the export.
+
+        Args:
+            task (str): pipeline task
+            model (str): model's name on HuggingFace or path
+            device (int): -1 for CPU, GPU's index otherwise
+            num_threads (int): threads of a single operator, None for
+            the number of physical cores
+            onnx_dir (str): directory to keep the exported model in,
+            so that it is exported only once
+
+        Returns:
+            ORTModel: model to be used in place of a PyTorch one
+    """
+    try:
+        import onnxruntime
+        import optimum.onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            "The onnx backend requires `pip install optimum[onnxruntime]`") from e
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    provider = "CPUExecutionProvider" if device < 0 else "CUDAExecutionProvider"
+
+    model_class = getattr(optimum.onnxruntime, ORT_MODEL_CLASSES[task])
+    exported = onnx_dir and os.path.isfile(os.path.join(onnx_dir, "model.onnx"))
+    # `export` replaced `from_transformers` in optimum 1.6, whose releases
+    # need a newer transformers than the pinned one
+    export_arg = "export"
+    if export_arg not in inspect.signature(model_class.from_pretrained).parameters:
+        export_arg = "from_transformers"
+    ort_model = model_class.from_pretrained(
+        onnx_dir if exported else model,
+        session_options=options,
+        provider=provider,
+        **{export_arg: not exported},
+    )
+    if onnx_dir and not exported:
+        ort_model.save_pretrained(onnx_dir)
+        AutoTokenizer.from_pretrained(model).save_pretrained(onnx_dir)
+        logger.info(f"Exported {model} to {onnx_dir}")
+    return ort_model
+
+
+def build_pipeline(
+    task: str,
+    model: str,
+    device: int,
+    backend: str = "pt",
+    num_threads: int = None,
+    onnx_dir: str = None,
+    **kwargs,
+):
+    """Create a transformers pipeline running on the given backend.
+
+    The pipelines of every backend take the same inputs and return the same
+    outputs, only the forward pass differs.
+
+        Args:
+            task (str): pipeline task
+            model (str): model's name on HuggingFace or path
+            device (int): -1 for CPU, GPU's index otherwise
+            backend (str): one of `BACKENDS`
+            num_threads (int): threads of PyTorch (process-wide) or of the
+            ONNX Runtime session, None to leave the default
+            onnx_dir (str): where the `onnx` backend keeps its export
+            **kwargs: other arguments of `transformers.pipeline`
+
+        Returns:
+            Pipeline: pipeline of the task
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Inappropriate value for backend.")
+
+    if backend == "onnx":
+        return pipeline(
+            task,
+            model=load_ort_model(task, model, device, num_threads, onnx_dir),
+            tokenizer=AutoTokenizer.from_pretrained(model),
+            **kwargs,
+        )
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if backend == "pt-int8" and device >= 0:
+        raise ValueError("Dynamic quantization runs on CPU only, set device to -1.")
+
+    nlp = pipeline(
+        task,
+        model=model,
+        tokenizer=model,
+        device=device,
+        **kwargs,
+    )
+    if backend == "pt-int8":
+        torch.quantization.quantize_dynamic(
+            nlp.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return nlp
+
@@ -0,0 +1,140 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_WAIT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class BatchScheduler:
+    """Merge work items submitted by concurrent requests into batches
+    and run them through a single batched handler.
+
+    Every caller enqueues its own items and blocks until they are done.
+    A background worker takes the oldest item, keeps collecting until
+    either `max_batch_size` items are gathered or `max_wait_ms` has passed
+    since that item was enqueued, runs the handler once on the whole batch
+    and hands each caller back its own results.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], List[Any]],
+        name: str,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        report_every: int = 1000,
+    ) -> None:
+        self._config = {
+            "name": name,
+            "max_batch_size": max_batch_size,
+            "max_wait_ms": max_wait_ms,
+        }
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.report_every = report_every
+
+        self.batch_size_hist = REGISTRY.histogram(
+            f"{name}_batch_size",
+            BATCH_SIZE_BUCKETS,
+            help="Number of items per batch.",
+        )
+        self.queue_wait_hist = REGISTRY.histogram(
+            f"{name}_queue_wait_seconds",
+            QUEUE_WAIT_BUCKETS,
+            help="Time items wait in the queue before their batch runs.",
+        )
+        self._n_batches = 0
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run,
+            name=f"{name}-scheduler",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def submit(self, items: List[Any]) -> List[Any]:
+        """Enqueue items and wait for their results.
+
+            Args:
+                items (List[Any]): work items accepted by the handler
+
+            Returns:
+                list: handler's results, in the same order as the given items
+        """
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future, time.monotonic()))
+            futures.append(future)
+
+        return [future.result() for future in futures]
+
+    def _collect(self) -> List[tuple]:
+        """Block for the next item, then gather a batch around it."""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Still take whatever is already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            for _, _, enqueued in batch:
+                self.queue_wait_hist.observe(started - enqueued)
+            self.batch_size_hist.observe(len(batch))
+
+            try:
+                results = self.handler([item for item, _, _ in batch])
+            except Exception as err:
+                for _, future, _ in batch:
+                    future.set_exception(err)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+
+            self._n_batches += 1
+            if self.report_every and self._n_batches % self.report_every == 0:
+                logger.info(self.batch_size_hist)
+                logger.info(self.queue_wait_hist)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return snapshots of the batch-size and queue-wait histograms."""
+        return {
+            self.batch_size_hist.name: self.batch_size_hist.snapshot(),
+            self.queue_wait_hist.name: self.queue_wait_hist.snapshot(),
+        }
+
+    def __str__(self) -> str:
+        return "name={!r}; max_batch_size={}; max_wait_ms={}".format(
+            self._config["name"],
+            self._config["max_batch_size"],
+            self._config["max_wait_ms"],
+        )
+
+    def __repr__(self) -> str:
+        return "{}(name={!r},max_batch_size={},max_wait_ms={})".format(
+            self.__class__.__name__,
+            self._config["name"],
+            self._config["max_batch_size"],
+            self._config["max_wait_ms"],
+        )
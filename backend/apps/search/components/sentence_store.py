@@ -0,0 +1,144 @@
+import argparse
+import json
+import mmap
+import os
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+class SentenceStore:
+    """Read-only store of sentences' text backed by memory-mapped files.
+
+    All sentences are kept in one UTF-8 blob, and sentence `i` (0-index)
+    is the slice between `offsets[i]` and `offsets[i+1]`. Both files are
+    mapped read-only, so every worker process on the host shares the same
+    pages of the OS cache instead of holding its own copy.
+    """
+
+    BLOB_FILE = "sentences.bin"
+    OFFSETS_FILE = "sentences.offsets.npy"
+
+    def __init__(self, path: str) -> None:
+        self._config = {
+            "path": path,
+        }
+        self.offsets = np.load(
+            os.path.join(path, self.OFFSETS_FILE),
+            mmap_mode="r",
+        )
+        with open(os.path.join(path, self.BLOB_FILE), "rb") as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._blob = b""
+        self._view = memoryview(self._blob)
+
+    def get_sentence(self, idx: int) -> str:
+        """Return the sentence at the given position (0-index)."""
+        return str(self._view[self.offsets[idx]:self.offsets[idx+1]], "utf-8")
+
+    # Step 11, 12
+    def retrieve_sentences(self, list_ids: List[int]) -> Dict[int, str]:
+        """Return list of L sentences in text, as `DBIndex.retrieve_sentences`.
+
+            Args:
+                list_ids (List[int]): list of sentences' index (1-index, as in
+                the database); unknown ones are left out
+
+            Returns:
+                dict: mappings between sentence's index number and sentence's value,
+                ordered by index like the database does
+                    Format:
+                    {
+                        <int>: <str>,
+                        ...
+                    }
+        """
+        return {
+            id_: self.get_sentence(id_-1)
+            for id_ in sorted(list_ids)
+            if 0 < id_ <= len(self)
+        }
+
+    @classmethod
+    def build(cls, sentences: Iterable[str], path: str) -> "SentenceStore":
+        """Write the given sentences (ordered by 0-index ID) into a new store."""
+        os.makedirs(path, exist_ok=True)
+        offsets = [0]
+        with open(os.path.join(path, cls.BLOB_FILE), "wb") as f:
+            for sentence in sentences:
+                data = (sentence or "").encode("utf-8")
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+        np.save(
+            os.path.join(path, cls.OFFSETS_FILE),
+            np.array(offsets, dtype=np.int64),
+        )
+        return cls(path)
+
+    @classmethod
+    def build_from_json(cls, docs_file: str, path: str) -> "SentenceStore":
+        """Build the store from an exported `docs.json` (flat list of sentences)."""
+        with open(docs_file, encoding="utf-8") as f:
+            sentences = json.load(f)
+        return cls.build(sentences, path)
+
+    @classmethod
+    def build_from_db(cls, db_conn, path: str) -> "SentenceStore":
+        """Build the store from the sentence table in a single streaming scan.
+
+            Args:
+                db_conn (DBIndex): connection to the database (1-index)
+                path (str): output directory
+        """
+        def iter_sentences():
+            expected_id = 1
+            for id_, sentence in db_conn.iter_sentences():
+                # Keep positions aligned with IDs if there are gaps
+                while expected_id < id_:
+                    yield ""
+                    expected_id += 1
+                yield sentence
+                expected_id += 1
+
+        return cls.build(iter_sentences(), path)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __str__(self) -> str:
+        return "{}; sentences={}".format(
+            self._config["path"],
+            len(self),
+        )
+
+    def __repr__(self) -> str:
+        return "{}(path={!r})".format(
+            self.__class__.__name__,
+            self._config["path"],
+        )
+
+
+if __name__ == "__main__":
+    # Usage (from `backend/`):
+    #   python -m apps.search.components.sentence_store --docs <docs.json> <output dir>
+    #   python -m apps.search.components.sentence_store --from-db <output dir>
+    parser = argparse.ArgumentParser(description="Build the sentence store.")
+    parser.add_argument("output", help="directory to write the store into")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--docs", help="exported docs.json to read sentences from")
+    source.add_argument(
+        "--from-db",
+        action="store_true",
+        help="read sentences from the sentence table in config.DB_SETTING",
+    )
+    args = parser.parse_args()
+
+    if args.docs:
+        store = SentenceStore.build_from_json(args.docs, args.output)
+    else:
+        from .config import DB_SETTING
+        from .db_connector import DBIndex
+        store = SentenceStore.build_from_db(DBIndex(**DB_SETTING), args.output)
+    print(f"Done: {store}")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.search.components.config import INDEXER_SETTING
+from apps.search.components.indexer import Indexer
+
+
+class Command(BaseCommand):
+    help = (
+        "Add or delete a document in ElasticSearch, the sentence table and "
+        "the Encoder's index at once, or reload the Encoder's index after "
+        "a full rebuild."
+    )
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="action", required=True)
+
+        add = subparsers.add_parser("add", help="add a new document")
+        add.add_argument("--title", required=True)
+        add.add_argument(
+            "--file",
+            required=True,
+            help="UTF-8 text file with the document's content",
+        )
+
+        delete = subparsers.add_parser("delete", help="delete a document")
+        delete.add_argument("doc_id", type=int, help="document's ID (0-index)")
+
+        subparsers.add_parser(
+            "all", help="reload the Encoder's index from disk")
+
+    def handle(self, *args, **options):
+        indexer = Indexer(**INDEXER_SETTING)
+        try:
+            if options["action"] == "add":
+                with open(options["file"], encoding="utf-8") as f:
+                    content = f.read()
+                doc_id = indexer.add_document(options["title"], content)
+                self.stdout.write(self.style.SUCCESS(f"Added document #{doc_id}"))
+            elif options["action"] == "delete":
+                indexer.delete_document(options["doc_id"])
+                self.stdout.write(
+                    self.style.SUCCESS(f"Deleted document #{options['doc_id']}"))
+            else:
+                indexer.reload_index()
+                self.stdout.write(self.style.SUCCESS("Reloaded the Encoder's index"))
+        except Exception as err:
+            raise CommandError(err)
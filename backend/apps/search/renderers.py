@@ -0,0 +1,180 @@
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+from rest_framework import renderers
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Formats of streamed responses, by value of the `stream` field
+STREAM_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+# Integer keys (sentences' IDs) become strings as with the standard library
+ORJSON_OPTIONS = 0
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def to_builtin(obj: Any) -> Any:
+    """Convert numpy values for the standard library's encoder."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize into compact UTF-8 JSON, with orjson if installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=ORJSON_OPTIONS)
+    # Ref: https://stackoverflow.com/a/34805851
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=to_builtin,
+    ).encode("utf-8")
+
+
+def render_event(stream_format: str, event: str, data: Any) -> bytes:
+    """Serialize an event as a line of NDJSON or a server-sent event."""
+    if stream_format == "sse":
+        return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+    return dumps({"event": event, "data": data}) + b"\n"
+
+
+class Projection:
+    """Parts of a response the client asked for.
+
+    `fields` lists dotted paths to keep, separated by commas, e.g.,
+    "answer,document.id" (items of lists are projected one by one, e.g.,
+    "data.label"). In streamed responses, the first part of a path is the
+    event, e.g., "answer.answer"; events left out are not sent, apart from
+    `timings`, `done` and `error`. `include_full_text=false` drops the
+    documents of full-text search (`full-text`), which may be large.
+    """
+
+    CONTROL_EVENTS = ("timings", "done", "error")
+
+    def __init__(self, fields: str = None, include_full_text: bool = True) -> None:
+        self._config = {
+            "fields": fields,
+            "include_full_text": include_full_text,
+        }
+        self.include_full_text = include_full_text
+        self.tree = self.parse_fields(fields) if fields else None
+
+    @classmethod
+    def from_request(cls, request) -> "Projection":
+        include_full_text = request.POST.get("include_full_text", "true")
+        return cls(
+            fields=request.POST.get("fields") or None,
+            include_full_text=include_full_text.lower() not in ("false", "0", "no"),
+        )
+
+    @staticmethod
+    def parse_fields(fields: str) -> Dict[str, Optional[Dict]]:
+        """Turn dotted paths into a tree, None standing for a whole subtree."""
+        tree = {}
+        for path in fields.split(","):
+            parts = [part.strip() for part in path.split(".")]
+            if not all(parts):
+                continue
+            node = tree
+            for part in parts[:-1]:
+                if part in node and node[part] is None:
+                    break
+                node = node.setdefault(part, {})
+            else:
+                node[parts[-1]] = None
+        return tree
+
+    @classmethod
+    def select(cls, data: Any, tree: Optional[Dict]) -> Any:
+        if tree is None:
+            return data
+        elif isinstance(data, list):
+            return [cls.select(item, tree) for item in data]
+        elif isinstance(data, dict):
+            return {
+                key: cls.select(value, tree[key])
+                for key, value in data.items()
+                if key in tree
+            }
+        return data
+
+    @property
+    def is_identity(self) -> bool:
+        return self.tree is None and self.include_full_text
+
+    @property
+    def key(self) -> str:
+        """Canonical form, to tell cached responses apart ("" for the whole)."""
+        if self.is_identity:
+            return ""
+        return json.dumps(
+            [self.tree, self.include_full_text], sort_keys=True, separators=(",", ":"))
+
+    def apply(self, result: Dict) -> Dict:
+        if self.is_identity or not isinstance(result, dict):
+            return result
+        if not self.include_full_text:
+            result = {key: value for key, value in result.items() if key != "full-text"}
+        return self.select(result, self.tree)
+
+    def apply_event(self, event: str, data: Any) -> Any:
+        """Return the event's data to send, None to leave the event out."""
+        if event in self.CONTROL_EVENTS:
+            return data
+        if event == "full-text" and not self.include_full_text:
+            return None
+        if self.tree is None:
+            return data
+        if event not in self.tree:
+            return None
+        return self.select(data, self.tree[event])
+
+    def __str__(self) -> str:
+        return "fields={!r}; include_full_text={}".format(
+            self._config["fields"],
+            self.include_full_text,
+        )
+
+    def __repr__(self) -> str:
+        return "{}(fields={!r},include_full_text={})".format(
+            self.__class__.__name__,
+            self._config["fields"],
+            self.include_full_text,
+        )
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """Accept requests for NDJSON streams, which the views send themselves.
+    Renders responses of DRF itself, i.e., errors, as an `error` event."""
+
+    media_type = STREAM_CONTENT_TYPES["ndjson"]
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return render_event(self.format, "error", data)
+
+
+class EventStreamRenderer(NDJSONRenderer):
+    """Accept requests for server-sent events, which the views send themselves."""
+
+    media_type = STREAM_CONTENT_TYPES["sse"]
+    format = "sse"
+
+
+STREAM_RENDERER_CLASSES = list(api_settings.DEFAULT_RENDERER_CLASSES) + [
+    NDJSONRenderer,
+    EventStreamRenderer,
+]
@@ -1,3 +1,543 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from .components import cache, indexer
+from .components.doc_map import DocRangeIndex
+from .components.encoder_pb2 import SyncResponse
+from .components.retriever import Retriever
+from .components.scheduler import BatchScheduler
+from .components.sentence_store import SentenceStore
+
+
+class IndexerTests(SimpleTestCase):
+    """Order of the changes to the indexes, with every index faked."""
+
+    def setUp(self):
+        # Calls to every index are recorded in one list, to check their order
+        self.calls = mock.Mock()
+        for name, index in (("DBIndex", "db"), ("ESIndex", "es"), ("Reranker", "reranker")):
+            patcher = mock.patch.object(
+                indexer, name, return_value=getattr(self.calls, index))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            indexer, "bump_corpus_version", self.calls.bump_corpus_version)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.calls.reranker.sync.return_value = SyncResponse.Error.NO_ERROR
+        self.calls.db.insert_document.return_value = (3, [7, 8])  # 1-index
+        self.calls.db.get_sentences_ids.return_value = [7, 8]     # 1-index
+        self.indexer = indexer.Indexer({}, {}, {}, retry_wait=0, version_file="version")
+
+    def test_add_document(self):
+        doc_id = self.indexer.add_document("Title", "Content", ["A.", "B."])
+
+        self.assertEqual(doc_id, 2)
+        # Searchable by full-text search only once the sentences are indexed
+        self.assertEqual(self.calls.mock_calls, [
+            mock.call.db.insert_document("Title", "Content", ["A.", "B."]),
+            mock.call.reranker.sync(doc_id=2, sent_ids=[6, 7], sentences=["A.", "B."]),
+            mock.call.es.index_document(2, {"title": "Title", "content": "Content"}),
+            mock.call.bump_corpus_version("version"),
+        ])
+
+    def test_add_document_rolls_back_es_failure(self):
+        self.calls.es.index_document.side_effect = ConnectionError
+
+        with self.assertRaises(ConnectionError):
+            self.indexer.add_document("Title", "Content", ["A.", "B."])
+
+        self.assertEqual(self.calls.mock_calls, [
+            mock.call.db.insert_document("Title", "Content", ["A.", "B."]),
+            mock.call.reranker.sync(doc_id=2, sent_ids=[6, 7], sentences=["A.", "B."]),
+            mock.call.es.index_document(2, {"title": "Title", "content": "Content"}),
+            mock.call.reranker.sync(doc_id=2, sent_ids=[6, 7], delete=True),
+            mock.call.db.delete_document(3),
+            mock.call.bump_corpus_version("version"),
+        ])
+
+    def test_add_document_rolls_back_encoder_failure(self):
+        self.calls.reranker.sync.return_value = SyncResponse.Error.UNKNOWN_ERROR
+
+        with self.assertRaises(RuntimeError):
+            self.indexer.add_document("Title", "Content", ["A.", "B."])
+
+        self.calls.es.index_document.assert_not_called()
+        self.assertEqual(self.calls.mock_calls[-2:], [
+            mock.call.db.delete_document(3),
+            mock.call.bump_corpus_version("version"),
+        ])
+
+    def test_delete_document(self):
+        self.indexer.delete_document(2)
+
+        # Out of full-text search before the sentences are removed
+        self.assertEqual(self.calls.mock_calls, [
+            mock.call.db.get_sentences_ids([3]),
+            mock.call.es.delete_document(2),
+            mock.call.reranker.sync(doc_id=2, sent_ids=[6, 7], delete=True),
+            mock.call.db.delete_document(3),
+            mock.call.bump_corpus_version("version"),
+        ])
+
+    def test_delete_document_bumps_version_on_failure(self):
+        self.calls.reranker.sync.return_value = SyncResponse.Error.UNKNOWN_ERROR
+
+        with self.assertRaises(RuntimeError):
+            self.indexer.delete_document(2)
+
+        self.calls.db.delete_document.assert_not_called()
+        self.assertEqual(
+            self.calls.mock_calls[-1], mock.call.bump_corpus_version("version"))
+
+
+class DocRangeIndexTests(SimpleTestCase):
+    """Lookups of the map exported by `dataset/build_corpus.py`."""
+
+    def setUp(self):
+        # Documents of 2, 0, 3 and 0 sentences, written as `segment` does
+        doc_range_map, n_sentences = {}, 0
+        for doc_id, n_doc_sentences in enumerate((2, 0, 3, 0)):
+            doc_range_map[str(doc_id)] = {
+                "start": n_sentences,
+                "end": n_sentences + n_doc_sentences - 1,
+            }
+            n_sentences += n_doc_sentences
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "doc_range_map.json")
+            with open(path, "w") as f:
+                json.dump(doc_range_map, f)
+            self.doc_map = DocRangeIndex.from_json(path)
+
+    def test_get_doc_ids_at_range_boundaries(self):
+        # First and last sentence of each document
+        self.assertEqual(self.doc_map.get_doc_ids([0, 1, 2, 4]).tolist(), [0, 0, 2, 2])
+        self.assertEqual(self.doc_map.get_doc_id(3), 2)
+
+    def test_get_doc_ids_out_of_ranges(self):
+        self.assertEqual(self.doc_map.get_doc_ids([5, 100, -1]).tolist(), [-1, -1, -1])
+
+    def test_get_sentences_ids(self):
+        self.assertEqual(self.doc_map.get_sentences_ids([2, 0]), [2, 3, 4, 0, 1])
+        # Unknown documents are left out
+        self.assertEqual(self.doc_map.get_sentences_ids([4, -1]), [])
+
+    def test_empty_documents(self):
+        self.assertEqual(len(self.doc_map), 4)
+        self.assertTrue(self.doc_map.has_document(1))
+        self.assertTrue(self.doc_map.has_document(3))
+        self.assertEqual(self.doc_map.get_sentences_ids([1, 3]), [])
+        self.assertEqual(self.doc_map.get_sentence_range(1), (2, 1))
+
+    def test_from_db_with_deleted_document(self):
+        db_conn = mock.Mock()
+        # Document 2 (1-index) and its sentences were deleted
+        db_conn.get_doc_ranges.return_value = [(1, 1, 2), (3, 5, 6)]   # 1-index
+        doc_map = DocRangeIndex.from_db(db_conn)
+
+        self.assertFalse(doc_map.has_document(1))
+        self.assertEqual(doc_map.get_doc_ids([1, 2, 3, 4]).tolist(), [0, -1, -1, 2])
+
+    def test_empty_map(self):
+        doc_map = DocRangeIndex.from_ranges([])
+
+        self.assertEqual(doc_map.get_doc_ids([0]).tolist(), [-1])
+        self.assertEqual(doc_map.get_sentences_ids([0]), [])
+
+
+class SentenceStoreTests(SimpleTestCase):
+    """Round trip of sentences through the blob and offsets files."""
+
+    SENTENCES = [
+        "Đến năm 9000 BP, Châu Âu đã có rừng bao phủ toàn bộ.",
+        "",
+        "Bao nhiêu ngày mùa đông dưới 0 độ?",
+        "MLQA",
+    ]
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+    def assert_round_trip(self, store, sentences):
+        self.assertEqual(len(store), len(sentences))
+        self.assertEqual(
+            store.retrieve_sentences(range(1, len(sentences)+1)),   # 1-index
+            {id_+1: sentence for id_, sentence in enumerate(sentences)},
+        )
+
+    def test_build(self):
+        store = SentenceStore.build(self.SENTENCES, self.tmp_dir)
+
+        self.assert_round_trip(store, self.SENTENCES)
+        # Offsets count bytes of UTF-8, not characters
+        data = [sentence.encode("utf-8") for sentence in self.SENTENCES]
+        self.assertEqual(
+            store.offsets.tolist(),
+            [0] + [sum(map(len, data[:i+1])) for i in range(len(data))],
+        )
+        with open(os.path.join(self.tmp_dir, SentenceStore.BLOB_FILE), "rb") as f:
+            self.assertEqual(f.read(), b"".join(data))
+        # Reopened from disk
+        self.assert_round_trip(SentenceStore(self.tmp_dir), self.SENTENCES)
+
+    def test_retrieve_sentences(self):
+        store = SentenceStore.build(self.SENTENCES, self.tmp_dir)
+
+        # Ordered by index, unknown ones left out
+        sentences = store.retrieve_sentences([4, 0, 1, 5])
+        self.assertEqual(list(sentences.items()), [(1, self.SENTENCES[0]), (4, "MLQA")])
+
+    def test_build_empty_sentences(self):
+        store = SentenceStore.build(["", None], self.tmp_dir)
+
+        self.assert_round_trip(store, ["", ""])
+
+    def test_build_from_db_with_gaps(self):
+        db_conn = mock.Mock()
+        db_conn.iter_sentences.return_value = [(1, "Một."), (3, "Ba.")]   # 1-index
+        store = SentenceStore.build_from_db(db_conn, self.tmp_dir)
+
+        self.assert_round_trip(store, ["Một.", "", "Ba."])
+
+    def test_build_command(self):
+        docs_file = os.path.join(self.tmp_dir, "docs.json")
+        with open(docs_file, "w", encoding="utf-8") as f:
+            json.dump(self.SENTENCES, f, ensure_ascii=False)
+        output = os.path.join(self.tmp_dir, "store")
+
+        subprocess.run(
+            [
+                sys.executable, "-m", "apps.search.components.sentence_store",
+                "--docs", docs_file, output,
+            ],
+            cwd=settings.BASE_DIR,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+        self.assert_round_trip(SentenceStore(output), self.SENTENCES)
+
+
+class DenseRankingTests(SimpleTestCase):
+
+    def setUp(self):
+        # Only the re-ranking setting is needed, skip the connections
+        self.retriever = Retriever.__new__(Retriever)
+        self.retriever.mode = "dense"
+        self.retriever.reranker_conn = mock.Mock(L=2)
+
+    def test_normalized_after_truncating(self):
+        dense_sentences = [
+            {"id": 4, "distance": 3.0},
+            {"id": 1, "distance": 4.0},
+            {"id": 7, "distance": 100.0},
+        ]
+
+        ranked = self.retriever.rank_sentences("query", [], dense_sentences)
+
+        self.assertEqual(
+            ranked, [{"id": 4, "distance": 0.6}, {"id": 1, "distance": 0.8}])
+        self.retriever.reranker_conn.rerank.assert_not_called()
+
+    def test_zero_scores(self):
+        dense_sentences = [{"id": 4, "distance": 0.0}, {"id": 1, "distance": 0.0}]
+
+        self.assertEqual(
+            self.retriever.select_dense(dense_sentences), dense_sentences)
+
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_evicts_least_recently_used_over_byte_budget(self):
+        lru = cache.LRUCache(max_entries=10, max_bytes=10)
+        lru.set("a", b"aaaa")
+        lru.set("b", b"bbbb")
+        self.assertEqual(lru.get("a"), b"aaaa")
+        lru.set("c", b"cccc")
+
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), b"aaaa")
+        self.assertEqual(lru.get("c"), b"cccc")
+        self.assertEqual((len(lru), lru.n_bytes, lru.evictions), (2, 8, 1))
+
+    def test_evicts_over_max_entries(self):
+        lru = cache.LRUCache(max_entries=2, max_bytes=100)
+        for key in "abc":
+            lru.set(key, key.encode())
+
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 2)
+
+    def test_replaces_value(self):
+        lru = cache.LRUCache(max_entries=10, max_bytes=10)
+        lru.set("a", b"aaaa")
+        lru.set("a", b"aaaaaaaa")
+
+        self.assertEqual((len(lru), lru.n_bytes, lru.evictions), (1, 8, 0))
+
+    def test_skips_values_over_byte_budget(self):
+        lru = cache.LRUCache(max_entries=10, max_bytes=4)
+        lru.set("a", b"aaaaa")
+
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(lru.n_bytes, 0)
+
+    def test_expires_after_ttl(self):
+        lru = cache.LRUCache(max_entries=10, max_bytes=100, ttl=60)
+        with mock.patch.object(cache.time, "monotonic", return_value=1000.0):
+            lru.set("a", b"aaaa")
+        with mock.patch.object(cache.time, "monotonic", return_value=1059.0):
+            self.assertEqual(lru.get("a"), b"aaaa")
+        with mock.patch.object(cache.time, "monotonic", return_value=1060.0):
+            self.assertIsNone(lru.get("a"))
+
+        self.assertEqual((len(lru), lru.n_bytes, lru.evictions), (0, 0, 1))
+
+
+@override_settings(CACHES={
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "tests",
+    },
+})
+class ResponseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.version_file = os.path.join(tmp_dir.name, "corpus_version")
+
+    def make_cache(self, **kwargs):
+        response_cache = cache.ResponseCache(version_file=self.version_file, **kwargs)
+        self.addCleanup(response_cache.clear)
+        if response_cache.shared is not None:
+            self.addCleanup(response_cache.shared.clear)
+        return response_cache
+
+    def test_key_follows_normalized_query_and_variant(self):
+        response_cache = self.make_cache()
+        key = response_cache.make_key("answering", "Hà  Nội ")
+
+        self.assertEqual(key, response_cache.make_key("answering", "Hà Nội"))
+        self.assertNotEqual(key, response_cache.make_key("inference", "Hà Nội"))
+        self.assertNotEqual(key, response_cache.make_key("answering", "Hà Nội", "[]"))
+
+    def test_miss_after_version_bump(self):
+        response_cache = self.make_cache()
+        key = response_cache.make_key("answering", "Hà Nội")
+        response_cache.set(key, b"{}")
+        self.assertEqual(response_cache.get(key), b"{}")
+
+        cache.bump_corpus_version(self.version_file)
+
+        new_key = response_cache.make_key("answering", "Hà Nội")
+        self.assertNotEqual(new_key, key)
+        self.assertIsNone(response_cache.get(new_key))
+        self.assertEqual(response_cache.stats()["miss"], 1)
+
+    def test_shared_tier(self):
+        writer = self.make_cache(shared_alias="responses")
+        reader = self.make_cache(shared_alias="responses")
+        key = writer.make_key("answering", "Hà Nội")
+        writer.set(key, b"{}")
+
+        # Found in the tier of the other process first, then in its own
+        self.assertEqual(reader.get(key), b"{}")
+        self.assertEqual(reader.get(key), b"{}")
+        self.assertEqual(
+            {result: reader.stats()[result] for result in ("hit_local", "hit_shared", "miss")},
+            {"hit_local": 1, "hit_shared": 1, "miss": 0},
+        )
+
+
+class CorpusVersionTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.version_file = os.path.join(tmp_dir.name, "corpus_version")
+
+    def test_without_file(self):
+        self.assertEqual(cache.CorpusVersion().get(), "0")
+        self.assertEqual(cache.CorpusVersion(self.version_file).get(), "0")
+
+    def test_reads_file_only_when_changed(self):
+        version = cache.CorpusVersion(self.version_file)
+        new_version = cache.bump_corpus_version(self.version_file)
+
+        with mock.patch.object(
+            cache, "read_corpus_version", wraps=cache.read_corpus_version,
+        ) as read_corpus_version:
+            self.assertEqual(version.get(), new_version)
+            self.assertEqual(version.get(), new_version)
+
+        read_corpus_version.assert_called_once_with(self.version_file)
+
+
+class StageCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.version_file = os.path.join(tmp_dir.name, "corpus_version")
+        self.stage_cache = cache.StageCache(
+            {
+                "rerank": {"max_entries": 10, "max_bytes": 1024, "ttl": 60},
+                "sentences": {"max_entries": 10, "max_bytes": 100},
+            },
+            self.version_file,
+        )
+
+    def test_get_returns_copies(self):
+        self.stage_cache.set("rerank", "key", [{"id": 1, "distance": 0.5}])
+        value = self.stage_cache.get("rerank", "key")
+        value[0]["distance"] = 0.0
+
+        self.assertEqual(
+            self.stage_cache.get("rerank", "key"), [{"id": 1, "distance": 0.5}])
+
+    def test_none_is_a_value(self):
+        self.assertIs(self.stage_cache.get("rerank", "key"), cache.MISSING)
+        self.stage_cache.set("rerank", "key", None)
+
+        self.assertIsNone(self.stage_cache.get("rerank", "key"))
+
+    def test_stage_left_out(self):
+        self.stage_cache.set("dense", "key", [])
+
+        self.assertIs(self.stage_cache.get("dense", "key"), cache.MISSING)
+        self.assertNotIn("dense", self.stage_cache.stats())
+
+    def test_miss_after_version_bump(self):
+        self.stage_cache.set("rerank", "key", [])
+        self.assertEqual(self.stage_cache.get("rerank", "key"), [])
+
+        cache.bump_corpus_version(self.version_file)
+
+        self.assertIs(self.stage_cache.get("rerank", "key"), cache.MISSING)
+        self.assertEqual(
+            {result: self.stage_cache.stats()["rerank"][result] for result in ("hit", "miss")},
+            {"hit": 1, "miss": 1},
+        )
+
+    def test_evicts_over_byte_budget_of_the_stage(self):
+        for key in range(3):
+            self.stage_cache.set("sentences", key, "x" * 30)
+
+        self.assertIs(self.stage_cache.get("sentences", 0), cache.MISSING)
+        self.assertEqual(self.stage_cache.get("sentences", 2), "x" * 30)
+        stats = self.stage_cache.stats()["sentences"]
+        self.assertLessEqual(stats["bytes"], 100)
+        self.assertEqual(stats["evictions"], 1)
+
+    def test_expires_after_ttl_of_the_stage(self):
+        with mock.patch.object(cache.time, "monotonic", return_value=1000.0):
+            self.stage_cache.set("rerank", "key", [])
+            self.stage_cache.set("sentences", "key", {})
+        with mock.patch.object(cache.time, "monotonic", return_value=1060.0):
+            self.assertIs(self.stage_cache.get("rerank", "key"), cache.MISSING)
+            self.assertEqual(self.stage_cache.get("sentences", "key"), {})
+
+    def test_digest(self):
+        self.assertEqual(cache.StageCache.digest([1, 2]), cache.StageCache.digest((1, 2)))
+        self.assertNotEqual(cache.StageCache.digest([1, 2]), cache.StageCache.digest([2, 1]))
+
+
+class BatchSchedulerTests(SimpleTestCase):
+    """Batching of a stub handler, which records its batches."""
+
+    def setUp(self):
+        self.batches = []
+        # The batch of the item "block" waits for it, so that other items queue up
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+        self.pool = ThreadPoolExecutor(max_workers=8)
+        self.addCleanup(self.pool.shutdown)
+
+    def handler(self, items):
+        self.batches.append(items)
+        if "block" in items:
+            self.gate.wait(5)
+        if "fail" in items:
+            raise ValueError("Handler failed.")
+        return [f"result of {item}" for item in items]
+
+    def make_scheduler(self, max_batch_size, max_wait_ms):
+        return BatchScheduler(
+            self.handler,
+            name="test_scheduler",
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+        )
+
+    def block(self, scheduler):
+        """Submit the item "block", returning once the worker holds its batch."""
+        blocked = self.pool.submit(scheduler.submit, ["block"])
+        while not self.batches:
+            time.sleep(0.001)
+        return blocked
+
+    def wait_for_queue(self, scheduler, n_waiting):
+        """Wait until `n_waiting` items are queued behind the held batch."""
+        while scheduler._queue.qsize() < n_waiting:
+            time.sleep(0.001)
+
+    def test_coalesces_up_to_max_batch_size(self):
+        scheduler = self.make_scheduler(max_batch_size=3, max_wait_ms=50)
+        blocked = self.block(scheduler)
+        callers = [self.pool.submit(scheduler.submit, [i]) for i in range(5)]
+        self.wait_for_queue(scheduler, 5)
+        self.gate.set()
+
+        # Every caller gets its own result back
+        for i, caller in enumerate(callers):
+            self.assertEqual(caller.result(5), [f"result of {i}"])
+        self.assertEqual(blocked.result(5), ["result of block"])
+        self.assertEqual([len(batch) for batch in self.batches], [1, 3, 2])
+        self.assertEqual(sorted(sum(self.batches[1:], [])), list(range(5)))
+
+    def test_keeps_order_of_the_items(self):
+        scheduler = self.make_scheduler(max_batch_size=3, max_wait_ms=50)
+
+        results = scheduler.submit(list(range(7)))
+
+        self.assertEqual(results, [f"result of {i}" for i in range(7)])
+        self.assertEqual(self.batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_flushes_partial_batch_after_max_wait(self):
+        scheduler = self.make_scheduler(max_batch_size=10, max_wait_ms=50)
+
+        started = time.monotonic()
+        results = scheduler.submit([1, 2])
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(results, ["result of 1", "result of 2"])
+        self.assertEqual(self.batches, [[1, 2]])
+
+    def test_handler_exception_reaches_every_caller(self):
+        scheduler = self.make_scheduler(max_batch_size=10, max_wait_ms=50)
+        self.block(scheduler)
+        callers = [self.pool.submit(scheduler.submit, [item]) for item in ("fail", 1)]
+        self.wait_for_queue(scheduler, 2)
+        self.gate.set()
+
+        for caller in callers:
+            with self.assertRaises(ValueError):
+                caller.result(5)
+        self.assertCountEqual(self.batches[1], ["fail", 1])
+        # The worker goes on with the next batches
+        self.assertEqual(scheduler.submit([2]), ["result of 2"])
@@ -18,4 +18,28 @@ urlpatterns = [
         views.AnsweringView.as_view(),
         name="question-answering",
     ),
-]
\ No newline at end of file
+    path(
+        "metrics/",
+        views.MetricsView.as_view(),
+        name="metrics",
+    ),
+]
+
+if views.async_retriever_client is not None:
+    urlpatterns += [
+        path(
+            "async/relevance/",
+            views.search_relevance_async,
+            name="search-relevance-async",
+        ),
+        path(
+            "async/inference/",
+            views.inference_async,
+            name="inference-async",
+        ),
+        path(
+            "async/answering/",
+            views.answering_async,
+            name="question-answering-async",
+        ),
+    ]
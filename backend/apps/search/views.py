@@ -1,59 +1,259 @@
-import json
+import logging
 
-from django.http import HttpResponse, JsonResponse
-from rest_framework import status, views
+from asgiref.sync import sync_to_async
+from django.http import (
+    HttpResponse,
+    HttpResponseNotAllowed,
+    StreamingHttpResponse,
+)
+from rest_framework import views
 
-from .components.config import RETRIEVER_SETTING
+from .components.cache import ResponseCache
+from .components.config import (
+    ASYNC_RETRIEVER_SETTING,
+    DEBUG_TIMINGS_HEADER,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SETTING,
+    RETRIEVER_SETTING,
+)
+from .components.metrics import REGISTRY
 from .components.retriever import Retriever
+from .renderers import (
+    STREAM_CONTENT_TYPES,
+    STREAM_RENDERER_CLASSES,
+    Projection,
+    dumps,
+    render_event,
+)
+
+logger = logging.getLogger(__name__)
 
 retriever_client = Retriever(**RETRIEVER_SETTING)
 
+# The asynchronous endpoints need `aiohttp` and `aiomysql`, left out of
+# plain WSGI deployments; `urls.py` registers them only if available
+async_retriever_client = None
+try:
+    import aiomysql  # noqa: F401
+    from .components.async_retriever import AsyncRetriever
+except ImportError as e:
+    logger.info(f"Asynchronous endpoints are disabled: {e}")
+else:
+    async_retriever_client = AsyncRetriever(retriever_client, **ASYNC_RETRIEVER_SETTING)
+
+response_cache = None
+if RESPONSE_CACHE_ENABLED:
+    response_cache = ResponseCache(**RESPONSE_CACHE_SETTING)
+
+
+def get_debug_timings(request):
+    """Return a dict to collect the stage timings in if the request asks
+    for them, None otherwise."""
+    if DEBUG_TIMINGS_HEADER in request.headers:
+        return {}
+    return None
+
+
+def add_timings(result, timings):
+    """Attach the stage timings to the result if they were asked for."""
+    if timings is not None and result:
+        result["timings"] = timings
+    return result
+
+
+def render_result(result, projection, timings):
+    """Serialize the parts of the result asked for, with the stage timings
+    if asked for."""
+    return dumps(add_timings(projection.apply(result), timings))
+
+
+def json_response(body):
+    return HttpResponse(body, content_type="application/json")
+
+
+def get_cache_key(endpoint, query, timings, projection):
+    """Return the query, normalized if the response is to be cached,
+    and its cache key (None if not cached), which tells projections apart.
+    Requests asking for stage timings are never cached."""
+    if not query or timings is not None or response_cache is None:
+        return query, None
+    query = response_cache.normalize_query(query)
+    return query, response_cache.make_key(endpoint, query, projection.key)
+
+
+def respond(endpoint, request, retrieve):
+    """Answer the query of the request with `retrieve(query, timings)`,
+    or from the response cache."""
+    timings = get_debug_timings(request)
+    projection = Projection.from_request(request)
+    query, key = get_cache_key(
+        endpoint, request.POST.get("data", ""), timings, projection)
+    if key is not None:
+        body = response_cache.get(key)
+        if body is not None:
+            return json_response(body)
+
+    result = {}
+    if query:
+        result = retrieve(query, timings)
+
+    body = render_result(result, projection, timings)
+    if key is not None:
+        response_cache.set(key, body)
+    return json_response(body)
+
+
+async def respond_async(endpoint, request, retrieve):
+    """Asynchronous `respond`. The shared tier of the response cache is
+    reached from a thread, since Django's cache API is synchronous."""
+    timings = get_debug_timings(request)
+    projection = Projection.from_request(request)
+    query, key = get_cache_key(
+        endpoint, request.POST.get("data", ""), timings, projection)
+    if key is not None:
+        body = response_cache.get_local(key)
+        if body is None and response_cache.shared is not None:
+            body = await sync_to_async(response_cache.get_shared)(key)
+        if body is not None:
+            return json_response(body)
+
+    result = {}
+    if query:
+        result = await retrieve(query, timings)
+
+    body = render_result(result, projection, timings)
+    if key is not None:
+        if response_cache.shared is not None:
+            await sync_to_async(response_cache.set)(key, body)
+        else:
+            response_cache.set(key, body)
+    return json_response(body)
+
+
+def get_stream_format(request):
+    """Return the format to stream the response in, asked for by the
+    `stream` field or the Accept header, None for a single JSON."""
+    stream_format = request.POST.get("stream")
+    if stream_format in STREAM_CONTENT_TYPES:
+        return stream_format
+    # Picked by DRF's content negotiation among the view's renderers
+    stream_format = request.accepted_renderer.format
+    if stream_format in STREAM_CONTENT_TYPES:
+        return stream_format
+    return None
+
+
+def respond_stream(stream_format, request, stream):
+    """Stream the events of `stream(query, timings)` as they come, ending
+    with an `error` event if it fails midway, the stage timings if asked
+    for and a `done` event. Streamed responses bypass the response cache."""
+    timings = get_debug_timings(request)
+    projection = Projection.from_request(request)
+    query = request.POST.get("data", "")
+
+    def events():
+        try:
+            if query:
+                for event, data in stream(query, timings):
+                    data = projection.apply_event(event, data)
+                    if data is not None:
+                        yield render_event(stream_format, event, data)
+        except Exception:
+            # The status was already sent, tell the client within the stream
+            logger.exception("Streaming the response failed")
+            yield render_event(
+                stream_format, "error", {"detail": "A server error occurred."})
+        if timings is not None:
+            yield render_event(stream_format, "timings", timings)
+        yield render_event(stream_format, "done", {})
+
+    response = StreamingHttpResponse(
+        events(),
+        content_type=STREAM_CONTENT_TYPES[stream_format] + "; charset=utf-8",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Keep reverse proxies like nginx from buffering the events
+    response["X-Accel-Buffering"] = "no"
+    return response
+
 
 class SearchRelevanceView(views.APIView):
     """An API view for searching for relevant document."""
 
     def post(self, request, *args, **kwargs):
-        query = request.POST.get("data", "")
-        result = {}
-        if query:
-            result = retriever_client.retrieve(query)
-
-        # Ref: https://stackoverflow.com/a/34805851
-        return HttpResponse(
-            json.dumps(result, ensure_ascii=False),
-            content_type="application/json",
-        )
+        return respond("relevance", request, retriever_client.retrieve)
 
 
 class InferenceView(views.APIView):
     """An API view for confidence examination for a given information."""
 
+    renderer_classes = STREAM_RENDERER_CLASSES
+
     def post(self, request, *args, **kwargs):
         # query = "Đến năm 9000 BP, Châu Âu đã có rừng bao phủ toàn bộ"
-        query = request.POST.get("data", "")
-        result = {}
-        if query:
-            result = retriever_client.retrieve_inference(query)
-
-        # Ref: https://stackoverflow.com/a/34805851
-        return HttpResponse(
-            json.dumps(result, ensure_ascii=False),
-            content_type="application/json",
-        )
+        stream_format = get_stream_format(request)
+        if stream_format is not None:
+            return respond_stream(
+                stream_format, request, retriever_client.stream_inference)
+        return respond("inference", request, retriever_client.retrieve_inference)
 
 
 class AnsweringView(views.APIView):
     """An API view for answering a given question."""
 
+    renderer_classes = STREAM_RENDERER_CLASSES
+
     def post(self, request, *args, **kwargs):
         # query = "Bao nhiêu ngày mùa đông dưới 0 độ?"
-        query = request.POST.get("data", "")
-        result = {}
-        if query:
-            result = retriever_client.retrieve_answer(query)
+        stream_format = get_stream_format(request)
+        if stream_format is not None:
+            return respond_stream(
+                stream_format, request, retriever_client.stream_answer)
+        return respond("answering", request, retriever_client.retrieve_answer)
+
+
+class MetricsView(views.APIView):
+    """An API view exposing latency histograms in Prometheus text format."""
 
-        # Ref: https://stackoverflow.com/a/34805851
+    def get(self, request, *args, **kwargs):
         return HttpResponse(
-            json.dumps(result, ensure_ascii=False),
-            content_type="application/json",
+            REGISTRY.render_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
         )
+
+
+# Asynchronous views, to be served from `backend/asgi.py` so that one worker
+# handles many concurrent requests. Django's decorators are not async-aware
+# in this version, hence the plain method check and `csrf_exempt` attribute
+# (as DRF's APIView does for the views above).
+
+async def search_relevance_async(request):
+    """An asynchronous API view for searching for relevant document."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    return await respond_async(
+        "relevance", request, async_retriever_client.retrieve)
+
+
+async def inference_async(request):
+    """An asynchronous API view for confidence examination for a given information."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    return await respond_async(
+        "inference", request, async_retriever_client.retrieve_inference)
+
+
+async def answering_async(request):
+    """An asynchronous API view for answering a given question."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    return await respond_async(
+        "answering", request, async_retriever_client.retrieve_answer)
+
+
+search_relevance_async.csrf_exempt = True
+inference_async.csrf_exempt = True
+answering_async.csrf_exempt = True
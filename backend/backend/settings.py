@@ -131,6 +131,25 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# "responses" is the tier of the response cache shared by the worker
+# processes of this host; use Memcached or Redis to share it among hosts
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(BASE_DIR / '.cache' / 'responses'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,281 @@
+"""In-process stand-ins of ElasticSearch, MySQL and the Encoder server.
+
+They plug into the real `ESIndex`, `DBIndex` and `Reranker` components at the
+transport level (ElasticSearch client, SQL engine and gRPC stub), so that the
+request building and response parsing of the components are benchmarked too.
+Each of them can add a fixed latency per call to stand for the network.
+"""
+import math
+import re
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from apps.search.components import encoder_pb2
+from apps.search.components.db_connector import DBIndex
+from apps.search.components.es_connector import ESIndex
+from apps.search.components.ranker import Reranker
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def sleep_ms(latency_ms: float) -> None:
+    if latency_ms > 0:
+        time.sleep(latency_ms / 1000)
+
+
+class LocalESClient:
+    """Minimal `Elasticsearch` client with BM25 search over documents
+    held in memory."""
+
+    def __init__(
+        self,
+        docs: List[Dict[str, str]],
+        latency_ms: float = 0.0,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.docs = docs
+        self.latency_ms = latency_ms
+        self.k1 = k1
+        self.b = b
+
+        self.postings = defaultdict(list)   # term -> [(doc_id, term frequency)]
+        self.doc_lengths = []
+        for doc_id, doc in enumerate(docs):
+            terms = tokenize(doc["content"])
+            self.doc_lengths.append(len(terms))
+            for term, freq in Counter(terms).items():
+                self.postings[term].append((doc_id, freq))
+        self.avg_length = sum(self.doc_lengths) / max(len(docs), 1)
+
+    @staticmethod
+    def get_query_text(body: Dict) -> str:
+        """Find the query string in any kind of full-text query."""
+        if isinstance(body, dict):
+            for key, value in body.items():
+                if key == "query" and isinstance(value, str):
+                    return value
+                found = LocalESClient.get_query_text(value)
+                if found:
+                    return found
+        elif isinstance(body, list):
+            for value in body:
+                found = LocalESClient.get_query_text(value)
+                if found:
+                    return found
+        return ""
+
+    def get_source(self, doc_id: int, body: Dict = None) -> Dict[str, str]:
+        source = self.docs[doc_id]
+        includes = (body or {}).get("_source")
+        if isinstance(includes, dict):
+            includes = includes.get("includes")
+        if isinstance(includes, list):
+            source = {field: source[field] for field in includes if field in source}
+        return dict(source)
+
+    def search(self, index: str, body: Dict, size: int = 10, **kwargs) -> Dict:
+        sleep_ms(self.latency_ms)
+        size = body.get("size", size)
+        scores = defaultdict(float)
+        n_docs = len(self.docs)
+        for term in set(tokenize(self.get_query_text(body))):
+            postings = self.postings.get(term, [])
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+
+        top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:size]
+        return {
+            "hits": {
+                "hits": [
+                    {
+                        "_id": str(doc_id),
+                        "_score": score,
+                        "_source": self.get_source(doc_id, body),
+                    }
+                    for doc_id, score in top
+                ],
+            },
+        }
+
+    def mget(self, index: str, body: Dict, **kwargs) -> Dict:
+        sleep_ms(self.latency_ms)
+        docs = []
+        for _id in body["ids"]:
+            doc_id = int(_id)
+            found = 0 <= doc_id < len(self.docs)
+            hit = {"_id": _id, "found": found}
+            if found:
+                hit["_source"] = self.get_source(doc_id, body)
+            docs.append(hit)
+        return {"docs": docs}
+
+
+class LocalESIndex(ESIndex):
+    """`ESIndex` over an in-memory BM25 index of the documents (0-index)."""
+
+    def __init__(
+        self,
+        docs: List[Dict[str, str]],
+        list_fields: List[str],
+        K: int = 100,
+        query: Dict[str, Union[str, bool]] = None,
+        latency_ms: float = 0.0,
+    ) -> None:
+        self._config = {
+            "host": "local",
+            "port": 0,
+            "index": "benchmark",
+        }
+        self.conn = LocalESClient(docs, latency_ms)
+        self._list_fields = list_fields
+        self.K = K
+        self.set_query(query)
+
+
+class LocalDBIndex(DBIndex):
+    """`DBIndex` over a SQLite file with the same tables as MySQL (1-index)."""
+
+    def __init__(
+        self,
+        path: str,
+        docs: List[Dict[str, str]],
+        sentences: List[str],
+        doc_ranges: List[Tuple[int, int, int]],
+        db_sent_table: str,
+        db_doc_table: str = None,
+        latency_ms: float = 0.0,
+    ) -> None:
+        self._config = {
+            "host": "local",
+            "port": 0,
+            "user": "benchmark",
+            "name": path,
+        }
+        # One connection per concurrent request, as with MySQL
+        self.engine = create_engine(
+            f"sqlite:///{path}",
+            poolclass=QueuePool,
+            pool_size=50,
+            max_overflow=10,
+            connect_args={"check_same_thread": False},
+        )
+        self.Session = sessionmaker(bind=self.engine)
+        self.db_sent_table = db_sent_table
+        self.db_doc_table = db_doc_table or f"{db_sent_table}_docs"
+
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"create table {self.db_doc_table} "
+                f"(id integer primary key, title text, content text)")
+            conn.exec_driver_sql(
+                f"create table {self.db_sent_table} "
+                f"(id integer primary key, sentence text, doc_id integer)")
+            conn.exec_driver_sql(
+                f"create index idx_doc_id on {self.db_sent_table} (doc_id)")
+            conn.exec_driver_sql(
+                f"insert into {self.db_doc_table} values (?, ?, ?)",
+                [
+                    (doc_id+1, doc.get("title"), doc["content"])
+                    for doc_id, doc in enumerate(docs)
+                ],
+            )
+            conn.exec_driver_sql(
+                f"insert into {self.db_sent_table} values (?, ?, ?)",
+                [
+                    (idx+1, sentences[idx], doc_id+1)   # 1-index
+                    for doc_id, start, end in doc_ranges
+                    for idx in range(start, end+1)
+                ],
+            )
+
+        if latency_ms > 0:
+            @event.listens_for(self.engine, "before_cursor_execute")
+            def add_latency(*args):
+                sleep_ms(latency_ms)
+
+
+class LocalEncoderStub:
+    """Minimal `EncoderStub` scoring sentences with hashed bag-of-words
+    embeddings, in place of the sentence-transformers model."""
+
+    def __init__(
+        self,
+        sentences: List[str],
+        dim: int = 256,
+        latency_ms: float = 0.0,
+    ) -> None:
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.embeddings = self.encode(sentences)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                embeddings[row, zlib.crc32(term.encode("utf-8")) % self.dim] += 1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def _search(self, query: str, ids: np.ndarray, k: int) -> encoder_pb2.SearchResponse:
+        ids = np.unique(ids[(ids >= 0) & (ids < len(self.embeddings))])
+        k = min(k, len(ids))
+        if k <= 0:
+            return encoder_pb2.SearchResponse(
+                error=encoder_pb2.SearchResponse.Error.INDEX_IS_NOT_READY)
+
+        scores = self.embeddings[ids] @ self.encode([query])[0]
+        top = np.argsort(-scores, kind="stable")[:k]
+        # Normalization, as the Encoder server does
+        distances = scores[top] / max(np.linalg.norm(scores[top]), 1e-12)
+        return encoder_pb2.SearchResponse(
+            matches=[
+                encoder_pb2.DocumentMatch(id=int(idx), distance=float(d))
+                for idx, d in zip(ids[top], distances)
+            ],
+            error=encoder_pb2.SearchResponse.Error.NO_ERROR,
+        )
+
+    def RetrieveRerankDocuments(self, request, **kwargs):
+        sleep_ms(self.latency_ms)
+        return self._search(
+            request.query, np.asarray(request.ids, dtype=np.int64), request.k)
+
+    def BatchRetrieveRerankDocuments(self, request, **kwargs):
+        sleep_ms(self.latency_ms)
+        return encoder_pb2.BatchSearchResponse(
+            responses=[
+                self._search(req.query, np.asarray(req.ids, dtype=np.int64), req.k)
+                for req in request.requests
+            ],
+        )
+
+    def FindTopKDocuments(self, request, **kwargs):
+        sleep_ms(self.latency_ms)
+        return self._search(
+            request.query, np.arange(len(self.embeddings)), request.k)
+
+
+class LocalReranker(Reranker):
+    """`Reranker` calling a `LocalEncoderStub` instead of the gRPC server."""
+
+    def __init__(self, stub: LocalEncoderStub, L: int = 10) -> None:
+        self._config = {
+            "host": "local",
+            "port": 0,
+        }
+        self.L = L
+        self.conn = stub
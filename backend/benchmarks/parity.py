@@ -0,0 +1,239 @@
+"""Accuracy and latency of an inference backend against the fp32 PyTorch
+pipeline, on the questions of the MLQA dev set.
+
+The Reader answers every question from its own paragraph with both
+backends. Exact match and F1 are computed against the gold answers as in
+SQuAD, along with how often both backends agree on the answer.
+
+The Inferrer classifies every question against each sentence of its
+paragraph. There are no gold labels, so it reports how often the backend
+agrees with fp32 on support/neutral/refute, per label of fp32.
+
+The `onnx` backend exports the model into `--onnx-dir` on the first run,
+which can then be set as `onnx_dir` of the runtime in the `config.py`.
+
+Usage (from `backend/`):
+    python -m benchmarks.parity --backend pt-int8
+    python -m benchmarks.parity --backend onnx --onnx-dir .onnx/reader --num-threads 4
+    python -m benchmarks.parity --backend pt-int8 --max-f1-drop 1.0
+    python -m benchmarks.parity --component inferrer --backend onnx --onnx-dir .onnx/inferrer
+    python -m benchmarks.parity --component inferrer --min-agreement 98
+
+With `--max-f1-drop` (Reader) or `--min-agreement` (Inferrer), it exits
+with status 1 if the backend falls short.
+"""
+import argparse
+import json
+import string
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from apps.search.components.config import DEVICE, INFERRER_MODEL, READER_MODEL
+from apps.search.components.inferrer import Inferrer
+from apps.search.components.reader import Reader
+
+from .run import DATA_FILE, load_corpus
+
+PUNCTUATION = set(string.punctuation)
+
+
+def normalize_answer(text: str) -> str:
+    """Lowercase, strip punctuation and extra whitespace, as SQuAD does
+    (English articles are left, the dataset is Vietnamese)."""
+    text = "".join(char for char in text.lower() if char not in PUNCTUATION)
+    return " ".join(text.split())
+
+
+def f1_score(prediction: str, truth: str) -> float:
+    pred_tokens = normalize_answer(prediction).split()
+    truth_tokens = normalize_answer(truth).split()
+    common = Counter(pred_tokens) & Counter(truth_tokens)
+    n_same = sum(common.values())
+    if n_same == 0:
+        return 0.0
+    precision = n_same / len(pred_tokens)
+    recall = n_same / len(truth_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def load_examples(data_file: str = DATA_FILE, limit: int = None) -> List[Dict]:
+    """Load question-context pairs along with their gold answers
+    and the index of the paragraph (0-index)."""
+    with open(data_file, encoding="ascii") as f:
+        data = json.load(f)["data"]
+    paragraphs = [para for dt in data for para in dt["paragraphs"]]
+    examples = [
+        {
+            "question": " ".join(qa["question"].split()),
+            "context": para["context"],
+            "answers": [answer["text"] for answer in qa["answers"]],
+            "doc_id": doc_id,
+        }
+        for doc_id, para in enumerate(paragraphs)
+        for qa in para["qas"]
+    ]
+    return examples[:limit]
+
+
+def load_pairs(data_file: str = DATA_FILE, limit: int = None) -> List[Tuple[str, str]]:
+    """Pair every question with each sentence of its paragraph."""
+    _, sentences, doc_ranges = load_corpus(data_file)
+    ranges = {doc_id: (start, end) for doc_id, start, end in doc_ranges}
+    pairs = []
+    for example in load_examples(data_file):
+        start, end = ranges[example["doc_id"]]
+        pairs.extend(
+            (example["question"], sentences[idx]) for idx in range(start, end+1))
+    return pairs[:limit]
+
+
+def run_reader(reader: Reader, examples: List[Dict]) -> Tuple[List[Dict], float]:
+    """Answer every example, one forward pass at a time as in serving.
+
+    Returns:
+        tuple: the answers and the mean latency in milliseconds
+    """
+    outputs = []
+    started = time.perf_counter()
+    for example in examples:
+        outputs.extend(reader.answer_batch([{
+            "question": example["question"],
+            "context": example["context"],
+        }]))
+    latency_ms = (time.perf_counter() - started) * 1000 / max(len(examples), 1)
+    return outputs, latency_ms
+
+
+def evaluate(outputs: List[Dict], examples: List[Dict]) -> Dict[str, float]:
+    exact = f1 = 0.0
+    for output, example in zip(outputs, examples):
+        exact += max(
+            normalize_answer(output["answer"]) == normalize_answer(truth)
+            for truth in example["answers"]
+        )
+        f1 += max(f1_score(output["answer"], truth) for truth in example["answers"])
+    return {
+        "exact_match": 100 * exact / max(len(examples), 1),
+        "f1": 100 * f1 / max(len(examples), 1),
+    }
+
+
+def get_runtimes(args) -> List[Tuple[str, Dict]]:
+    """Runtime settings of the reference and of the compared backend."""
+    return [
+        ("pt", {"num_threads": args.num_threads}),
+        (
+            args.backend,
+            {
+                "backend": args.backend,
+                "num_threads": args.num_threads,
+                "onnx_dir": args.onnx_dir,
+            },
+        ),
+    ]
+
+
+def compare_reader(args) -> Dict[str, Dict[str, float]]:
+    examples = load_examples(args.data_file, args.limit)
+
+    results = {}
+    answers = {}
+    for name, runtime in get_runtimes(args):
+        reader = Reader(args.model or READER_MODEL, DEVICE, runtime=runtime)
+        outputs, latency_ms = run_reader(reader, examples)
+        answers[name] = outputs
+        results[name] = {**evaluate(outputs, examples), "latency_ms": latency_ms}
+
+    reference, candidate = answers["pt"], answers[args.backend]
+    results[args.backend]["agreement"] = 100 * sum(
+        ref["answer"] == cand["answer"] for ref, cand in zip(reference, candidate)
+    ) / max(len(examples), 1)
+    results[args.backend]["max_score_diff"] = max(
+        (abs(ref["score"] - cand["score"]) for ref, cand in zip(reference, candidate)),
+        default=0.0,
+    )
+    return results
+
+
+def compare_inferrer(args) -> Dict[str, Dict[str, float]]:
+    pairs = load_pairs(args.data_file, args.limit)
+
+    results = {}
+    labels = {}
+    for name, runtime in get_runtimes(args):
+        inferrer = Inferrer(args.model or INFERRER_MODEL, DEVICE, runtime=runtime)
+        started = time.perf_counter()
+        labels[name] = inferrer.classify_pairs(pairs)
+        results[name] = {
+            "latency_ms": (time.perf_counter() - started) * 1000 / max(len(pairs), 1),
+        }
+
+    reference, candidate = labels["pt"], labels[args.backend]
+    result = results[args.backend]
+    result["agreement"] = 100 * sum(
+        ref[0] == cand[0] for ref, cand in zip(reference, candidate)
+    ) / max(len(pairs), 1)
+    # Agreement on the pairs fp32 labelled as each of support/neutral/refute
+    for model_label, label in Inferrer.LABEL.items():
+        matches = [
+            ref[0] == cand[0]
+            for ref, cand in zip(reference, candidate)
+            if ref[0].lower() == model_label
+        ]
+        if matches:
+            result[f"agreement_{label}"] = 100 * sum(matches) / len(matches)
+    result["max_score_diff"] = max(
+        (
+            abs(ref[1] - cand[1])
+            for ref, cand in zip(reference, candidate)
+            if ref[0] == cand[0]
+        ),
+        default=0.0,
+    )
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare an inference backend with fp32 PyTorch.")
+    parser.add_argument("--component", choices=("reader", "inferrer"), default="reader")
+    parser.add_argument("--backend", choices=("pt-int8", "onnx"), default="pt-int8")
+    parser.add_argument("--model", help="model of the config.py by default")
+    parser.add_argument("--num-threads", type=int)
+    parser.add_argument("--onnx-dir")
+    parser.add_argument("--data-file", default=DATA_FILE)
+    parser.add_argument("--limit", type=int, help="number of questions or pairs")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--max-f1-drop", type=float, help="Reader, in F1 points")
+    parser.add_argument("--min-agreement", type=float, help="Inferrer, in percent")
+    args = parser.parse_args()
+
+    if args.component == "reader":
+        results = compare_reader(args)
+    else:
+        results = compare_inferrer(args)
+    for name, result in results.items():
+        print("{:<10}".format(name) + "  ".join(
+            "{}={:.2f}".format(metric, value) for metric, value in result.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.component == "reader" and args.max_f1_drop is not None:
+        f1_drop = results["pt"]["f1"] - results[args.backend]["f1"]
+        if f1_drop > args.max_f1_drop:
+            print(f"F1 dropped by {f1_drop:.2f} points", file=sys.stderr)
+            return 1
+    if args.component == "inferrer" and args.min_agreement is not None:
+        agreement = results[args.backend]["agreement"]
+        if agreement < args.min_agreement:
+            print(f"Labels agree on {agreement:.2f}% of the pairs only", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""End-to-end latency benchmark of the Retriever behind the three search
+endpoints, fully offline.
+
+ElasticSearch, MySQL and the Encoder are replaced with the in-process
+stand-ins of `benchmarks.fakes` loaded with the MLQA dev set, and the Reader
+and Inferrer run tiny local models unless real ones are given. Everything
+else is the production code with the settings of `config.py`.
+
+Usage (from `backend/`):
+    python -m benchmarks.run --endpoint all --concurrency 8 --requests 200
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --tolerance 0.2
+
+It reports p50/p95/p99 latency and throughput of every request and of each
+stage of the pipeline, as timed by the Retriever itself, and with `--baseline` exits with status 1 if the p95
+latency of any stage regressed by more than the tolerance (and 1ms).
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from apps.search.components.config import (
+    DB_ARTICLE_TABLE,
+    DB_SENT_TABLE,
+    DENSE_K,
+    ES_FIELDS,
+    ES_QUERY,
+    INFERRER_SETTING,
+    K,
+    L,
+    READER_SETTING,
+    RETRIEVER_MODE,
+)
+from apps.search.components.doc_map import DocRangeIndex
+from apps.search.components.inferrer import Inferrer
+from apps.search.components.reader import Reader
+from apps.search.components.retriever import Retriever
+from apps.search.components.sentence_store import SentenceStore
+
+from .fakes import LocalDBIndex, LocalESIndex, LocalEncoderStub, LocalReranker
+from .tiny_models import build_tiny_models
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(
+    BENCHMARK_DIR, os.pardir, os.pardir, "dataset", "MLQA", "Dev")
+DATA_FILE = os.path.join(DATA_DIR, "dev-context-vi-question-vi.json")
+QUERIES_FILE = os.path.join(BENCHMARK_DIR, "queries.txt")
+MODELS_DIR = os.path.join(BENCHMARK_DIR, ".models")
+
+ENDPOINTS = {
+    "relevance": "retrieve",
+    "inference": "retrieve_inference",
+    "answering": "retrieve_answer",
+}
+# Stages timed by the Retriever's `StageTimer`, in pipeline order
+STAGES = (
+    "es_search",
+    "dense_search",
+    "sentence_ids",
+    "rerank",
+    "sentence_fetch",
+    "doc_join",
+    "reader",
+    "inferrer",
+    "total",
+)
+PERCENTILES = (50, 95, 99)
+MIN_REGRESSION_MS = 1.0     # ignore noise of sub-millisecond stages
+
+
+class StageRecorder:
+    """Collect latencies of named stages from concurrent requests."""
+
+    def __init__(self) -> None:
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def record_timings(self, timings: Dict[str, float]) -> None:
+        """Record the stage timings of a request."""
+        with self._lock:
+            for stage, seconds in timings.items():
+                self.samples[stage].append(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples = defaultdict(list)
+
+
+def load_corpus(data_file: str = DATA_FILE):
+    """Load documents (0-index), sentences (0-index) and their ranges."""
+    with open(data_file, encoding="ascii") as f:
+        data = json.load(f)["data"]
+    docs = [
+        {"title": dt["title"], "content": para["context"]}
+        for dt in data
+        for para in dt["paragraphs"]
+    ]
+    with open(os.path.join(os.path.dirname(data_file), "docs.json"), encoding="utf-8") as f:
+        sentences = json.load(f)
+    with open(os.path.join(os.path.dirname(data_file), "doc_range_map.json")) as f:
+        doc_ranges = [
+            (int(doc_id), rng["start"], rng["end"])
+            for doc_id, rng in json.load(f).items()
+        ]
+    return docs, sentences, doc_ranges
+
+
+def load_queries(path: str = QUERIES_FILE) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def seed_queries(data_file: str = DATA_FILE, path: str = QUERIES_FILE) -> int:
+    """Write the questions of the dataset into a query file, one per line."""
+    with open(data_file, encoding="ascii") as f:
+        data = json.load(f)["data"]
+    queries = [
+        " ".join(qa["question"].split())
+        for dt in data
+        for para in dt["paragraphs"]
+        for qa in para["qas"]
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(queries) + "\n")
+    return len(queries)
+
+
+def build_retriever(args, work_dir: str) -> Retriever:
+    """Assemble the Retriever over local stand-ins of the services."""
+    docs, sentences, doc_ranges = load_corpus(args.data_file)
+
+    reader_model, inferrer_model = args.reader_model, args.inferrer_model
+    if not (reader_model and inferrer_model):
+        tiny_reader, tiny_inferrer = build_tiny_models(
+            sentences + [doc["title"] for doc in docs], MODELS_DIR)
+        reader_model = reader_model or tiny_reader
+        inferrer_model = inferrer_model or tiny_inferrer
+
+    reader_setting = {**READER_SETTING, "model": reader_model}
+    inferrer_setting = {**INFERRER_SETTING, "model": inferrer_model}
+    if args.no_scheduler:
+        reader_setting["scheduler"] = inferrer_setting["scheduler"] = None
+
+    doc_map = None
+    if not args.no_doc_map:
+        doc_map = DocRangeIndex.from_ranges(doc_ranges)
+    sentence_store = None
+    if args.sentence_store:
+        sentence_store = SentenceStore.build(
+            sentences, os.path.join(work_dir, "sentence_store"))
+
+    return Retriever.from_components(
+        db_conn=LocalDBIndex(
+            os.path.join(work_dir, "corpus.sqlite3"),
+            docs,
+            sentences,
+            doc_ranges,
+            DB_SENT_TABLE,
+            DB_ARTICLE_TABLE,
+            latency_ms=args.db_latency_ms,
+        ),
+        es_conn=LocalESIndex(
+            docs,
+            ES_FIELDS,
+            K=K,
+            query=ES_QUERY,
+            latency_ms=args.es_latency_ms,
+        ),
+        reranker_conn=LocalReranker(
+            LocalEncoderStub(sentences, latency_ms=args.encoder_latency_ms),
+            L=L,
+        ),
+        reader_conn=Reader(**reader_setting),
+        inferrer_conn=Inferrer(**inferrer_setting),
+        doc_map=doc_map,
+        sentence_store=sentence_store,
+        mode=args.mode,
+        dense_k=DENSE_K,
+    )
+
+
+def run_load(
+    call: Callable[[str, Dict[str, float]], Dict],
+    queries: List[str],
+    n_requests: int,
+    concurrency: int,
+    recorder: StageRecorder,
+) -> Dict[str, float]:
+    """Send `n_requests` queries with `concurrency` requests in flight.
+
+    Returns:
+        dict: wall time and number of failed requests
+    """
+    errors = []
+
+    def request(query):
+        # Filled by the Retriever with the duration of each stage
+        timings = {}
+        started = time.perf_counter()
+        try:
+            call(query, timings)
+        except Exception as err:
+            errors.append(err)
+        finally:
+            recorder.record("request", time.perf_counter() - started)
+            recorder.record_timings(timings)
+
+    workload = list(itertools.islice(itertools.cycle(queries), n_requests))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(request, workload))
+    wall_time = time.perf_counter() - started
+
+    if errors:
+        print(f"  {len(errors)} failed requests, e.g., {errors[0]!r}", file=sys.stderr)
+    return {"wall_time": wall_time, "errors": len(errors)}
+
+
+def summarize(
+    samples: Dict[str, List[float]],
+    wall_time: float,
+) -> Dict[str, Dict[str, float]]:
+    """Latency percentiles (ms) and throughput (calls/s) of every stage."""
+    summary = {}
+    for stage, values in samples.items():
+        values = np.asarray(values) * 1000
+        summary[stage] = {
+            "count": len(values),
+            "mean_ms": float(values.mean()),
+            **{
+                f"p{q}_ms": float(np.percentile(values, q))
+                for q in PERCENTILES
+            },
+            "throughput": len(values) / wall_time,
+        }
+    return summary
+
+
+def print_summary(endpoint: str, summary: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n{endpoint}")
+    header = ["stage", "count", "mean_ms"] + [f"p{q}_ms" for q in PERCENTILES] + ["per_s"]
+    print("  {:<26}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}".format(*header))
+    # Whole requests last, stages in pipeline order
+    order = list(STAGES) + ["request"]
+    for stage in sorted(summary, key=order.index):
+        row = summary[stage]
+        print("  {:<26}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.1f}".format(
+            stage,
+            row["count"],
+            row["mean_ms"],
+            *[row[f"p{q}_ms"] for q in PERCENTILES],
+            row["throughput"],
+        ))
+
+
+def compare(
+    results: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    tolerance: float,
+) -> List[str]:
+    """Return the stages whose p95 latency regressed beyond the tolerance."""
+    regressions = []
+    for endpoint, result in results.items():
+        for stage, row in result["stages"].items():
+            base = baseline.get(endpoint, {}).get("stages", {}).get(stage)
+            if (
+                base and
+                row["p95_ms"] > base["p95_ms"] * (1 + tolerance) and
+                row["p95_ms"] - base["p95_ms"] > MIN_REGRESSION_MS
+            ):
+                regressions.append(
+                    f"{endpoint}/{stage}: p95 {base['p95_ms']:.2f}ms -> {row['p95_ms']:.2f}ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the search endpoints offline.")
+    parser.add_argument(
+        "--endpoint",
+        choices=list(ENDPOINTS) + ["all"],
+        default="all",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="per endpoint")
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument(
+        "--seed-queries",
+        action="store_true",
+        help="rewrite the query file from the questions of --data-file",
+    )
+    parser.add_argument("--data-file", default=DATA_FILE)
+    parser.add_argument("--mode", choices=("es", "dense", "hybrid"), default=RETRIEVER_MODE)
+    parser.add_argument("--reader-model", help="tiny local model by default")
+    parser.add_argument("--inferrer-model", help="tiny local model by default")
+    parser.add_argument("--no-scheduler", action="store_true")
+    parser.add_argument("--no-doc-map", action="store_true")
+    parser.add_argument("--sentence-store", action="store_true")
+    parser.add_argument("--es-latency-ms", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--encoder-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="results JSON of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.seed_queries:
+        n_queries = seed_queries(args.data_file, args.queries)
+        print(f"Wrote {n_queries} queries into {args.queries}")
+    queries = load_queries(args.queries)
+
+    endpoints = list(ENDPOINTS) if args.endpoint == "all" else [args.endpoint]
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        retriever = build_retriever(args, work_dir)
+        recorder = StageRecorder()
+        print(
+            f"mode={args.mode} concurrency={args.concurrency} "
+            f"requests={args.requests} queries={len(queries)}")
+
+        for endpoint in endpoints:
+            call = getattr(retriever, ENDPOINTS[endpoint])
+            run_load(call, queries, args.warmup, args.concurrency, recorder)
+            recorder.reset()
+            load = run_load(call, queries, args.requests, args.concurrency, recorder)
+            summary = summarize(recorder.samples, load["wall_time"])
+            results[endpoint] = {**load, "stages": summary}
+            print_summary(endpoint, summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Tiny, randomly initialized Reader and Inferrer models built offline.
+
+Their answers are meaningless, but they go through the same tokenization,
+batching and forward passes as the real models, only much faster.
+"""
+import os
+from collections import Counter
+from typing import Iterable, Tuple
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+NLI_LABELS = ["entailment", "neutral", "contradiction"]
+
+
+def build_vocab(texts: Iterable[str], path: str, max_words: int = 5000) -> str:
+    """Write a WordPiece vocabulary of the most frequent words of the texts,
+    plus every character so that no word is unknown."""
+    words = Counter()
+    chars = set()
+    for text in texts:
+        for word in text.lower().split():
+            words[word] += 1
+            chars.update(word)
+    tokens = list(SPECIAL_TOKENS)
+    tokens += sorted(chars)
+    tokens += ["##" + char for char in sorted(chars)]
+    tokens += [word for word, _ in words.most_common(max_words) if len(word) > 1]
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(dict.fromkeys(tokens)) + "\n")
+    return path
+
+
+def build_tiny_models(
+    texts: Iterable[str],
+    output_dir: str,
+    hidden_size: int = 32,
+    num_layers: int = 2,
+) -> Tuple[str, str]:
+    """Build the models into `output_dir` unless they are already there.
+
+    Returns:
+        tuple: paths to the Reader (question answering) and Inferrer (NLI)
+        models
+    """
+    from transformers import (
+        BertConfig,
+        BertForQuestionAnswering,
+        BertForSequenceClassification,
+        BertTokenizerFast,
+    )
+
+    reader_dir = os.path.join(output_dir, "reader")
+    inferrer_dir = os.path.join(output_dir, "inferrer")
+    if os.path.isdir(reader_dir) and os.path.isdir(inferrer_dir):
+        return reader_dir, inferrer_dir
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = BertTokenizerFast(
+        build_vocab(texts, os.path.join(output_dir, "vocab.txt")),
+        do_lower_case=True,
+    )
+    config = dict(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=2,
+        intermediate_size=hidden_size * 2,
+        max_position_embeddings=512,
+    )
+
+    BertForQuestionAnswering(BertConfig(**config)).save_pretrained(reader_dir)
+    tokenizer.save_pretrained(reader_dir)
+
+    BertForSequenceClassification(BertConfig(
+        **config,
+        num_labels=len(NLI_LABELS),
+        id2label=dict(enumerate(NLI_LABELS)),
+        label2id={label: idx for idx, label in enumerate(NLI_LABELS)},
+    )).save_pretrained(inferrer_dir)
+    tokenizer.save_pretrained(inferrer_dir)
+
+    return reader_dir, inferrer_dir
@@ -0,0 +1,249 @@
+"""Build every index of a SquAD-format dataset from one input file.
+
+Replaces the Colab notebook `[Research]_Sentence_processing_for_SquAD_format_dataset.ipynb`
+with a reproducible pipeline, run from `dataset/`:
+
+    python build_corpus.py --data-file MLQA/Test/test-context-vi-question-vi.json \
+        --output-dir MLQA/Test/ --es --db
+
+Stages and their artifacts in the output directory:
+    - segment: sentence segmentation across a process pool, writes
+      `sentences.json` (sentences per document), `docs.json` (flat list of
+      sentences) and `doc_range_map.json` (document -> sentences range)
+    - embed: sentence embeddings in large batches, written into the
+      `embeddings.npy` memmap (row i <-> sentence i)
+    - index: FAISS `IndexFlatIP` over the embeddings, `sentence.index`
+    - es / db (optional): documents into ElasticSearch through `import_es`,
+      and articles and sentences into MySQL through `import_db`
+
+Documents are numbered in the order of the input file and sentences in the
+order of the documents, so IDs agree across all artifacts: 0-index in
+ElasticSearch, FAISS and the JSON files, and 1-index in MySQL.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+DATA_DIR = "MLQA/Test/"
+DATA_FILE = path.join(DATA_DIR, "test-context-vi-question-vi.json")
+
+EMBEDDING_MODEL = "distiluse-base-multilingual-cased-v2"
+
+EXPORT_SENTENCE_TEXT = "sentences.json"
+EXPORT_DOCS_FILENAME = "docs.json"
+EXPORT_DOC_RANGE_MAP = "doc_range_map.json"
+EXPORT_EMBEDDINGS = "embeddings.npy"
+EXPORT_FAISS_INDEX = "sentence.index"
+EXPORT_BUILD_INFO = "build_info.json"
+
+STAGES = ("segment", "embed", "index")
+WORKERS = os.cpu_count() or 1
+SEGMENT_CHUNK_SIZE = 64     # documents per task sent to a worker
+EMBED_BATCH_SIZE = 256      # sentences per forward pass
+EMBED_CHUNK_SIZE = 16384    # sentences encoded between two writes
+
+logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+
+def iter_contents(data_file: str) -> Iterator[str]:
+    """Yield contexts of the dataset, in document ID order."""
+    with open(data_file, encoding="ascii") as f:
+        corpus = json.load(f)
+    for dt in corpus["data"]:
+        for para in dt["paragraphs"]:
+            yield para["context"]
+
+
+def preprocess(text: str) -> List[str]:
+    """Preprocess a document by sentences tokenization."""
+    # Imported here so that only the workers load the segmenter
+    from underthesea import sent_tokenize
+    # Apply word segmentation here if the embedding requires, e.g., PhoBERT
+    return sent_tokenize(text)
+
+
+def segment(
+    data_file: str,
+    output_dir: str,
+    workers: int = WORKERS,
+    chunk_size: int = SEGMENT_CHUNK_SIZE,
+) -> Dict[str, int]:
+    """Split documents into sentences across a process pool, streaming the
+    results into the JSON exports in document order.
+
+    Returns:
+        dict: number of documents and sentences
+    """
+    doc_range_map = {}
+    n_sentences = 0
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(path.join(output_dir, EXPORT_SENTENCE_TEXT), "w", encoding="utf-8") as f_sents, \
+            open(path.join(output_dir, EXPORT_DOCS_FILENAME), "w", encoding="utf-8") as f_docs:
+        f_sents.write("[")
+        f_docs.write("[")
+        results = pool.map(preprocess, iter_contents(data_file), chunksize=chunk_size)
+        for doc_id, sentences in enumerate(results):
+            # Empty documents keep an empty range so that IDs stay aligned
+            doc_range_map[str(doc_id)] = {
+                "start": n_sentences,
+                "end": n_sentences + len(sentences) - 1,
+            }
+            f_sents.write((", " if doc_id else "") + json.dumps(sentences, ensure_ascii=False))
+            for sentence in sentences:
+                f_docs.write((", " if n_sentences else "") + json.dumps(sentence, ensure_ascii=False))
+                n_sentences += 1
+        f_sents.write("]")
+        f_docs.write("]")
+
+    with open(path.join(output_dir, EXPORT_DOC_RANGE_MAP), "w", encoding="utf-8") as f:
+        json.dump(doc_range_map, f, ensure_ascii=False)
+
+    logging.info(
+        f"[+] Segmented {len(doc_range_map)} documents into {n_sentences} "
+        f"sentences in {time.time() - started:.1f}s"
+    )
+    return {"documents": len(doc_range_map), "sentences": n_sentences}
+
+
+def embed(
+    output_dir: str,
+    model_name: str = EMBEDDING_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    chunk_size: int = EMBED_CHUNK_SIZE,
+    device: str = None,
+) -> Dict[str, int]:
+    """Encode the exported sentences chunk by chunk into a float32 memmap.
+
+    Returns:
+        dict: number of sentences and embedding dimension
+    """
+    from sentence_transformers import SentenceTransformer
+
+    with open(path.join(output_dir, EXPORT_DOCS_FILENAME), encoding="utf-8") as f:
+        docs = json.load(f)
+
+    encoder = SentenceTransformer(model_name, device=device)
+    dim = encoder.get_sentence_embedding_dimension()
+    embeddings = np.lib.format.open_memmap(
+        path.join(output_dir, EXPORT_EMBEDDINGS),
+        mode="w+",
+        dtype=np.float32,
+        shape=(len(docs), dim),
+    )
+
+    started = time.time()
+    for start in range(0, len(docs), chunk_size):
+        end = min(start + chunk_size, len(docs))
+        embeddings[start:end] = encoder.encode(
+            docs[start:end],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+        )
+        logging.info(
+            f"[+] Encoded {end}/{len(docs)} sentences "
+            f"({end / (time.time() - started):.0f} sentences/s)"
+        )
+    embeddings.flush()
+    del embeddings
+
+    return {"sentences": len(docs), "dimension": dim}
+
+
+def build_faiss_index(
+    output_dir: str,
+    chunk_size: int = EMBED_CHUNK_SIZE,
+) -> Dict[str, int]:
+    """Add the embeddings into an `IndexFlatIP`, in row order.
+
+    Returns:
+        dict: number of entries in the index
+    """
+    import faiss
+
+    embeddings = np.load(path.join(output_dir, EXPORT_EMBEDDINGS), mmap_mode="r")
+    sentence_index = faiss.IndexFlatIP(embeddings.shape[1])
+    for start in range(0, len(embeddings), chunk_size):
+        sentence_index.add(np.ascontiguousarray(embeddings[start:start+chunk_size]))
+    faiss.write_index(sentence_index, path.join(output_dir, EXPORT_FAISS_INDEX))
+
+    logging.info(f"[+] Number of entries in the index: {sentence_index.ntotal}")
+    return {"entries": sentence_index.ntotal}
+
+
+def load_es(data_file: str, index: str) -> Dict[str, int]:
+    """Import the documents into ElasticSearch, with IDs from 0."""
+    import import_es
+
+    failed_ids = import_es.import_squad_style(
+        lambda: import_es.iter_squad_articles(data_file),
+        index=index,
+    )
+    return {"failed": len(failed_ids)}
+
+
+def load_db(data_file: str, output_dir: str, method: str) -> Dict[str, int]:
+    """Import articles and sentences into MySQL, with IDs from 1."""
+    import import_db
+
+    import_db.import_dataset(data_file=data_file, method=method)
+    with open(path.join(output_dir, EXPORT_DOCS_FILENAME), encoding="utf-8") as f:
+        docs = json.load(f)
+    with open(path.join(output_dir, EXPORT_DOC_RANGE_MAP), encoding="utf-8") as f:
+        doc_sent_map = json.load(f)
+    import_db.import_docs(docs, doc_sent_map, method=method)
+    return {"sentences": len(docs)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the corpus artifacts of a SquAD-format dataset.")
+    parser.add_argument("--data-file", default=DATA_FILE)
+    parser.add_argument("--output-dir", default=DATA_DIR)
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=list(STAGES),
+        help="stages to run; later ones read the artifacts of earlier runs",
+    )
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--device", default=None, help="e.g. cpu or cuda")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--es", action="store_true", help="import into ElasticSearch")
+    parser.add_argument("--es-index", default="vi_ahihi_2")
+    parser.add_argument("--db", action="store_true", help="import into MySQL")
+    parser.add_argument(
+        "--db-method",
+        choices=("executemany", "infile"),
+        default="executemany",
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    info = {"data_file": args.data_file, "model": args.model}
+    started = time.time()
+    if "segment" in args.stages:
+        info["segment"] = segment(args.data_file, args.output_dir, args.workers)
+    if "embed" in args.stages:
+        info["embed"] = embed(args.output_dir, args.model, args.batch_size, device=args.device)
+    if "index" in args.stages:
+        info["index"] = build_faiss_index(args.output_dir)
+    if args.es:
+        info["es"] = load_es(args.data_file, args.es_index)
+    if args.db:
+        info["db"] = load_db(args.data_file, args.output_dir, args.db_method)
+    info["elapsed_seconds"] = round(time.time() - started, 1)
+
+    with open(path.join(args.output_dir, EXPORT_BUILD_INFO), "w") as f:
+        json.dump(info, f, indent=4)
+    logging.info(f"[+] Done in {info['elapsed_seconds']}s: {info}")
@@ -1,10 +1,13 @@
+import argparse
 import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
 from os import path
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
 
-import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import create_engine, text
 
 # specify database configurations
 config = {
@@ -23,10 +26,8 @@ db_name = config.get('database')
 # specify connection string
 connection_str = f"mysql+pymysql://{db_user}:{db_pwd}@{db_host}:{db_port}/{db_name}"
 
-# connect to database
-engine = create_engine(connection_str)
-# connection = engine.connect()
-db = scoped_session(sessionmaker(bind=engine))
+# connect to database, allowing `LOAD DATA LOCAL INFILE` from this client
+engine = create_engine(connection_str, connect_args={"local_infile": True})
 
 DB_NAME = "mlqa_test"
 SENT_TABLE = f"{DB_NAME}_sent_articles_ahihi"
@@ -37,72 +38,238 @@ DOCS_FILE = path.join(DATA_DIR, "docs.json")
 DOC_SENT_MAP_FILE = path.join(DATA_DIR, "doc_range_map.json")
 DATA_FILE = path.join(DATA_DIR, "test-context-vi-question-vi.json")
 
+BATCH_SIZE = 5000       # rows per transaction
+METHODS = ("executemany", "infile")
+
+# IDs in MySQL are 1-index while document/sentence positions are 0-index,
+# so every ID is written explicitly as position+1 to comply with MySQL
+# standard whatever the state of the auto-increment counters.
+
+
+def iter_paragraphs(data_file: str = DATA_FILE) -> Iterator[Tuple[str, str]]:
+    """Yield (title, content) of every paragraph, in document ID order."""
+    with open(data_file, encoding="ascii") as f:
+        corpus = json.load(f)
+    for dt in corpus["data"]:
+        title = dt["title"]
+        for para in dt["paragraphs"]:
+            yield title, para["context"]
+
+
+def escape_tsv(value) -> str:
+    """Escape a value for the default format of `LOAD DATA INFILE`."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+@contextmanager
+def bulk_connection():
+    """Connection with constraint checks off, as every row is known valid."""
+    with engine.connect() as conn:
+        conn.execute(text("SET foreign_key_checks = 0"))
+        conn.execute(text("SET unique_checks = 0"))
+        try:
+            yield conn
+        finally:
+            conn.execute(text("SET unique_checks = 1"))
+            conn.execute(text("SET foreign_key_checks = 1"))
+
+
+def insert_rows(
+    conn,
+    table: str,
+    columns: Sequence[str],
+    rows: List[Tuple],
+    method: str = "executemany",
+) -> None:
+    """Insert a batch of rows in a single transaction.
+
+    `executemany` is rewritten by the driver into multi-row INSERTs, while
+    `infile` streams the batch through a temporary TSV file.
+    """
+    if method == "executemany":
+        with conn.begin():
+            conn.execute(
+                text(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join(':' + col for col in columns)})"
+                ),
+                [dict(zip(columns, row)) for row in rows],
+            )
+    elif method == "infile":
+        fd, tsv_file = tempfile.mkstemp(suffix=".tsv")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write("\t".join(escape_tsv(value) for value in row) + "\n")
+            with conn.begin():
+                conn.execute(
+                    text(
+                        f"LOAD DATA LOCAL INFILE :tsv_file INTO TABLE {table} "
+                        f"CHARACTER SET utf8mb4 ({', '.join(columns)})"
+                    ),
+                    {"tsv_file": tsv_file},
+                )
+        finally:
+            os.remove(tsv_file)
+    else:
+        raise ValueError("Inappropriate value for method.")
+
+
+def get_resume_doc(table: str, column: str) -> int:
+    """Return the first document (0-index) that is not in the table yet.
+
+    Batches hold whole documents and are committed one at a time, so the
+    highest document ID in the table is always complete.
+    """
+    with engine.connect() as conn:
+        last_id = conn.execute(text(f"SELECT MAX({column}) FROM {table}")).scalar()
+    return last_id or 0     # next 0-index = last 1-index
+
+
+def ensure_doc_id_index(table: str = SENT_TABLE) -> None:
+    """Create the index on `doc_id` after the load, if there is none yet."""
+    with engine.connect() as conn:
+        existing = conn.execute(
+            text(f"SHOW INDEX FROM {table} WHERE Column_name = 'doc_id'")
+        ).fetchall()
+        if existing:
+            return
+        started = time.time()
+        conn.execute(text(f"CREATE INDEX idx_doc_id ON {table} (doc_id)"))
+    print(f"Created index on {table}.doc_id in {time.time() - started:.1f}s")
+
+
+def load_batches(
+    table: str,
+    columns: Sequence[str],
+    batches: Iterable[List[Tuple]],
+    method: str = "executemany",
+) -> int:
+    """Insert batches of rows, reporting progress, and return the row count."""
+    total = 0
+    started = time.time()
+    with bulk_connection() as conn:
+        for rows in batches:
+            insert_rows(conn, table, columns, rows, method)
+            total += len(rows)
+            elapsed = time.time() - started
+            print(
+                f"Inserted {total} rows into {table} "
+                f"({total / elapsed if elapsed > 0 else 0:.0f} rows/s)"
+            )
+    return total
+
 
 def import_docs(
     docs: List[str],
-    doc_sent_map: Dict[str, Dict[str, int]]
+    doc_sent_map: Dict[str, Dict[str, int]],
+    start_doc: int = 0,
+    end_doc: int = None,
+    batch_size: int = BATCH_SIZE,
+    method: str = "executemany",
 ) -> None:
-    """Import documents to database."""
-    for doc_id in doc_sent_map.keys():
-        start = doc_sent_map[doc_id]["start"]
-        end = doc_sent_map[doc_id]["end"]
-        for idx in range(start, end+1):
-            db.execute(
-                f"""
-                    INSERT INTO {SENT_TABLE} (sentence, doc_id)
-                    VALUES (
-                        :sentence, 
-                        :doc_id
-                    )
-                """,
-                {
-                    "sentence": docs[idx],
-                    # document's ID in MySQL is 1-index while doc_id is 0-index
-                    # so we must increment it to comply with MySQL standard
-                    "doc_id": int(doc_id)+1,
-                },
+    """Import sentences of documents in [start_doc, end_doc) to database."""
+    doc_ids = sorted(int(doc_id) for doc_id in doc_sent_map.keys())
+    doc_ids = [
+        doc_id for doc_id in doc_ids
+        if doc_id >= start_doc and (end_doc is None or doc_id < end_doc)
+    ]
+
+    def batches():
+        rows = []
+        for doc_id in doc_ids:
+            start = doc_sent_map[str(doc_id)]["start"]
+            end = doc_sent_map[str(doc_id)]["end"]
+            rows.extend(
+                (idx+1, docs[idx], doc_id+1)    # 1-index
+                for idx in range(start, end+1)
             )
-        print(f"Done for doc #{doc_id}")
-    db.commit()
+            # Flush on document boundaries only, to be resumable
+            if len(rows) >= batch_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+    load_batches(SENT_TABLE, ("id", "sentence", "doc_id"), batches(), method)
+    ensure_doc_id_index(SENT_TABLE)
     print("Success!")
 
 
-def import_dataset() -> None:
-    """Import SquAD-format dataset."""
-    with open(DATA_FILE, encoding="ascii") as f:
-        corpus = json.load(f)
-        data = corpus["data"]
-
-        for dt in data:
-            title = dt["title"]
-            for para in dt["paragraphs"]:
-                content = para["context"]
-                db.execute(
-                    f"""
-                        INSERT INTO {ARTICLE_TABLE} (title, content)
-                        VALUES (
-                            :title,
-                            :content
-                        )
-                    """,
-                    {
-                        "title": title,
-                        "content": content,
-                    }
-                )
-        db.commit()
+def import_dataset(
+    start_doc: int = 0,
+    end_doc: int = None,
+    batch_size: int = BATCH_SIZE,
+    method: str = "executemany",
+    data_file: str = DATA_FILE,
+) -> None:
+    """Import SquAD-format dataset, documents in [start_doc, end_doc)."""
+    def batches():
+        rows = []
+        for doc_id, (title, content) in enumerate(iter_paragraphs(data_file)):
+            if doc_id < start_doc:
+                continue
+            if end_doc is not None and doc_id >= end_doc:
+                break
+            rows.append((doc_id+1, title, content))   # 1-index
+            if len(rows) >= batch_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+    load_batches(ARTICLE_TABLE, ("id", "title", "content"), batches(), method)
     print("Success!")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import dataset into MySQL.")
+    parser.add_argument("--method", choices=METHODS, default="executemany")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--start-doc",
+        type=int,
+        default=None,
+        help="first document (0-index) to import; "
+             "by default, resume after the last one in each table",
+    )
+    parser.add_argument(
+        "--end-doc",
+        type=int,
+        default=None,
+        help="document (0-index) to stop before",
+    )
+    args = parser.parse_args()
+
     # Import articles into article table
-    import_dataset()
+    start_doc = args.start_doc
+    if start_doc is None:
+        start_doc = get_resume_doc(ARTICLE_TABLE, "id")
+    import_dataset(start_doc, args.end_doc, args.batch_size, args.method)
     print("Done with document table.")
 
     # Import for sentence table
     with open(DOCS_FILE) as file_docs:
         docs = json.load(file_docs)
-        with open(DOC_SENT_MAP_FILE) as file_map:
-            doc_sent_map = json.load(file_map)
-            import_docs(docs, doc_sent_map)
+    with open(DOC_SENT_MAP_FILE) as file_map:
+        doc_sent_map = json.load(file_map)
+    start_doc = args.start_doc
+    if start_doc is None:
+        start_doc = get_resume_doc(SENT_TABLE, "doc_id")
+    import_docs(
+        docs,
+        doc_sent_map,
+        start_doc,
+        args.end_doc,
+        args.batch_size,
+        args.method,
+    )
     print("Done with sentence table.")
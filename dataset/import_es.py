@@ -1,65 +1,244 @@
+import argparse
 import json
 import logging
+import time
 from os import path
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, Iterator, Set
 
-import ipdb
 from elasticsearch.client import Elasticsearch
+from elasticsearch.helpers import parallel_bulk
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 DATA_DIR = "MLQA/Test/"
 ES_INDEX = "vi_ahihi_2"
 DATA_FILE = path.join(DATA_DIR, "test-context-vi-question-vi.json")
 
+CHUNK_SIZE = 500        # documents per bulk request
+THREAD_COUNT = 4        # bulk requests in flight
+QUEUE_SIZE = 4          # chunks buffered ahead of the workers
+MAX_RETRIES = 3         # passes over the failed documents
+REPORT_EVERY = 10000    # documents between two progress reports
+
 logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-def import_squad_style(data: List[Dict]) -> None:
-    """Import SquAD-style dataset into ElasticSearch index.
+def iter_squad_articles(data_file: str) -> Iterator[Dict]:
+    """Yield the articles of a SquAD-format file one by one.
 
-    Arguments format:
-    {
-        "title": <str>,
-        "paragraphs": [
-            {
-                "context": <str>,
-                "qas": [...],
-            },
-            ...
-        ]
-    }
+    The file is parsed incrementally with `ijson` when it is installed,
+    otherwise it is loaded at once.
+    """
+    if ijson is not None:
+        with open(data_file, "rb") as f:
+            yield from ijson.items(f, "data.item")
+    else:
+        with open(data_file, encoding="ascii") as f:
+            yield from json.load(f)["data"]
+
+
+def generate_actions(
+    data: Iterable[Dict],
+    index: str = ES_INDEX,
+    only_ids: Set[int] = None,
+) -> Iterator[Dict]:
+    """Yield one bulk action per paragraph of SquAD-style articles.
+
+    Paragraphs are numbered in order from 0, which is the document ID the
+    `Retriever` expects (0-index). If `only_ids` is given, the other
+    paragraphs are counted but skipped.
     """
-    # Importing
-    ES = Elasticsearch(
-        timeout=80,
-        max_retries=3,
-        retry_on_timeout=True,
-    )
     counter = 0
     for dt in data:
         title = dt["title"]
         for para in dt["paragraphs"]:
-            content = para["context"]
-            doc = {
-                "title": title,
-                "content": content,
-            }
-            response = ES.index(
-                index=ES_INDEX,
-                id=counter,
-                body=doc,
+            if only_ids is None or counter in only_ids:
+                yield {
+                    "_op_type": "index",
+                    "_index": index,
+                    "_id": counter,
+                    "_source": {
+                        "title": title,
+                        "content": para["context"],
+                    },
+                }
+            counter += 1
+
+
+def bulk_index(
+    ES: Elasticsearch,
+    actions: Iterable[Dict],
+    chunk_size: int = CHUNK_SIZE,
+    thread_count: int = THREAD_COUNT,
+    queue_size: int = QUEUE_SIZE,
+) -> Set[int]:
+    """Send actions through parallel bulk requests.
+
+    Returns:
+        set: IDs of the documents that were rejected
+    """
+    failed_ids = set()
+    indexed = 0
+    started = time.time()
+    for ok, info in parallel_bulk(
+        ES,
+        actions,
+        thread_count=thread_count,
+        chunk_size=chunk_size,
+        queue_size=queue_size,
+        raise_on_error=False,
+        raise_on_exception=False,
+    ):
+        item = next(iter(info.values()))
+        if ok:
+            indexed += 1
+            if indexed % REPORT_EVERY == 0:
+                logging.info(
+                    "[+] Indexed {n} documents ({rate:.0f} docs/s)".format(
+                        n=indexed,
+                        rate=indexed / (time.time() - started),
+                    )
+                )
+        else:
+            failed_ids.add(int(item["_id"]))
+            logging.warning(
+                "[-] Failed (id: {id}): {error}".format(
+                    id=item["_id"],
+                    error=item.get("error"),
+                )
             )
+
+    elapsed = time.time() - started
+    logging.info(
+        "[+] Indexed {n} documents in {elapsed:.1f}s ({rate:.0f} docs/s), "
+        "{failed} failed".format(
+            n=indexed,
+            elapsed=elapsed,
+            rate=indexed / elapsed if elapsed > 0 else 0,
+            failed=len(failed_ids),
+        )
+    )
+    return failed_ids
+
+
+def import_squad_style(
+    get_data: Callable[[], Iterable[Dict]],
+    index: str = ES_INDEX,
+    chunk_size: int = CHUNK_SIZE,
+    thread_count: int = THREAD_COUNT,
+    queue_size: int = QUEUE_SIZE,
+    max_retries: int = MAX_RETRIES,
+    ES: Elasticsearch = None,
+) -> Set[int]:
+    """Import SquAD-style dataset into ElasticSearch index with bulk requests.
+
+    Index refresh is turned off during the load and restored afterwards.
+    Documents that fail are sent again, alone, up to `max_retries` times.
+
+    Args:
+        get_data: callable returning a fresh iterable of articles, called
+            again for each retry so that the corpus is never held in memory
+            Format of each article:
+            {
+                "title": <str>,
+                "paragraphs": [
+                    {
+                        "context": <str>,
+                        "qas": [...],
+                    },
+                    ...
+                ]
+            }
+
+    Returns:
+        set: IDs of the documents that still failed after every retry
+    """
+    if ES is None:
+        ES = Elasticsearch(
+            timeout=80,
+            max_retries=3,
+            retry_on_timeout=True,
+        )
+
+    # Create the index as ElasticSearch would on the first write,
+    # so that its settings can be changed beforehand
+    if not ES.indices.exists(index=index):
+        ES.indices.create(index=index)
+    # Keyed by the concrete index, which differs from `index` if it is an alias
+    settings = next(iter(ES.indices.get_settings(index=index).values()))
+    refresh_interval = settings["settings"]["index"].get("refresh_interval")
+    ES.indices.put_settings(
+        index=index,
+        body={"index": {"refresh_interval": "-1"}},
+    )
+    try:
+        failed_ids = bulk_index(
+            ES,
+            generate_actions(get_data(), index),
+            chunk_size,
+            thread_count,
+            queue_size,
+        )
+        for attempt in range(1, max_retries+1):
+            if not failed_ids:
+                break
+            time.sleep(2 ** attempt)
             logging.info(
-                "[+] Added (id: {id}): {title}".format(
-                    id=counter,
-                    title=title,
+                "[+] Retry #{attempt} for {n} documents".format(
+                    attempt=attempt,
+                    n=len(failed_ids),
                 )
             )
-            counter += 1
+            failed_ids = bulk_index(
+                ES,
+                generate_actions(get_data(), index, failed_ids),
+                chunk_size,
+                thread_count,
+                queue_size,
+            )
+    finally:
+        # `None` resets the setting to its default
+        ES.indices.put_settings(
+            index=index,
+            body={"index": {"refresh_interval": refresh_interval}},
+        )
+        ES.indices.refresh(index=index)
+
+    if failed_ids:
+        logging.error(
+            "[-] {n} documents could not be indexed: {ids}".format(
+                n=len(failed_ids),
+                ids=sorted(failed_ids),
+            )
+        )
+    return failed_ids
 
 
 if __name__ == "__main__":
-    with open(DATA_FILE, encoding="ascii") as f:
-        corpus = json.load(f)
-        data = corpus["data"]
-        import_squad_style(data)
+    parser = argparse.ArgumentParser(
+        description="Import a SquAD-format dataset into ElasticSearch.")
+    parser.add_argument("--data-file", default=DATA_FILE)
+    parser.add_argument("--index", default=ES_INDEX)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=THREAD_COUNT,
+        help="bulk requests in flight",
+    )
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES)
+    args = parser.parse_args()
+
+    import_squad_style(
+        lambda: iter_squad_articles(args.data_file),
+        index=args.index,
+        chunk_size=args.chunk_size,
+        thread_count=args.threads,
+        queue_size=args.queue_size,
+        max_retries=args.max_retries,
+    )
@@ -0,0 +1,106 @@
+"""Build an ANN index over the sentence embeddings for full-corpus search.
+
+Usage:
+    python build_index.py --type ivf --nlist 1024 \
+        --embeddings <DATA_DIR>/embeddings.npy --output <DATA_DIR>/sentence.ivf.index
+
+Index types (all with inner product, IDs are rows of the embedding matrix):
+    - flat: exact search, same as `sentence.index`
+    - ivf: inverted lists over `nlist` clusters, searched with `nprobe`
+    - hnsw: graph with `M` neighbors per node, searched with `efSearch`
+    - pq: inverted lists with product-quantized vectors (`pq_m` sub-vectors
+      of `nbits` bits each)
+"""
+import argparse
+import logging
+import time
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "pq")
+
+
+def get_factory_string(
+    index_type: str,
+    nlist: int = 1024,
+    hnsw_m: int = 32,
+    pq_m: int = 64,
+    nbits: int = 8,
+) -> str:
+    """Return the FAISS index factory description of the given index type."""
+    if index_type == "flat":
+        return "Flat"
+    elif index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    elif index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    elif index_type == "pq":
+        return f"IVF{nlist},PQ{pq_m}x{nbits}"
+    raise ValueError("Inappropriate value for index type.")
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_type: str,
+    nlist: int = 1024,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    pq_m: int = 64,
+    nbits: int = 8,
+    train_size: int = 100000,
+):
+    """Build an index of the given type over the embeddings, in row order."""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = faiss.index_factory(
+        embeddings.shape[1],
+        get_factory_string(index_type, nlist, hnsw_m, pq_m, nbits),
+        faiss.METRIC_INNER_PRODUCT,
+    )
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = ef_construction
+
+    if not index.is_trained:
+        # Train on a random sample to bound the clustering cost
+        sample = embeddings
+        if len(embeddings) > train_size:
+            rng = np.random.default_rng(0)
+            sample = embeddings[rng.choice(len(embeddings), train_size, replace=False)]
+        index.train(sample)
+
+    index.add(embeddings)
+    return index
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Build an ANN sentence index.")
+    parser.add_argument("--type", choices=INDEX_TYPES, default="ivf")
+    parser.add_argument("--embeddings", required=True, help="path to embeddings.npy")
+    parser.add_argument("--output", required=True, help="path to the index file")
+    parser.add_argument("--nlist", type=int, default=1024, help="IVF clusters")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbors")
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--pq-m", type=int, default=64, help="PQ sub-vectors")
+    parser.add_argument("--nbits", type=int, default=8, help="bits per PQ code")
+    parser.add_argument("--train-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    embeddings = np.load(args.embeddings, mmap_mode="r")
+    started = time.time()
+    index = build_index(
+        embeddings,
+        args.type,
+        nlist=args.nlist,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        pq_m=args.pq_m,
+        nbits=args.nbits,
+        train_size=args.train_size,
+    )
+    faiss.write_index(index, args.output)
+    logging.info(
+        f"Built {args.type} index of {index.ntotal} vectors "
+        f"in {time.time() - started:.1f}s: {args.output}"
+    )
@@ -19,7 +19,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\rencoder.proto\"0\n\x14TopKDocumentsRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\t\n\x01k\x18\x02 \x01(\x05\"?\n\x16RerankDocumentsRequest\x12\x0b\n\x03ids\x18\x01 \x03(\x05\x12\r\n\x05query\x18\x02 \x01(\t\x12\t\n\x01k\x18\x03 \x01(\x05\"-\n\rDocumentMatch\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x10\n\x08\x64istance\x18\x02 \x01(\x01\"\x99\x01\n\x0eSearchResponse\x12\x1f\n\x07matches\x18\x01 \x03(\x0b\x32\x0e.DocumentMatch\x12$\n\x05\x65rror\x18\x02 \x01(\x0e\x32\x15.SearchResponse.Error\"@\n\x05\x45rror\x12\x0c\n\x08NO_ERROR\x10\x00\x12\x16\n\x12INDEX_IS_NOT_READY\x10\x01\x12\x11\n\rUNKNOWN_ERROR\x10\x02\"L\n\x0bSyncRequest\x12\x14\n\ndocumentId\x18\x01 \x01(\x05H\x00\x12\r\n\x03\x61ll\x18\x02 \x01(\x08H\x00\x12\x0e\n\x06\x64\x65lete\x18\x03 \x01(\x08\x42\x08\n\x06target\"\x92\x01\n\x0cSyncResponse\x12\"\n\x05\x65rror\x18\x01 \x01(\x0e\x32\x13.SyncResponse.Error\"^\n\x05\x45rror\x12\x0c\n\x08NO_ERROR\x10\x00\x12\x1c\n\x18\x41NOTHER_SYNC_IN_PROGRESS\x10\x01\x12\x16\n\x12INDEX_IS_NOT_READY\x10\x02\x12\x11\n\rUNKNOWN_ERROR\x10\x03\x32\xb0\x01\n\x07\x45ncoder\x12;\n\x11\x46indTopKDocuments\x12\x15.TopKDocumentsRequest\x1a\x0f.SearchResponse\x12\x43\n\x17RetrieveRerankDocuments\x12\x17.RerankDocumentsRequest\x1a\x0f.SearchResponse\x12#\n\x04Sync\x12\x0c.SyncRequest\x1a\r.SyncResponseb\x06proto3'
+  serialized_pb=b'\n\rencoder.proto\"0\n\x14TopKDocumentsRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\t\n\x01k\x18\x02 \x01(\x05\"?\n\x16RerankDocumentsRequest\x12\x0b\n\x03ids\x18\x01 \x03(\x05\x12\r\n\x05query\x18\x02 \x01(\t\x12\t\n\x01k\x18\x03 \x01(\x05\"H\n\x1b\x42\x61tchRerankDocumentsRequest\x12)\n\x08requests\x18\x01 \x03(\x0b\x32\x17.RerankDocumentsRequest\"-\n\rDocumentMatch\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x10\n\x08\x64istance\x18\x02 \x01(\x01\"\x99\x01\n\x0eSearchResponse\x12\x1f\n\x07matches\x18\x01 \x03(\x0b\x32\x0e.DocumentMatch\x12$\n\x05\x65rror\x18\x02 \x01(\x0e\x32\x15.SearchResponse.Error\"@\n\x05\x45rror\x12\x0c\n\x08NO_ERROR\x10\x00\x12\x16\n\x12INDEX_IS_NOT_READY\x10\x01\x12\x11\n\rUNKNOWN_ERROR\x10\x02\"9\n\x13\x42\x61tchSearchResponse\x12\"\n\tresponses\x18\x01 \x03(\x0b\x32\x0f.SearchResponse\"t\n\x0bSyncRequest\x12\x14\n\ndocumentId\x18\x01 \x01(\x05H\x00\x12\r\n\x03\x61ll\x18\x02 \x01(\x08H\x00\x12\x0e\n\x06\x64\x65lete\x18\x03 \x01(\x08\x12\x13\n\x0bsentenceIds\x18\x04 \x03(\x05\x12\x11\n\tsentences\x18\x05 \x03(\tB\x08\n\x06target\"\x92\x01\n\x0cSyncResponse\x12\"\n\x05\x65rror\x18\x01 \x01(\x0e\x32\x13.SyncResponse.Error\"^\n\x05\x45rror\x12\x0c\n\x08NO_ERROR\x10\x00\x12\x1c\n\x18\x41NOTHER_SYNC_IN_PROGRESS\x10\x01\x12\x16\n\x12INDEX_IS_NOT_READY\x10\x02\x12\x11\n\rUNKNOWN_ERROR\x10\x03\x32\x84\x02\n\x07\x45ncoder\x12;\n\x11\x46indTopKDocuments\x12\x15.TopKDocumentsRequest\x1a\x0f.SearchResponse\x12\x43\n\x17RetrieveRerankDocuments\x12\x17.RerankDocumentsRequest\x1a\x0f.SearchResponse\x12R\n\x1c\x42\x61tchRetrieveRerankDocuments\x12\x1c.BatchRerankDocumentsRequest\x1a\x14.BatchSearchResponse\x12#\n\x04Sync\x12\x0c.SyncRequest\x1a\r.SyncResponseb\x06proto3'
 )
 
 
@@ -49,8 +49,8 @@ _SEARCHRESPONSE_ERROR = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=269,
-  serialized_end=333,
+  serialized_start=343,
+  serialized_end=407,
 )
 _sym_db.RegisterEnumDescriptor(_SEARCHRESPONSE_ERROR)
 
@@ -84,8 +84,8 @@ _SYNCRESPONSE_ERROR = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=466,
-  serialized_end=560,
+  serialized_start=639,
+  serialized_end=733,
 )
 _sym_db.RegisterEnumDescriptor(_SYNCRESPONSE_ERROR)
 
@@ -175,6 +175,38 @@ _RERANKDOCUMENTSREQUEST = _descriptor.Descriptor(
 )
 
 
+_BATCHRERANKDOCUMENTSREQUEST = _descriptor.Descriptor(
+  name='BatchRerankDocumentsRequest',
+  full_name='BatchRerankDocumentsRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='requests', full_name='BatchRerankDocumentsRequest.requests', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=132,
+  serialized_end=204,
+)
+
+
 _DOCUMENTMATCH = _descriptor.Descriptor(
   name='DocumentMatch',
   full_name='DocumentMatch',
@@ -209,8 +241,8 @@ _DOCUMENTMATCH = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=132,
-  serialized_end=177,
+  serialized_start=206,
+  serialized_end=251,
 )
 
 
@@ -249,8 +281,40 @@ _SEARCHRESPONSE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=180,
-  serialized_end=333,
+  serialized_start=254,
+  serialized_end=407,
+)
+
+
+_BATCHSEARCHRESPONSE = _descriptor.Descriptor(
+  name='BatchSearchResponse',
+  full_name='BatchSearchResponse',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='responses', full_name='BatchSearchResponse.responses', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=409,
+  serialized_end=466,
 )
 
 
@@ -283,6 +347,20 @@ _SYNCREQUEST = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='sentenceIds', full_name='SyncRequest.sentenceIds', index=3,
+      number=4, type=5, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='sentences', full_name='SyncRequest.sentences', index=4,
+      number=5, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
   ],
   extensions=[
   ],
@@ -300,8 +378,8 @@ _SYNCREQUEST = _descriptor.Descriptor(
       create_key=_descriptor._internal_create_key,
     fields=[]),
   ],
-  serialized_start=335,
-  serialized_end=411,
+  serialized_start=468,
+  serialized_end=584,
 )
 
 
@@ -333,13 +411,15 @@ _SYNCRESPONSE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=414,
-  serialized_end=560,
+  serialized_start=587,
+  serialized_end=733,
 )
 
+_BATCHRERANKDOCUMENTSREQUEST.fields_by_name['requests'].message_type = _RERANKDOCUMENTSREQUEST
 _SEARCHRESPONSE.fields_by_name['matches'].message_type = _DOCUMENTMATCH
 _SEARCHRESPONSE.fields_by_name['error'].enum_type = _SEARCHRESPONSE_ERROR
 _SEARCHRESPONSE_ERROR.containing_type = _SEARCHRESPONSE
+_BATCHSEARCHRESPONSE.fields_by_name['responses'].message_type = _SEARCHRESPONSE
 _SYNCREQUEST.oneofs_by_name['target'].fields.append(
   _SYNCREQUEST.fields_by_name['documentId'])
 _SYNCREQUEST.fields_by_name['documentId'].containing_oneof = _SYNCREQUEST.oneofs_by_name['target']
@@ -350,8 +430,10 @@ _SYNCRESPONSE.fields_by_name['error'].enum_type = _SYNCRESPONSE_ERROR
 _SYNCRESPONSE_ERROR.containing_type = _SYNCRESPONSE
 DESCRIPTOR.message_types_by_name['TopKDocumentsRequest'] = _TOPKDOCUMENTSREQUEST
 DESCRIPTOR.message_types_by_name['RerankDocumentsRequest'] = _RERANKDOCUMENTSREQUEST
+DESCRIPTOR.message_types_by_name['BatchRerankDocumentsRequest'] = _BATCHRERANKDOCUMENTSREQUEST
 DESCRIPTOR.message_types_by_name['DocumentMatch'] = _DOCUMENTMATCH
 DESCRIPTOR.message_types_by_name['SearchResponse'] = _SEARCHRESPONSE
+DESCRIPTOR.message_types_by_name['BatchSearchResponse'] = _BATCHSEARCHRESPONSE
 DESCRIPTOR.message_types_by_name['SyncRequest'] = _SYNCREQUEST
 DESCRIPTOR.message_types_by_name['SyncResponse'] = _SYNCRESPONSE
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
@@ -370,6 +452,13 @@ RerankDocumentsRequest = _reflection.GeneratedProtocolMessageType('RerankDocumen
   })
 _sym_db.RegisterMessage(RerankDocumentsRequest)
 
+BatchRerankDocumentsRequest = _reflection.GeneratedProtocolMessageType('BatchRerankDocumentsRequest', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHRERANKDOCUMENTSREQUEST,
+  '__module__' : 'encoder_pb2'
+  # @@protoc_insertion_point(class_scope:BatchRerankDocumentsRequest)
+  })
+_sym_db.RegisterMessage(BatchRerankDocumentsRequest)
+
 DocumentMatch = _reflection.GeneratedProtocolMessageType('DocumentMatch', (_message.Message,), {
   'DESCRIPTOR' : _DOCUMENTMATCH,
   '__module__' : 'encoder_pb2'
@@ -384,6 +473,13 @@ SearchResponse = _reflection.GeneratedProtocolMessageType('SearchResponse', (_me
   })
 _sym_db.RegisterMessage(SearchResponse)
 
+BatchSearchResponse = _reflection.GeneratedProtocolMessageType('BatchSearchResponse', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHSEARCHRESPONSE,
+  '__module__' : 'encoder_pb2'
+  # @@protoc_insertion_point(class_scope:BatchSearchResponse)
+  })
+_sym_db.RegisterMessage(BatchSearchResponse)
+
 SyncRequest = _reflection.GeneratedProtocolMessageType('SyncRequest', (_message.Message,), {
   'DESCRIPTOR' : _SYNCREQUEST,
   '__module__' : 'encoder_pb2'
@@ -407,8 +503,8 @@ _ENCODER = _descriptor.ServiceDescriptor(
   index=0,
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_start=563,
-  serialized_end=739,
+  serialized_start=736,
+  serialized_end=996,
   methods=[
   _descriptor.MethodDescriptor(
     name='FindTopKDocuments',
@@ -430,10 +526,20 @@ _ENCODER = _descriptor.ServiceDescriptor(
     serialized_options=None,
     create_key=_descriptor._internal_create_key,
   ),
+  _descriptor.MethodDescriptor(
+    name='BatchRetrieveRerankDocuments',
+    full_name='Encoder.BatchRetrieveRerankDocuments',
+    index=2,
+    containing_service=None,
+    input_type=_BATCHRERANKDOCUMENTSREQUEST,
+    output_type=_BATCHSEARCHRESPONSE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
   _descriptor.MethodDescriptor(
     name='Sync',
     full_name='Encoder.Sync',
-    index=2,
+    index=3,
     containing_service=None,
     input_type=_SYNCREQUEST,
     output_type=_SYNCRESPONSE,
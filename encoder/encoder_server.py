@@ -1,14 +1,20 @@
+from collections import OrderedDict
 from concurrent import futures
 import grpc
 import logging
 
 import os
+import threading
+import time
+import unicodedata
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from sklearn.preprocessing import normalize
 
 import encoder_pb2
 import encoder_pb2_grpc
+from index_snapshot import IndexSnapshot
 
 ROOT_DIR = "/home/azureuser/FactCheck-QA/"    # Change this
 DATA_DIR = "dataset/MLQA/Test/"
@@ -21,53 +27,270 @@ FAISS_INDEX = os.path.join(
     DATA_DIR,
     "sentence.index"
 )
+# Sentence embeddings as a contiguous float32 matrix (row i <-> sentence i),
+# exported from the FAISS index on the first run
+EMBEDDING_FILE = os.path.join(
+    ROOT_DIR,
+    DATA_DIR,
+    "embeddings.npy"
+)
+
+# Full-corpus ANN search, index built by `build_index.py`
+ANN_INDEX_TYPE = "flat"     # "flat", "ivf", "hnsw" or "pq"
+ANN_INDEX_FILE = os.path.join(
+    ROOT_DIR,
+    DATA_DIR,
+    f"sentence.{ANN_INDEX_TYPE}.index"
+)
+ANN_NPROBE = 16         # clusters to visit, for "ivf" and "pq"
+ANN_EF_SEARCH = 128     # candidate list size, for "hnsw"
+
+# Incremental updates applied by `Sync`, on top of the index and embeddings
+# above until the next full rebuild
+EMBEDDING_DELTA_FILE = os.path.join(
+    ROOT_DIR,
+    DATA_DIR,
+    "embeddings.delta.npy"
+)
+DELETED_FILE = os.path.join(
+    ROOT_DIR,
+    DATA_DIR,
+    "deleted.npy"
+)
+SYNC_BATCH_SIZE = 64    # sentences per forward pass when adding a document
+
+# Query embedding cache
+QUERY_CACHE_SIZE = 10000    # max number of cached queries, 0 to disable
+QUERY_CACHE_TTL = 3600      # seconds, None to keep entries until evicted
 
 encoder = SentenceTransformer(EMBEDDING_MODEL)
 
 
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of query embeddings with an optional TTL,
+    keyed on the model name and the normalized query string."""
+
+    def __init__(self, model, model_name, max_entries, ttl=None):
+        self.model = model
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()     # key -> (expiry time, embedding)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize_query(query):
+        """Unify unicode form and whitespace, keeping the case since
+        the embedding model is cased."""
+        return unicodedata.normalize("NFC", " ".join(query.split()))
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expiry, embedding = entry
+                if expiry is None or expiry > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                # Expired
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def _put(self, key, embedding):
+        if self.max_entries <= 0:
+            return
+        expiry = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expiry, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def encode(self, queries):
+        """Return embeddings of the given queries, encoding only the cache
+        misses, all in one batch.
+
+        Returns:
+            np.ndarray: one row per query, in the same order
+        """
+        keys = [
+            (self.model_name, self.normalize_query(query)) for query in queries
+        ]
+        embeddings = [self._get(key) for key in keys]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self.model.encode([queries[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embedding = np.asarray(embedding, dtype=np.float32)
+                embedding.flags.writeable = False
+                self._put(keys[i], embedding)
+                embeddings[i] = embedding
+
+        return np.stack(embeddings)
+
+    def stats(self):
+        """Return the cache's counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def load_embeddings(index, path: str) -> np.ndarray:
+    """Load sentence embeddings memory-mapped from disk, exporting them
+    from the given FAISS index first if the file does not exist yet."""
+    if not os.path.exists(path):
+        embeddings = index.reconstruct_n(0, index.ntotal)
+        np.save(path, np.ascontiguousarray(embeddings, dtype=np.float32))
+    return np.load(path, mmap_mode="r")
+
+
+def load_ann_index(flat_index):
+    """Load the configured ANN index and set its search-time parameters.
+    The flat type reuses the already loaded exact index."""
+    if ANN_INDEX_TYPE == "flat":
+        return flat_index
+
+    index = faiss.read_index(ANN_INDEX_FILE)
+    params = faiss.ParameterSpace()
+    if ANN_INDEX_TYPE in ("ivf", "pq"):
+        params.set_index_parameter(index, "nprobe", ANN_NPROBE)
+    elif ANN_INDEX_TYPE == "hnsw":
+        params.set_index_parameter(index, "efSearch", ANN_EF_SEARCH)
+    return index
+
+
+def save_array(path: str, array: np.ndarray):
+    """Write an array to disk, replacing the previous file atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
 class EncoderServicer(encoder_pb2_grpc.EncoderServicer):
 
     def __init__(self):
-        self.index = faiss.read_index(
+        self.snapshot = self.load_snapshot()
+        # Serialize syncs; searches read the current snapshot without locking
+        self._sync_lock = threading.Lock()
+        self.query_cache = QueryEmbeddingCache(
+            encoder,
+            EMBEDDING_MODEL,
+            max_entries=QUERY_CACHE_SIZE,
+            ttl=QUERY_CACHE_TTL,
+        )
+
+    def load_snapshot(self, with_updates=True):
+        """Load the index and embeddings of the last full build along with
+        the incremental updates made since then, unless `with_updates`
+        is False."""
+        index = faiss.read_index(
             os.path.join(FAISS_INDEX)
         )
+        embeddings = load_embeddings(index, EMBEDDING_FILE)
+        ann_index = load_ann_index(index)
+
+        extra = deleted = None
+        if with_updates and os.path.exists(EMBEDDING_DELTA_FILE):
+            extra = np.load(EMBEDDING_DELTA_FILE)
+        if with_updates and os.path.exists(DELETED_FILE):
+            deleted = np.load(DELETED_FILE)
+        return IndexSnapshot(embeddings, ann_index, extra, deleted)
+
+    def save_snapshot(self, snapshot):
+        """Persist the incremental updates of the given snapshot."""
+        save_array(EMBEDDING_DELTA_FILE, snapshot.extra)
+        save_array(DELETED_FILE, snapshot.deleted)
+
+    def remove_updates(self):
+        """Remove the persisted incremental updates."""
+        for path in (EMBEDDING_DELTA_FILE, DELETED_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def rerank_many(self, query_vectors, list_candidate_ids, ks):
+        """Score candidate sentences of several queries together and keep
+        the top k of each.
+
+        Candidates of all queries are gathered from the embedding matrix
+        once and scored against all queries with one matrix product.
+
+        Returns:
+            list: for each query, (id, score) of its top k distinct
+            candidates, best first
+        """
+        snapshot = self.snapshot
+        list_candidate_ids = [
+            snapshot.filter_ids(np.unique(np.asarray(ids, dtype=np.int64)))
+            for ids in list_candidate_ids
+        ]
+        union_ids = np.unique(np.concatenate(
+            list_candidate_ids + [np.empty(0, dtype=np.int64)]))
+        # rows: candidates of any query; columns: queries
+        all_scores = snapshot.get_embeddings(union_ids) @ np.asarray(query_vectors).T
+
+        results = []
+        for col, (candidate_ids, k) in enumerate(zip(list_candidate_ids, ks)):
+            k = min(k, len(candidate_ids))
+            if k <= 0:
+                results.append([])
+                continue
+
+            scores = all_scores[np.searchsorted(union_ids, candidate_ids), col]
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            # Normalization
+            distances = normalize(scores[top].reshape(1, -1))[0]
+
+            results.append(
+                list(zip(candidate_ids[top].tolist(), distances.tolist())))
+
+        return results
+
+    def rerank(self, query_vector, candidate_ids, k):
+        """Score candidate sentences against the query and keep the top k.
+
+        Returns:
+            list: (id, score) of top k distinct candidates, best first
+        """
+        return self.rerank_many([query_vector], [candidate_ids], [k])[0]
 
     def FindTopKDocuments(self, request, context):
+        """Search top K sentences over the whole corpus."""
         matches = []    # List of DocumentMatch
         error = None    # Enumerate Error of SearchResponse
 
         try:
             query = request.query
-            query_vector = encoder.encode([preprocessed_query])
+            query_vector = self.query_cache.encode([query])
             k = request.k
 
-            D_title, I_title = self.index_title.search(query_vector, k)
-            D_content, I_content = self.index_content.search(query_vector, k)
-
-            # # Weighting title over content
-            # boost = 0.3    # Edit this number
-            # for i in range(len(D_title)):
-            #     D_title[i] += boost
-            #     # D_content[i] += boost
-
-            # Group Index number and Distance score for group of results from each index
-            res_title = list(zip(I_title.tolist()[0], D_title.tolist()[0]))
-            res_content = list(
-                zip(I_content.tolist()[0], D_content.tolist()[0]))
-            # print('From title', res_title)
-            # print('From content', res_content)
-
-            # Combine the results while getting rid of duplication
-            comb = list(set(res_title + res_content))
-            # Sort by distance scores
-            comb = sorted(comb, key=lambda tup: tup[1], reverse=True)
-            # Sort by distance scores by ascending,
-            # the smaller the distance, the better result for user's query
-            # comb = sorted(comb, key=lambda tup: tup[1])
-
-            # print(comb[:5])
-            # Get top 5
-            for idx, d in comb[:k]:
+            indices, distances = self.snapshot.search(query_vector[0], k)
+
+            result = list(zip(
+                indices.tolist(),
+                # Normalization, as for re-ranking
+                normalize(distances.reshape(1, -1))[0].tolist() if len(indices) else [],
+            ))
+
+            # For debugging
+            logging.debug(f"Result (Index, Distance):\n{result}")
+
+            for idx, d in result:
                 matches.append(encoder_pb2.DocumentMatch(id=idx, distance=d))
 
             if len(matches) > 0:
@@ -91,45 +314,20 @@ class EncoderServicer(encoder_pb2_grpc.EncoderServicer):
         try:
             # Preprocess and encode user querystring
             query = request.query
-            query_vector = encoder.encode([query])
+            query_vector = self.query_cache.encode([query])
+            logging.debug(f"Query cache: {self.query_cache.stats()}")
 
             # Get K parameter and list of sentences' IDs
             k = request.k
             list_candidate_ids = request.ids
 
-            # Initialize an archive for converting list of tuple into list of IDs
-            embeddings = np.array([
-                self.index.reconstruct(id_) for id_ in list_candidate_ids
-            ])
-
-            new_index = faiss.IndexIDMap(faiss.IndexFlatIP(FEATURE_SIZE))
-            new_index.add_with_ids(
-                embeddings,
-                np.array(list_candidate_ids),
-            )
-
-            distances, indices = new_index.search(query_vector, k)
-
-            # Normalization
-            distances = normalize(distances)
-
-            result = list(zip(indices.tolist()[0], distances.tolist()[0]))
+            result = self.rerank(query_vector[0], list_candidate_ids, k)
 
             # For debugging
-            logging.debug(f"Result (Distance, Index):\n{result}")
+            logging.debug(f"Result (Index, Distance):\n{result}")
 
-            # Take only distinct documents (no duplicate)
-            cnt = 0
-            track_ids = set()
             for idx, d in result:
-                # matches.append(encoder_pb2.DocumentMatch(id=idx, distance=d))
-                if cnt == k:
-                    break
-                elif idx not in track_ids:
-                    matches.append(
-                        encoder_pb2.DocumentMatch(id=idx, distance=d))
-                    track_ids.add(idx)
-                    cnt += 1
+                matches.append(encoder_pb2.DocumentMatch(id=idx, distance=d))
 
             if len(matches) > 0:
                 error = encoder_pb2.SearchResponse.Error.NO_ERROR
@@ -143,8 +341,96 @@ class EncoderServicer(encoder_pb2_grpc.EncoderServicer):
             error=error
         )
 
+    def BatchRetrieveRerankDocuments(self, request, context):
+        """Retrieve and re-rank top K from the given documents
+        for many queries at once."""
+        responses = []
+        try:
+            # Encode all queries in one batch
+            query_vectors = self.query_cache.encode(
+                [req.query for req in request.requests])
+
+            results = self.rerank_many(
+                query_vectors,
+                [req.ids for req in request.requests],
+                [req.k for req in request.requests],
+            )
+
+            for result in results:
+                matches = [
+                    encoder_pb2.DocumentMatch(id=idx, distance=d)
+                    for idx, d in result
+                ]
+                if len(matches) > 0:
+                    error = encoder_pb2.SearchResponse.Error.NO_ERROR
+                else:
+                    error = encoder_pb2.SearchResponse.Error.INDEX_IS_NOT_READY
+                responses.append(
+                    encoder_pb2.SearchResponse(matches=matches, error=error))
+        except Exception as err:
+            logging.error(err)
+            responses = [
+                encoder_pb2.SearchResponse(
+                    error=encoder_pb2.SearchResponse.Error.UNKNOWN_ERROR)
+                for _ in request.requests
+            ]
+
+        return encoder_pb2.BatchSearchResponse(responses=responses)
+
     def Sync(self, request, context):
-        pass
+        """Apply changes of a document to the sentence index.
+
+        - documentId: add the given sentences (new IDs, with their text), or
+          delete them if `delete` is set
+        - all: reload the index from disk after a full rebuild, dropping the
+          incremental updates which the rebuild already includes
+
+        Searches keep reading the previous snapshot until the new one is
+        ready, and overlapping syncs are rejected.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return encoder_pb2.SyncResponse(
+                error=encoder_pb2.SyncResponse.Error.ANOTHER_SYNC_IN_PROGRESS)
+
+        try:
+            target = request.WhichOneof("target")
+            if target == "all":
+                snapshot = self.load_snapshot(with_updates=False)
+            elif target == "documentId" and request.delete:
+                snapshot = self.snapshot.delete(request.sentenceIds)
+                self.save_snapshot(snapshot)
+            elif target == "documentId":
+                if len(request.sentences) != len(request.sentenceIds):
+                    raise ValueError("Sentences and IDs do not match.")
+                embeddings = encoder.encode(
+                    list(request.sentences), batch_size=SYNC_BATCH_SIZE)
+                snapshot = self.snapshot.add(
+                    request.sentenceIds,
+                    np.asarray(embeddings, dtype=np.float32).reshape(
+                        len(request.sentenceIds), -1),
+                )
+                self.save_snapshot(snapshot)
+            else:
+                raise ValueError("No target to sync.")
+
+            # Swap in the new snapshot, in one assignment
+            self.snapshot = snapshot
+            if target == "all":
+                # Only once the rebuild is in use, so that a failed load
+                # leaves the current index and its updates intact
+                self.remove_updates()
+            logging.info(
+                f"Synced {target}={getattr(request, target)} "
+                f"(delete={request.delete}): {len(snapshot)} sentences"
+            )
+            error = encoder_pb2.SyncResponse.Error.NO_ERROR
+        except Exception as err:
+            logging.error(err)
+            error = encoder_pb2.SyncResponse.Error.UNKNOWN_ERROR
+        finally:
+            self._sync_lock.release()
+
+        return encoder_pb2.SyncResponse(error=error)
 
 
 def serve():
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class IndexSnapshot:
+    """Immutable view of the sentence index which requests read from.
+
+    Rows of the base embedding matrix and ANN index come from the last full
+    build; sentences added since then are kept in `extra` (row i <-> sentence
+    len(embeddings) + i) and searched exhaustively, and deleted sentences are
+    masked out. A sync builds a new snapshot instead of modifying this one,
+    so that a request sees the same data from start to end.
+    """
+
+    def __init__(self, embeddings, ann_index, extra=None, deleted=None):
+        self.embeddings = embeddings
+        self.ann_index = ann_index
+        self.n_base = len(embeddings)
+        if extra is None:
+            extra = np.empty((0, embeddings.shape[1]), dtype=np.float32)
+        self.extra = extra
+        if deleted is None:
+            deleted = np.zeros(self.n_base + len(extra), dtype=bool)
+        self.deleted = deleted
+        self.n_deleted_base = int(deleted[:self.n_base].sum())
+
+    def __len__(self):
+        return self.n_base + len(self.extra)
+
+    def filter_ids(self, ids):
+        """Keep the IDs of existing, not deleted sentences."""
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < len(self))]
+        return ids[~self.deleted[ids]]
+
+    def get_embeddings(self, ids):
+        """Gather embeddings of the given (existing) sentences' IDs."""
+        ids = np.asarray(ids, dtype=np.int64)
+        in_base = ids < self.n_base
+        if in_base.all():
+            return self.embeddings[ids]
+        result = np.empty((len(ids), self.embeddings.shape[1]), dtype=np.float32)
+        result[in_base] = self.embeddings[ids[in_base]]
+        result[~in_base] = self.extra[ids[~in_base] - self.n_base]
+        return result
+
+    def search(self, query_vector, k):
+        """Search top k sentences for one query over the whole corpus.
+
+        Returns:
+            tuple: IDs and scores of the sentences, best first
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        # Ask for more results to make up for the deleted ones
+        k_base = min(k + self.n_deleted_base, self.n_base)
+        ids = np.empty(0, dtype=np.int64)
+        scores = np.empty(0, dtype=np.float32)
+        if k_base > 0:
+            distances, indices = self.ann_index.search(query_vector, k_base)
+            # Drop empty slots when fewer than k results are found
+            found = indices[0] >= 0
+            ids, scores = indices[0][found], distances[0][found]
+        if len(self.extra):
+            ids = np.concatenate([ids, np.arange(self.n_base, len(self))])
+            scores = np.concatenate([scores, self.extra @ query_vector[0]])
+
+        keep = ~self.deleted[ids]
+        ids, scores = ids[keep], scores[keep]
+        top = np.argsort(-scores, kind="stable")[:k]
+        return ids[top], scores[top]
+
+    def add(self, ids, embeddings):
+        """Return a new snapshot with the given new sentences."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) and ids.min() < len(self):
+            raise ValueError("Sentences are already in the index.")
+        size = max(len(self), int(ids.max()) + 1 if len(ids) else 0)
+
+        # Unknown rows between the last sentence and the new ones, e.g., left
+        # by a failed insert, are kept empty and deleted
+        extra = np.zeros((size - self.n_base, self.extra.shape[1]), dtype=np.float32)
+        extra[:len(self.extra)] = self.extra
+        extra[ids - self.n_base] = embeddings
+        deleted = np.ones(size, dtype=bool)
+        deleted[:len(self)] = self.deleted
+        deleted[ids] = False
+        return IndexSnapshot(self.embeddings, self.ann_index, extra, deleted)
+
+    def delete(self, ids):
+        """Return a new snapshot without the given sentences."""
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < len(self))]
+        deleted = self.deleted.copy()
+        deleted[ids] = True
+        return IndexSnapshot(self.embeddings, self.ann_index, self.extra, deleted)
@@ -0,0 +1,90 @@
+"""Unit tests of `IndexSnapshot`, run from `encoder/` with `python -m unittest`."""
+import unittest
+
+import numpy as np
+
+from index_snapshot import IndexSnapshot
+
+
+class FlatIndex:
+    """Exact inner product search with the interface of a FAISS index."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def search(self, query_vectors, k):
+        scores = query_vectors @ self.embeddings.T
+        ids = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(scores, ids, axis=1)
+        # FAISS pads missing results with -1
+        pad = k - ids.shape[1]
+        return (
+            np.pad(distances, ((0, 0), (0, pad)), constant_values=-np.inf),
+            np.pad(ids, ((0, 0), (0, pad)), constant_values=-1),
+        )
+
+
+class IndexSnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        # Sentence i scores 3 - i against the query, i.e., best first
+        self.embeddings = np.array(
+            [[3, 0], [2, 0], [1, 0]], dtype=np.float32)
+        self.snapshot = IndexSnapshot(self.embeddings, FlatIndex(self.embeddings))
+        self.query = np.array([1, 0], dtype=np.float32)
+
+    def test_search(self):
+        ids, scores = self.snapshot.search(self.query, 2)
+
+        self.assertEqual(ids.tolist(), [0, 1])
+        self.assertEqual(scores.tolist(), [3, 2])
+
+    def test_search_more_than_the_corpus(self):
+        ids, _ = self.snapshot.search(self.query, 10)
+
+        self.assertEqual(ids.tolist(), [0, 1, 2])
+
+    def test_add(self):
+        snapshot = self.snapshot.add([3], np.array([[5, 0]], dtype=np.float32))
+
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.search(self.query, 2)[0].tolist(), [3, 0])
+        self.assertEqual(
+            snapshot.get_embeddings([3, 1]).tolist(), [[5, 0], [2, 0]])
+        # The previous snapshot is left as it was
+        self.assertEqual(len(self.snapshot), 3)
+        self.assertEqual(self.snapshot.search(self.query, 1)[0].tolist(), [0])
+
+    def test_add_after_a_gap(self):
+        snapshot = self.snapshot.add([5], np.array([[5, 0]], dtype=np.float32))
+
+        self.assertEqual(len(snapshot), 6)
+        # Rows of unknown sentences in between are deleted
+        self.assertEqual(snapshot.filter_ids([2, 3, 4, 5]).tolist(), [2, 5])
+        self.assertEqual(snapshot.search(self.query, 10)[0].tolist(), [5, 0, 1, 2])
+
+    def test_add_existing_sentences(self):
+        with self.assertRaises(ValueError):
+            self.snapshot.add([2], np.array([[5, 0]], dtype=np.float32))
+
+    def test_delete(self):
+        snapshot = self.snapshot.delete([0, 7, -1])
+
+        # Deleted sentences are made up for by searching further
+        self.assertEqual(snapshot.search(self.query, 2)[0].tolist(), [1, 2])
+        self.assertEqual(snapshot.filter_ids([0, 1, 2]).tolist(), [1, 2])
+        self.assertEqual(self.snapshot.filter_ids([0, 1, 2]).tolist(), [0, 1, 2])
+
+    def test_delete_added_sentences(self):
+        snapshot = self.snapshot.add(
+            [3, 4], np.array([[5, 0], [4, 0]], dtype=np.float32)).delete([3])
+
+        self.assertEqual(snapshot.search(self.query, 2)[0].tolist(), [4, 0])
+
+    def test_filter_ids(self):
+        self.assertEqual(
+            self.snapshot.filter_ids([-1, 0, 2, 3, 100]).tolist(), [0, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()